@@ -0,0 +1,155 @@
+"""
+In-memory Market Data entitlements.
+
+Every active subscription is held in process as user_id -> Entitlement
+(tier, project limit, feature keys, period end), so a gated route checks
+access without touching MongoDB. The map is kept current two ways:
+
+- the Stripe webhook handlers apply each subscription document they write,
+  so the worker that receives the webhook sees the change immediately;
+- a background refresh re-reads the active subscriptions every few seconds,
+  which is how the other workers (and missed webhooks) converge.
+
+An entitlement whose period has ended stops granting access after a short
+grace period, even before the renewal or cancellation webhook arrives.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, FrozenSet, Iterable, Optional
+
+# Renewal webhooks can land a little after the period ends
+GRACE_PERIOD = timedelta(hours=24)
+
+PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "tier_id": 1,
+    "status": 1,
+    "current_period_end": 1,
+    "market_data_access_token": 1,
+}
+
+@dataclass(frozen=True)
+class Entitlement:
+    user_id: str
+    tier_id: str
+    project_limit: int  # 0 = unlimited
+    features: FrozenSet[str] = field(default_factory=frozenset)
+    expires_at: Optional[datetime] = None
+    access_token: Optional[str] = None
+
+    def is_active(self, now: Optional[datetime] = None) -> bool:
+        if self.expires_at is None:
+            return True
+        return (now or datetime.utcnow()) < self.expires_at + GRACE_PERIOD
+
+    def allows(self, feature: str) -> bool:
+        return feature in self.features
+
+    def to_dict(self) -> dict:
+        return {
+            "tier_id": self.tier_id,
+            "project_limit": self.project_limit,
+            "features": sorted(self.features),
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+class EntitlementService:
+    def __init__(self, tier_features: Dict[str, Iterable[str]], project_limit: Callable[[str], int],
+                 refresh_interval: float = 30.0):
+        self.tier_features = {tier_id: frozenset(features) for tier_id, features in tier_features.items()}
+        self.project_limit = project_limit
+        self.refresh_interval = refresh_interval
+        self._by_user: Dict[str, Entitlement] = {}
+        self._by_token: Dict[str, Entitlement] = {}
+        # Changes applied while a refresh is reading; they win over its (older) snapshot
+        self._applied_during_refresh: Optional[Dict[str, Optional[Entitlement]]] = None
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    def _from_doc(self, doc: dict) -> Optional[Entitlement]:
+        if doc.get("status") != "active":
+            return None
+        expires_at = doc.get("current_period_end")
+        return Entitlement(
+            user_id=doc["user_id"],
+            tier_id=doc["tier_id"],
+            project_limit=self.project_limit(doc["tier_id"]),
+            features=self.tier_features.get(doc["tier_id"], frozenset()),
+            expires_at=datetime.fromisoformat(expires_at) if expires_at else None,
+            access_token=doc.get("market_data_access_token"),
+        )
+
+    def _set(self, user_id: str, entitlement: Optional[Entitlement]):
+        previous = self._by_user.pop(user_id, None)
+        if previous and previous.access_token:
+            self._by_token.pop(previous.access_token, None)
+        if entitlement:
+            self._by_user[user_id] = entitlement
+            if entitlement.access_token:
+                self._by_token[entitlement.access_token] = entitlement
+
+    def get(self, user_id: str) -> Optional[Entitlement]:
+        entitlement = self._by_user.get(user_id)
+        if entitlement and entitlement.is_active():
+            return entitlement
+        return None
+
+    def get_by_token(self, access_token: str) -> Optional[Entitlement]:
+        entitlement = self._by_token.get(access_token)
+        if entitlement and entitlement.is_active():
+            return entitlement
+        return None
+
+    def apply(self, doc: Optional[dict]):
+        """Record a subscription document just written (active grants, anything else revokes)"""
+        if not doc:
+            return
+        entitlement = self._from_doc(doc)
+        current = self._by_user.get(doc["user_id"])
+        # A stale non-active record (e.g. an old cancelled subscription) must not revoke a newer active one
+        if entitlement is None and current and doc.get("market_data_access_token") != current.access_token:
+            return
+        self._set(doc["user_id"], entitlement)
+        if self._applied_during_refresh is not None:
+            self._applied_during_refresh[doc["user_id"]] = entitlement
+
+    def revoke(self, user_id: str):
+        self._set(user_id, None)
+        if self._applied_during_refresh is not None:
+            self._applied_during_refresh[user_id] = None
+
+    async def refresh(self, db) -> int:
+        """Replace the map with the active subscriptions in the database"""
+        self._applied_during_refresh = {}
+        try:
+            docs = await db.subscriptions.find({"status": "active"}, PROJECTION).to_list(None)
+            by_user: Dict[str, Entitlement] = {}
+            for doc in docs:
+                entitlement = self._from_doc(doc)
+                current = by_user.get(entitlement.user_id)
+                if current is None or (entitlement.expires_at or datetime.max) > (current.expires_at or datetime.max):
+                    by_user[entitlement.user_id] = entitlement
+            for user_id, entitlement in self._applied_during_refresh.items():
+                if entitlement:
+                    by_user[user_id] = entitlement
+                else:
+                    by_user.pop(user_id, None)
+        finally:
+            self._applied_during_refresh = None
+        self._by_user = by_user
+        self._by_token = {e.access_token: e for e in by_user.values() if e.access_token}
+        self.loaded = True
+        return len(by_user)
+
+    async def run(self, db):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh(db)
+            except Exception as e:
+                print(f"❌ Entitlement refresh failed: {e}")
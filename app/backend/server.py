@@ -5,45 +5,71 @@ FastAPI backend with MongoDB, Stripe integration, and Market Data subscriptions
 Copyright © 2025 HDrywall Repair / Poor Dude Holdings LLC
 """
 
+import coldstart
+
+# Time the imports below; the startup report lists what each one cost
+import_timer = coldstart.ImportTimer()
+import_timer.start()
+
 import os
+import asyncio
 import secrets
 import hashlib
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Optional, List
 
 import httpx
-import stripe
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, EmailStr
+from pymongo import ReturnDocument
+
+import database
+import entitlements
+import resilience
+import tracing
+
+import_timer.stop()
+
+# Loaded during startup (see prewarm_stripe) instead of at import
+stripe = coldstart.lazy_import("stripe")
 
 # ============================================================================
 # APPLICATION SETUP
 # ============================================================================
 
-app = FastAPI(
-    title="HDrywall Pro Platform API",
-    description="Professional contractor/subcontractor job matching with e-commerce",
-    version="2.0.0"
-)
+# Routes are collected here and mounted by create_app
+router = APIRouter()
 
 # CORS Configuration
 CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "http://localhost:3000").split(",")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
 # MongoDB Connection
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "test_database")
-mongo_client = AsyncIOMotorClient(MONGO_URL)
-db = mongo_client[DB_NAME]
+
+def connect_databases() -> database.Databases:
+    """Separate pools per workload (interactive reads / writes / background); see database.py for MONGO_*_OPTIONS"""
+    # Every Motor call is recorded as a span of the current request
+    return database.Databases(MONGO_URL, DB_NAME, wrap=tracing.TracedDatabase)
+
+def init_services(dbs: database.Databases):
+    """
+    Bind the database and the state loaded from it to the module names the route handlers use.
+    create_app calls this, so it is the one place the database is injected.
+    """
+    global databases, db, entitlement_service
+    databases = dbs
+    db = dbs.write
+    # Active subscriptions held in memory, so gated routes never query db.subscriptions
+    entitlement_service = entitlements.EntitlementService(
+        TIER_FEATURES,
+        get_project_limit,
+        refresh_interval=float(os.environ.get("ENTITLEMENT_REFRESH_SECONDS", "30")),
+    )
 
 # Stripe Configuration
 stripe.api_key = os.environ.get("STRIPE_API_KEY", "sk_test_emergent")
@@ -53,6 +79,24 @@ STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
 MARKET_DATA_API_URL = os.environ.get("MARKET_DATA_API_URL", "http://localhost:8000")
 MARKET_DATA_API_KEY = os.environ.get("MARKET_DATA_API_KEY", "")
 
+def stripe_is_error(e: Exception) -> bool:
+    """Network, 5xx and rate-limit errors count against the Stripe breaker; card/request errors do not"""
+    return isinstance(e, (stripe.error.APIConnectionError, stripe.error.APIError, stripe.error.RateLimitError))
+
+def log_upstream_event(upstream: str, event: str):
+    if event in ("open", "half_open", "closed"):
+        print(f"⚡ {upstream} circuit {event}")
+
+# Outbound calls get a timeout, a concurrency bulkhead, a circuit breaker and (if idempotent) jittered
+# retries per upstream; see resilience.py for UPSTREAM_*_OPTIONS
+upstreams = resilience.build_upstreams(
+    {
+        "stripe": {"timeout": 10.0, "retries": 1, "max_concurrent": 30, "is_error": stripe_is_error},
+        "market_data": {"timeout": 5.0, "max_concurrent": 10},
+    },
+    on_event=log_upstream_event
+)
+
 # JWT Configuration
 JWT_SECRET = os.environ.get("JWT_SECRET", "your-secret-key-change-this")
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
@@ -115,6 +159,19 @@ MARKET_DATA_TIERS = [
     }
 ]
 
+# Feature keys checked by gated routes (require_entitlement); each tier includes the ones below it
+BASIC_FEATURES = {"regional_trends", "wage_analytics", "industry_reports"}
+PROFESSIONAL_FEATURES = BASIC_FEATURES | {"national_data", "realtime_wages", "competitor_analysis", "custom_reports"}
+ENTERPRISE_FEATURES = PROFESSIONAL_FEATURES | {
+    "api_access", "data_integrations", "predictive_analytics", "win_probability", "demand_forecasting",
+    "white_label_reports",
+}
+TIER_FEATURES = {
+    "basic": BASIC_FEATURES,
+    "professional": PROFESSIONAL_FEATURES,
+    "enterprise": ENTERPRISE_FEATURES,
+}
+
 # Subscription status types
 SUBSCRIPTION_STATUS = {
     "active": "Active subscription with full access",
@@ -205,11 +262,33 @@ def get_project_limit(tier_id: str) -> int:
     }
     return limits.get(tier_id, 100)
 
+def require_entitlement(feature: Optional[str] = None):
+    """Dependency for Market Data routes: the caller's active entitlement, optionally with a feature"""
+    async def dependency(request: Request) -> entitlements.Entitlement:
+        if not entitlement_service.loaded:
+            # Startup could not load the map (e.g. the database was down); load it once now
+            await entitlement_service.refresh(db)
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            # Market Data access token - resolved entirely in memory
+            entitlement = entitlement_service.get_by_token(authorization[7:].strip())
+            if not entitlement:
+                raise HTTPException(status_code=401, detail="Invalid or expired access token")
+        else:
+            user = await require_user(request)
+            entitlement = entitlement_service.get(user["user_id"])
+            if not entitlement:
+                raise HTTPException(status_code=403, detail="Active subscription required")
+        if feature and not entitlement.allows(feature):
+            raise HTTPException(status_code=403, detail=f"Your plan does not include {feature}")
+        return entitlement
+    return dependency
+
 # ============================================================================
 # AUTHENTICATION ENDPOINTS
 # ============================================================================
 
-@app.post("/api/v1/auth/register")
+@router.post("/api/v1/auth/register")
 async def register(user_data: UserRegister):
     """Register a new user"""
     
@@ -242,7 +321,7 @@ async def register(user_data: UserRegister):
     
     return {"message": "User registered successfully", "user_id": user_id}
 
-@app.post("/api/v1/auth/login")
+@router.post("/api/v1/auth/login")
 async def login(credentials: UserLogin):
     """Login user and create session"""
     
@@ -287,7 +366,7 @@ async def login(credentials: UserLogin):
     
     return response
 
-@app.post("/api/v1/auth/logout")
+@router.post("/api/v1/auth/logout")
 async def logout(request: Request):
     """Logout user and destroy session"""
     session_token = request.cookies.get("session_token")
@@ -300,7 +379,7 @@ async def logout(request: Request):
     
     return response
 
-@app.get("/api/v1/auth/me")
+@router.get("/api/v1/auth/me")
 async def get_current_user(request: Request):
     """Get current authenticated user"""
     user = await require_user(request)
@@ -310,7 +389,7 @@ async def get_current_user(request: Request):
 # JOB ENDPOINTS
 # ============================================================================
 
-@app.get("/api/v1/jobs")
+@router.get("/api/v1/jobs")
 async def list_jobs(
     trade_code: Optional[str] = None,
     location: Optional[str] = None,
@@ -326,11 +405,11 @@ async def list_jobs(
     if location:
         query["location"] = {"$regex": location, "$options": "i"}
     
-    jobs = await db.jobs.find(query, {"_id": 0}).to_list(100)
+    jobs = await databases.reads().jobs.find(query, {"_id": 0}).to_list(100)
     
     return {"jobs": jobs, "count": len(jobs)}
 
-@app.post("/api/v1/jobs")
+@router.post("/api/v1/jobs")
 async def create_job(job_data: JobCreate, request: Request):
     """Create a new job posting"""
     user = await require_user(request)
@@ -357,10 +436,10 @@ async def create_job(job_data: JobCreate, request: Request):
     
     return {"message": "Job created successfully", "job_id": job_id, "job": job}
 
-@app.get("/api/v1/jobs/{job_id}")
+@router.get("/api/v1/jobs/{job_id}")
 async def get_job(job_id: str):
     """Get job details"""
-    job = await db.jobs.find_one({"job_id": job_id}, {"_id": 0})
+    job = await databases.reads().jobs.find_one({"job_id": job_id}, {"_id": 0})
     
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -371,7 +450,7 @@ async def get_job(job_id: str):
 # WORKER PROFILE ENDPOINTS
 # ============================================================================
 
-@app.get("/api/v1/worker-profiles")
+@router.get("/api/v1/worker-profiles")
 async def list_worker_profiles(
     trade_code: Optional[str] = None,
     availability: Optional[str] = None
@@ -386,11 +465,11 @@ async def list_worker_profiles(
     if availability:
         query["availability"] = availability
     
-    profiles = await db.worker_profiles.find(query, {"_id": 0}).to_list(100)
+    profiles = await databases.reads().worker_profiles.find(query, {"_id": 0}).to_list(100)
     
     return {"profiles": profiles, "count": len(profiles)}
 
-@app.post("/api/v1/worker-profiles")
+@router.post("/api/v1/worker-profiles")
 async def create_worker_profile(profile_data: WorkerProfileCreate, request: Request):
     """Create worker profile"""
     user = await require_user(request)
@@ -426,7 +505,7 @@ async def create_worker_profile(profile_data: WorkerProfileCreate, request: Requ
 # PRODUCTS (E-COMMERCE) ENDPOINTS
 # ============================================================================
 
-@app.get("/api/v1/shop/products")
+@router.get("/api/v1/shop/products")
 async def list_products(
     category: Optional[str] = None,
     active_only: bool = True
@@ -441,21 +520,21 @@ async def list_products(
     if category:
         query["category"] = category
     
-    products = await db.products.find(query, {"_id": 0}).to_list(100)
+    products = await databases.reads().products.find(query, {"_id": 0}).to_list(100)
     
     return {"products": products, "count": len(products)}
 
-@app.get("/api/v1/shop/products/{product_id}")
+@router.get("/api/v1/shop/products/{product_id}")
 async def get_product(product_id: str):
     """Get product details"""
-    product = await db.products.find_one({"product_id": product_id}, {"_id": 0})
+    product = await databases.reads().products.find_one({"product_id": product_id}, {"_id": 0})
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     return {"product": product}
 
-@app.post("/api/v1/shop/checkout")
+@router.post("/api/v1/shop/checkout")
 async def create_checkout_session(request: Request):
     """Create Stripe checkout session for products"""
     data = await request.json()
@@ -489,21 +568,30 @@ async def create_checkout_session(request: Request):
         })
     
     try:
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=line_items,
-            mode='payment',
-            success_url=f'{request.base_url}shop/success?session_id={{CHECKOUT_SESSION_ID}}',
-            cancel_url=f'{request.base_url}shop',
-            client_reference_id=user["user_id"],
-            metadata={'user_id': user["user_id"]}
-        )
+        async with tracing.span("stripe.checkout.Session.create", "stripe"):
+            # One idempotency key for every attempt, so a retry never creates a second session
+            idempotency_key = secrets.token_urlsafe(24)
+            checkout_session = await upstreams["stripe"].call(
+                lambda: stripe.checkout.Session.create_async(
+                    payment_method_types=['card'],
+                    line_items=line_items,
+                    mode='payment',
+                    success_url=f'{request.base_url}shop/success?session_id={{CHECKOUT_SESSION_ID}}',
+                    cancel_url=f'{request.base_url}shop',
+                    client_reference_id=user["user_id"],
+                    metadata={'user_id': user["user_id"]},
+                    idempotency_key=idempotency_key
+                ),
+                idempotent=True
+            )
         
         return {
             "checkout_url": checkout_session.url,
             "session_id": checkout_session.id
         }
         
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -511,12 +599,12 @@ async def create_checkout_session(request: Request):
 # MARKET DATA SUBSCRIPTION ENDPOINTS
 # ============================================================================
 
-@app.get("/api/v1/billing/tiers")
+@router.get("/api/v1/billing/tiers")
 async def get_market_data_tiers():
     """Get available Market Data subscription tiers"""
     return {"tiers": MARKET_DATA_TIERS}
 
-@app.post("/api/v1/subscriptions/subscribe")
+@router.post("/api/v1/subscriptions/subscribe")
 async def create_subscription(subscription_data: SubscriptionCreate, request: Request):
     """Create a new Market Data subscription"""
     user = await require_user(request)
@@ -542,32 +630,39 @@ async def create_subscription(subscription_data: SubscriptionCreate, request: Re
     
     try:
         # Create Stripe Checkout Session
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': 'usd',
-                    'unit_amount': int(tier["price"] * 100),  # Convert to cents
-                    'product_data': {
-                        'name': tier["name"],
-                        'description': tier["description"],
-                    },
-                    'recurring': {
-                        'interval': 'month',
+        async with tracing.span("stripe.checkout.Session.create", "stripe"):
+            # One idempotency key for every attempt, so a retry never creates a second session
+            idempotency_key = secrets.token_urlsafe(24)
+            checkout_session = await upstreams["stripe"].call(
+                lambda: stripe.checkout.Session.create_async(
+                    payment_method_types=['card'],
+                    line_items=[{
+                        'price_data': {
+                            'currency': 'usd',
+                            'unit_amount': int(tier["price"] * 100),  # Convert to cents
+                            'product_data': {
+                                'name': tier["name"],
+                                'description': tier["description"],
+                            },
+                            'recurring': {
+                                'interval': 'month',
+                            },
+                        },
+                        'quantity': 1,
+                    }],
+                    mode='subscription',
+                    success_url=f'{request.base_url}dashboard?session_id={{CHECKOUT_SESSION_ID}}',
+                    cancel_url=f'{request.base_url}market-data',
+                    client_reference_id=user["user_id"],
+                    metadata={
+                        'tier_id': tier_id,
+                        'user_id': user["user_id"],
+                        'tier_name': tier["name"]
                     },
-                },
-                'quantity': 1,
-            }],
-            mode='subscription',
-            success_url=f'{request.base_url}dashboard?session_id={{CHECKOUT_SESSION_ID}}',
-            cancel_url=f'{request.base_url}market-data',
-            client_reference_id=user["user_id"],
-            metadata={
-                'tier_id': tier_id,
-                'user_id': user["user_id"],
-                'tier_name': tier["name"]
-            }
-        )
+                    idempotency_key=idempotency_key
+                ),
+                idempotent=True
+            )
         
         # Create pending subscription record
         subscription_id = "sub_" + secrets.token_urlsafe(16)
@@ -595,10 +690,12 @@ async def create_subscription(subscription_data: SubscriptionCreate, request: Re
             "session_id": checkout_session.id
         }
         
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/v1/subscriptions/current")
+@router.get("/api/v1/subscriptions/current")
 async def get_current_subscription(request: Request):
     """Get user's current subscription"""
     user = await require_user(request)
@@ -613,7 +710,7 @@ async def get_current_subscription(request: Request):
     
     return {"subscription": subscription}
 
-@app.post("/api/v1/subscriptions/cancel")
+@router.post("/api/v1/subscriptions/cancel")
 async def cancel_subscription(request: Request):
     """Cancel user's subscription"""
     user = await require_user(request)
@@ -629,7 +726,11 @@ async def cancel_subscription(request: Request):
     # Cancel in Stripe
     if subscription.get("stripe_subscription_id"):
         try:
-            stripe.Subscription.delete(subscription["stripe_subscription_id"])
+            async with tracing.span("stripe.Subscription.cancel", "stripe"):
+                await upstreams["stripe"].call(
+                    lambda: stripe.Subscription.cancel_async(subscription["stripe_subscription_id"]),
+                    idempotent=True
+                )
         except Exception as e:
             print(f"Error cancelling Stripe subscription: {e}")
     
@@ -645,15 +746,21 @@ async def cancel_subscription(request: Request):
     )
     
     # Revoke access
+    entitlement_service.revoke(user["user_id"])
     await revoke_market_data_access(user["user_id"])
     
     return {"message": "Subscription cancelled successfully"}
 
+@router.get("/api/v1/market-data/entitlement")
+async def get_market_data_entitlement(entitlement: entitlements.Entitlement = Depends(require_entitlement())):
+    """Tier, project limit and features of the caller's active subscription"""
+    return {"entitlement": entitlement.to_dict()}
+
 # ============================================================================
 # STRIPE WEBHOOK HANDLER
 # ============================================================================
 
-@app.post("/api/stripe/webhook")
+@router.post("/api/stripe/webhook")
 async def stripe_webhook(request: Request):
     """Handle Stripe webhooks for subscription events"""
     payload = await request.body()
@@ -710,7 +817,7 @@ async def handle_checkout_success(session):
     access_token = secrets.token_urlsafe(32)
     
     # Update subscription to active
-    result = await db.subscriptions.update_one(
+    sub = await db.subscriptions.find_one_and_update(
         {
             "user_id": user_id,
             "tier_id": tier_id,
@@ -725,8 +832,11 @@ async def handle_checkout_success(session):
                 "market_data_access_token": access_token,
                 "activated_at": now.isoformat()
             }
-        }
+        },
+        projection=entitlements.PROJECTION,
+        return_document=ReturnDocument.AFTER,
     )
+    entitlement_service.apply(sub)
     
     # Create payment transaction record
     await db.payment_transactions.insert_one({
@@ -754,7 +864,7 @@ async def handle_subscription_updated(subscription):
     period_start = datetime.fromtimestamp(subscription['current_period_start'])
     period_end = datetime.fromtimestamp(subscription['current_period_end'])
     
-    await db.subscriptions.update_one(
+    sub = await db.subscriptions.find_one_and_update(
         {"stripe_subscription_id": stripe_subscription_id},
         {
             "$set": {
@@ -762,25 +872,30 @@ async def handle_subscription_updated(subscription):
                 "current_period_end": period_end.isoformat(),
                 "updated_at": datetime.utcnow().isoformat()
             }
-        }
+        },
+        projection=entitlements.PROJECTION,
+        return_document=ReturnDocument.AFTER,
     )
+    entitlement_service.apply(sub)
 
 async def handle_subscription_cancelled(subscription):
     """Handle subscription cancellation"""
     stripe_subscription_id = subscription['id']
     
-    await db.subscriptions.update_one(
+    sub = await db.subscriptions.find_one_and_update(
         {"stripe_subscription_id": stripe_subscription_id},
         {
             "$set": {
                 "status": "cancelled",
                 "cancelled_at": datetime.utcnow().isoformat()
             }
-        }
+        },
+        projection=entitlements.PROJECTION,
+        return_document=ReturnDocument.AFTER,
     )
+    entitlement_service.apply(sub)
     
     # Revoke access in Market Data platform
-    sub = await db.subscriptions.find_one({"stripe_subscription_id": stripe_subscription_id})
     if sub:
         await revoke_market_data_access(sub["user_id"])
 
@@ -791,7 +906,7 @@ async def handle_payment_succeeded(invoice):
     # Extend subscription period
     period_end = datetime.fromtimestamp(invoice['period_end'])
     
-    await db.subscriptions.update_one(
+    sub = await db.subscriptions.find_one_and_update(
         {"stripe_subscription_id": stripe_subscription_id},
         {
             "$set": {
@@ -799,11 +914,13 @@ async def handle_payment_succeeded(invoice):
                 "current_period_end": period_end.isoformat(),
                 "last_payment_at": datetime.utcnow().isoformat()
             }
-        }
+        },
+        projection={**entitlements.PROJECTION, "tier_name": 1},
+        return_document=ReturnDocument.AFTER,
     )
+    entitlement_service.apply(sub)
     
     # Record payment
-    sub = await db.subscriptions.find_one({"stripe_subscription_id": stripe_subscription_id})
     if sub:
         await db.payment_transactions.insert_one({
             "transaction_id": "txn_" + secrets.token_urlsafe(16),
@@ -821,15 +938,18 @@ async def handle_payment_failed(invoice):
     """Handle failed payment"""
     stripe_subscription_id = invoice['subscription']
     
-    await db.subscriptions.update_one(
+    sub = await db.subscriptions.find_one_and_update(
         {"stripe_subscription_id": stripe_subscription_id},
         {
             "$set": {
                 "status": "failed",
                 "payment_failed_at": datetime.utcnow().isoformat()
             }
-        }
+        },
+        projection=entitlements.PROJECTION,
+        return_document=ReturnDocument.AFTER,
     )
+    entitlement_service.apply(sub)
 
 # ============================================================================
 # MARKET DATA ACCESS PROVISIONING
@@ -852,8 +972,9 @@ async def provision_market_data_access(user_id: str, tier_id: str, access_token:
     project_limit = get_project_limit(tier_id)
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        async with httpx.AsyncClient() as client, tracing.span("POST market-data provision-user", "http"):
+            # Provisioning is keyed by user_id, so repeating it is safe
+            response = await upstreams["market_data"].call(lambda: client.post(
                 f"{MARKET_DATA_API_URL}/api/admin/provision-user",
                 headers={
                     "Authorization": f"Bearer {MARKET_DATA_API_KEY}",
@@ -868,8 +989,7 @@ async def provision_market_data_access(user_id: str, tier_id: str, access_token:
                     "access_token": access_token,
                     "features": tier["features"]
                 },
-                timeout=10.0
-            )
+            ), idempotent=True, is_failure=lambda r: r.status_code >= 500)
             
             if response.status_code == 200:
                 print(f"✅ Provisioned Market Data access for user {user_id}")
@@ -883,16 +1003,15 @@ async def revoke_market_data_access(user_id: str):
     """Revoke access in the Market Data platform"""
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        async with httpx.AsyncClient() as client, tracing.span("POST market-data revoke-user", "http"):
+            response = await upstreams["market_data"].call(lambda: client.post(
                 f"{MARKET_DATA_API_URL}/api/admin/revoke-user",
                 headers={
                     "Authorization": f"Bearer {MARKET_DATA_API_KEY}",
                     "Content-Type": "application/json"
                 },
                 json={"user_id": user_id},
-                timeout=10.0
-            )
+            ), idempotent=True, is_failure=lambda r: r.status_code >= 500)
             
             if response.status_code == 200:
                 print(f"✅ Revoked Market Data access for user {user_id}")
@@ -902,21 +1021,32 @@ async def revoke_market_data_access(user_id: str):
     except Exception as e:
         print(f"❌ Error revoking access: {str(e)}")
 
+async def upstream_unavailable(request: Request, exc: resilience.UpstreamUnavailable):
+    """A degraded dependency fails fast; clients may retry once the circuit could close again"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.upstream} is temporarily unavailable ({exc.reason})"},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
 # ============================================================================
 # HEALTH CHECK
 # ============================================================================
 
-@app.get("/api/health")
+@router.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "database": "connected",
+        "pools": databases.pool_stats(),
+        "entitlements": len(entitlement_service),
+        "upstreams": {name: upstream.snapshot() for name, upstream in upstreams.items()},
         "version": "2.0.0"
     }
 
-@app.get("/")
+@router.get("/")
 async def root():
     """Root endpoint"""
     return {
@@ -926,24 +1056,85 @@ async def root():
     }
 
 # ============================================================================
-# STARTUP EVENT
+# LIFESPAN
 # ============================================================================
 
-@app.on_event("startup")
-async def startup_event():
-    """Run on application startup"""
+# Integrations are loaded while the instance is not yet ready, never by the first request that needs them
+prewarm = coldstart.Prewarmer()
+
+@prewarm.register("stripe")
+def prewarm_stripe():
+    stripe.checkout.Session, stripe.Subscription, stripe.Webhook
+
+@prewarm.register("mongo")
+async def prewarm_mongo():
+    # One connection per workload pool before traffic arrives
+    await asyncio.gather(*(target.command("ping") for target in (databases.write, databases.reads(), databases.background)))
+
+@prewarm.register("entitlements")
+async def prewarm_entitlements():
+    # Gated routes answer from memory from the first request on
+    await entitlement_service.refresh(databases.write)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Pre-warm and start background refreshes before serving; stop them on shutdown"""
     print("🚀 HDrywall Pro Platform API starting...")
     print(f"📊 Database: {DB_NAME}")
-    print(f"💳 Stripe Mode: {'Live' if stripe.api_key.startswith('sk_live') else 'Test'}")
     print(f"🔗 Market Data API: {MARKET_DATA_API_URL}")
+    await prewarm.run()
+    print(f"💳 Stripe Mode: {'Live' if stripe.api_key.startswith('sk_live') else 'Test'}")
+    app.state.startup_report = coldstart.startup_report(
+        import_timer, prewarm, time.perf_counter() - import_timer.started_at)
+    print(f"⏱️  {coldstart.format_report(app.state.startup_report)}")
+    background_tasks = [asyncio.create_task(entitlement_service.run(databases.write))]
+    if app.state.trace_exporter:
+        background_tasks.append(asyncio.create_task(app.state.trace_exporter.run()))
     print("✅ Server ready!")
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        databases.close()
+        print("👋 Server shutdown complete")
 
 # ============================================================================
-# SHUTDOWN EVENT
+# APP FACTORY
 # ============================================================================
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Run on application shutdown"""
-    mongo_client.close()
-    print("👋 Server shutdown complete")
+def create_app(dbs: Optional[database.Databases] = None) -> FastAPI:
+    """
+    Build the ASGI app around `dbs` (by default the MongoDB at MONGO_URL);
+    serve with `uvicorn server:app` or `uvicorn server:create_app --factory`
+    """
+    init_services(dbs or connect_databases())
+    app = FastAPI(
+        title="HDrywall Pro Platform API",
+        description="Professional contractor/subcontractor job matching with e-commerce",
+        version="2.0.0",
+        lifespan=lifespan
+    )
+    app.include_router(router)
+    app.add_exception_handler(resilience.UpstreamUnavailable, upstream_unavailable)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Request tracing - X-Request-ID / Server-Timing on every response, optional OTLP export
+    app.state.trace_exporter = tracing.build_exporter()
+    app.add_middleware(tracing.TracingMiddleware, exporter=app.state.trace_exporter)
+
+    # Read-your-writes - browse reads go to the primary for a short window after the caller's own write
+    app.add_middleware(
+        database.ReadYourWritesMiddleware,
+        window=float(os.environ.get("READ_YOUR_WRITES_SECONDS", "10")),
+    )
+    return app
+
+app = create_app()
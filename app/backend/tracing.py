@@ -0,0 +1,324 @@
+"""
+Request-scoped tracing with per-span timing.
+
+A contextvar carries the current request's trace (correlation ID plus spans).
+Motor calls are timed by wrapping the database handle, outbound HTTP/Stripe
+calls with `span()`. Every response gets X-Request-ID and a Server-Timing
+header; finished traces can be exported as OTLP/JSON to a local file or an
+OTLP/HTTP collector (TRACE_EXPORT=file:/path or TRACE_EXPORT=http://host:4318/v1/traces).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import secrets
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "hdrywall-api")
+
+# OTLP span kinds
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+class Span:
+    __slots__ = ("span_id", "name", "category", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, category: str, start_ns: int, attributes: Optional[Dict[str, Any]] = None):
+        self.span_id = secrets.token_hex(8)
+        self.name = name
+        self.category = category
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.attributes = attributes or {}
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+class Trace:
+    def __init__(self, request_id: Optional[str] = None):
+        self.trace_id = secrets.token_hex(16)
+        self.request_id = request_id or self.trace_id
+        self.root = Span("request", "app", time.time_ns())
+        self.spans: List[Span] = []
+
+    def timings(self) -> Dict[str, List[float]]:
+        """Total milliseconds and span count per category"""
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans:
+            entry = totals.setdefault(span.category, [0.0, 0])
+            entry[0] += span.duration_ms
+            entry[1] += 1
+        return totals
+
+    def server_timing(self) -> str:
+        parts = [f'{category};dur={total:.1f};desc="{count} calls"' for category, (total, count) in self.timings().items()]
+        parts.append(f"total;dur={(time.time_ns() - self.root.start_ns) / 1e6:.1f}")
+        return ", ".join(parts)
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+def request_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.request_id if trace else None
+
+@asynccontextmanager
+async def span(name: str, category: str, **attributes):
+    """Time a block as a span of the current request (no-op outside a request)"""
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, category, time.time_ns(), attributes)
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        trace.spans.append(current)
+
+# ================== MOTOR ==================
+
+_COLLECTION_COROUTINES = {
+    "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "count_documents", "estimated_document_count", "distinct",
+    "bulk_write", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "create_index", "create_indexes",
+}
+
+class TracedCursor:
+    """Wraps a Motor cursor; to_list is one span, async iteration one span for the whole scan"""
+
+    def __init__(self, cursor, name: str, attributes: Dict[str, Any]):
+        self._cursor = cursor
+        self._name = name
+        self._attributes = attributes
+        self._iter_span: Optional[Span] = None
+        self._waited_ns = 0
+
+    def __getattr__(self, attr):
+        value = getattr(self._cursor, attr)
+        if not callable(value):
+            return value
+
+        def chain(*args, **kwargs):
+            result = value(*args, **kwargs)
+            return self if result is self._cursor else result
+        return chain
+
+    async def to_list(self, length=None):
+        async with span(self._name, "db", **self._attributes):
+            return await self._cursor.to_list(length)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        trace = _current.get()
+        start = time.time_ns()
+        if trace is not None and self._iter_span is None:
+            self._iter_span = Span(self._name, "db", start, dict(self._attributes))
+        try:
+            return await self._cursor.__anext__()
+        except StopAsyncIteration:
+            if trace is not None and self._iter_span is not None:
+                self._iter_span.end_ns = self._iter_span.start_ns + self._waited_ns + (time.time_ns() - start)
+                trace.spans.append(self._iter_span)
+            raise
+        finally:
+            self._waited_ns += time.time_ns() - start
+
+class TracedCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        name = f"mongo.{attr} {self._collection.name}"
+        attributes = {"db.system": "mongodb", "db.collection": self._collection.name, "db.operation": attr}
+        if attr in ("find", "aggregate"):
+            return lambda *args, **kwargs: TracedCursor(value(*args, **kwargs), name, attributes)
+        if attr in _COLLECTION_COROUTINES:
+            async def traced(*args, **kwargs):
+                async with span(name, "db", **attributes):
+                    return await value(*args, **kwargs)
+            return traced
+        return value
+
+class TracedDatabase:
+    """Drop-in wrapper for an AsyncIOMotorDatabase that records a span per call"""
+
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name: str) -> TracedCollection:
+        return TracedCollection(self._database[name])
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        value = getattr(self._database, attr)
+        if attr == "command":
+            async def traced(*args, **kwargs):
+                async with span("mongo.command", "db", **{"db.system": "mongodb"}):
+                    return await value(*args, **kwargs)
+            return traced
+        if hasattr(value, "find_one"):
+            return TracedCollection(value)
+        return value
+
+    def unwrap(self):
+        return self._database
+
+# ================== HTTP ==================
+
+class TracingMiddleware:
+    """Starts a trace per request and adds X-Request-ID / Server-Timing to the response"""
+
+    def __init__(self, app, exporter: Optional["Exporter"] = None):
+        self.app = app
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        incoming = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                incoming = value.decode("latin-1")[:128]
+                break
+        trace = Trace(incoming)
+        token = _current.set(trace)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                trace.root.attributes["http.status_code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", trace.request_id.encode("latin-1")))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            trace.root.end_ns = time.time_ns()
+            route = scope.get("route")
+            trace.root.name = f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
+            trace.root.attributes.update({"http.method": scope["method"], "http.target": scope["path"]})
+            if self.exporter:
+                self.exporter.submit(trace)
+
+# ================== EXPORT ==================
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def _otlp_span(trace: Trace, span_: Span, kind: int, parent: Optional[str]) -> Dict[str, Any]:
+    doc = {
+        "traceId": trace.trace_id,
+        "spanId": span_.span_id,
+        "name": span_.name,
+        "kind": kind,
+        "startTimeUnixNano": str(span_.start_ns),
+        "endTimeUnixNano": str(span_.end_ns),
+        "attributes": [_attribute(k, v) for k, v in span_.attributes.items()],
+    }
+    if parent:
+        doc["parentSpanId"] = parent
+    return doc
+
+def to_otlp(traces: List[Trace]) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of finished traces"""
+    spans = []
+    for trace in traces:
+        root = trace.root
+        root.attributes["request_id"] = trace.request_id
+        spans.append(_otlp_span(trace, root, KIND_SERVER, None))
+        for child in trace.spans:
+            spans.append(_otlp_span(trace, child, KIND_CLIENT, root.span_id))
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": "hdrywall.tracing"}, "spans": spans}],
+    }]}
+
+class Exporter:
+    """Buffers finished traces and writes them in batches from a background task"""
+
+    def __init__(self, target: str, sample_rate: float = 1.0, max_queue: int = 10_000, interval: float = 2.0):
+        self.target = target
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._queue: "asyncio.Queue[Trace]" = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def submit(self, trace: Trace):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _drain(self) -> List[Trace]:
+        traces = []
+        while not self._queue.empty():
+            traces.append(self._queue.get_nowait())
+        return traces
+
+    async def _write(self, traces: List[Trace]):
+        payload = to_otlp(traces)
+        if self.target.startswith("file:"):
+            line = json.dumps(payload) + "\n"
+            await asyncio.to_thread(self._append, self.target[len("file:"):], line)
+        else:
+            import httpx
+
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                await client.post(self.target, json=payload)
+
+    @staticmethod
+    def _append(path: str, line: str):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def flush(self):
+        traces = self._drain()
+        if not traces:
+            return
+        try:
+            await self._write(traces)
+        except Exception as e:
+            logger.warning("Trace export failed (%d traces dropped): %s", len(traces), e)
+
+    async def run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                await self.flush()
+        finally:
+            await self.flush()
+
+def build_exporter() -> Optional[Exporter]:
+    target = os.environ.get("TRACE_EXPORT")
+    if not target:
+        return None
+    return Exporter(target, sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "1.0")))
@@ -0,0 +1,337 @@
+"""
+Saved job searches and alert delivery.
+
+Matching runs the other way round from a search: each saved search is stored
+with the index terms it would match ("trade|location", with "*" for "any"),
+and a new job is turned into the handful of terms it could match. A single
+multikey-index lookup then returns only the candidate searches, so matching a
+posting costs the same with ten or fifty thousand subscribers; the few
+filters that are not part of the terms (state next to a city list, pay type,
+certifications, "all of these trades" via the trade bitmask) are checked on
+the candidates.
+
+New jobs are queued in alert_queue by the endpoint that created them. The
+engine percolates them in the background, writes one outbox entry per
+(search, job) match, and periodically sends one digest per user through a
+pluggable sink:
+
+    ALERT_SINK=log                          # log digests (default)
+    ALERT_SINK=smtp://localhost:1025        # local SMTP server, e.g. MailHog
+    ALERT_SINK=https://hooks.example.com/x  # POST batches of digests as JSON
+"""
+
+import asyncio
+import logging
+import secrets
+import smtplib
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+import trades
+from rollups import parse_pay_rate
+
+logger = logging.getLogger(__name__)
+
+ANY = "*"
+MAX_TRADE_CODES = 10
+MAX_LOCATIONS = 20
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+STALE_CLAIM = timedelta(minutes=10)
+
+def _state(value: str) -> str:
+    return value.strip().upper()
+
+def _city(value: str) -> str:
+    return " ".join(value.strip().lower().split())
+
+def search_terms(trade_codes: List[str], states: List[str], cities: List[str]) -> List[str]:
+    """Index terms of a saved search: trade x location, where location is its most specific filter"""
+    trades = sorted(set(trade_codes)) or [ANY]
+    if cities:
+        locations = sorted({f"c:{_city(c)}" for c in cities})
+    elif states:
+        locations = sorted({f"s:{_state(s)}" for s in states})
+    else:
+        locations = [ANY]
+    return [f"{trade}|{location}" for trade in trades for location in locations]
+
+def job_terms(job: Dict) -> List[str]:
+    """Every search term a job can satisfy"""
+    trades = [*sorted(set(job.get("trade_codes") or [])), ANY]
+    locations = [ANY]
+    if job.get("state"):
+        locations.append(f"s:{_state(job['state'])}")
+    if job.get("city"):
+        locations.append(f"c:{_city(job['city'])}")
+    return [f"{trade}|{location}" for trade in trades for location in locations]
+
+def new_search_doc(user_id: str, name: str, trade_codes: List[str], states: List[str], cities: List[str],
+                   min_pay: Optional[float], pay_type: Optional[str], certifications: List[str],
+                   trade_match: str = trades.MATCH_ANY) -> Dict:
+    trade_codes = sorted(set(trade_codes))
+    # A job with all of the trades has the first one, so that term alone finds every candidate
+    term_trades = trade_codes[:1] if trade_match == trades.MATCH_ALL else trade_codes
+    return {
+        "search_id": f"search_{secrets.token_hex(6)}",
+        "user_id": user_id,
+        "name": name,
+        "trade_codes": trade_codes,
+        "trade_mask": trades.trade_mask(trade_codes),
+        "trade_match": trade_match,
+        "states": sorted({_state(s) for s in states}),
+        "cities": sorted({c.strip() for c in cities}),
+        "min_pay": min_pay or 0.0,
+        "pay_type": pay_type,
+        "certifications": sorted(set(certifications)),
+        "terms": search_terms(term_trades, states, cities),
+        "active": True,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+def residual_match(search: Dict, job: Dict) -> bool:
+    """Filters not covered by the index terms; expects job["trade_mask"] to be set"""
+    if search.get("trade_match") == trades.MATCH_ALL and not trades.mask_matches(
+            job["trade_mask"], search.get("trade_mask", 0), trades.MATCH_ALL):
+        return False
+    if search.get("cities") and search.get("states") and _state(job.get("state") or "") not in search["states"]:
+        return False
+    if search.get("pay_type") and search["pay_type"] != job.get("pay_type"):
+        return False
+    # A search listing certifications only matches jobs the subscriber is certified for
+    if search.get("certifications") and not set(job.get("certifications_required") or []) <= set(search["certifications"]):
+        return False
+    return True
+
+# ================== SINKS ==================
+
+class LogSink:
+    async def send(self, digests: List[Dict]):
+        for digest in digests:
+            logger.info("Job alert digest for %s: %d job(s)", digest["email"], len(digest["jobs"]) + digest["more"])
+
+def render_email(digest: Dict, sender: str) -> EmailMessage:
+    total = len(digest["jobs"]) + digest["more"]
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = digest["email"]
+    message["Subject"] = f"{total} new job{'s' if total != 1 else ''} matching your saved searches"
+    lines = [f"Hi {digest['name']},", ""]
+    for job in digest["jobs"]:
+        lines.append(f"- {job['title']} ({job['city']}, {job['state']}) - {job['pay_rate']} {job['pay_type']}")
+    if digest["more"]:
+        lines.append(f"...and {digest['more']} more.")
+    message.set_content("\n".join(lines) + "\n")
+    return message
+
+class SmtpSink:
+    """One SMTP session per batch of digests; meant for a local relay or mail catcher"""
+
+    def __init__(self, host: str = "localhost", port: int = 25, sender: str = "alerts@hdrywall.com"):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def _send_batch(self, digests: List[Dict]):
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            for digest in digests:
+                smtp.send_message(render_email(digest, self.sender))
+
+    async def send(self, digests: List[Dict]):
+        await asyncio.to_thread(self._send_batch, digests)
+
+class WebhookSink:
+    """POSTs {"digests": [...]} in chunks, so one request carries hundreds of notifications"""
+
+    def __init__(self, url: str, chunk_size: int = 500, timeout: float = 10.0):
+        self.url = url
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    async def send(self, digests: List[Dict]):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            for start in range(0, len(digests), self.chunk_size):
+                response = await client.post(self.url, json={"digests": digests[start:start + self.chunk_size]})
+                response.raise_for_status()
+
+def build_sink(spec: Optional[str], sender: str = "alerts@hdrywall.com"):
+    if not spec or spec == "log":
+        return LogSink()
+    parsed = urlparse(spec)
+    if parsed.scheme == "smtp":
+        return SmtpSink(parsed.hostname or "localhost", parsed.port or 25, sender)
+    if parsed.scheme in ("http", "https"):
+        return WebhookSink(spec)
+    raise ValueError(f"Unsupported ALERT_SINK {spec!r}; use log, smtp://host:port or an http(s) URL")
+
+# ================== ENGINE ==================
+
+class AlertEngine:
+    def __init__(self, db, sink=None, digest_interval: float = 300.0, batch_size: int = 1000,
+                 max_jobs_per_digest: int = 20):
+        self.db = db
+        self.sink = sink or LogSink()
+        self.digest_interval = digest_interval
+        self.batch_size = batch_size
+        self.max_jobs_per_digest = max_jobs_per_digest
+        self._wake = asyncio.Event()
+
+    async def ensure_indexes(self):
+        await self.db.saved_searches.create_index([("terms", 1), ("min_pay", 1)], partialFilterExpression={"active": True})
+        await self.db.saved_searches.create_index([("user_id", 1), ("created_at", -1)])
+        await self.db.saved_searches.create_index("search_id", unique=True)
+        await self.db.alert_queue.create_index("claimed_at")
+        await self.db.alert_outbox.create_index([("search_id", 1), ("job_id", 1)], unique=True)
+        await self.db.alert_outbox.create_index([("status", 1), ("user_id", 1)])
+        await self.db.alert_outbox.create_index("sent_at", expireAfterSeconds=SENT_RETENTION_SECONDS)
+
+    async def enqueue(self, job_ids: Iterable[str]):
+        """Queue newly created jobs for matching; call after they are written"""
+        docs = [{"job_id": job_id, "enqueued_at": datetime.now(timezone.utc), "claimed_at": None} for job_id in job_ids]
+        if docs:
+            await self.db.alert_queue.insert_many(docs, ordered=False)
+            self._wake.set()
+
+    async def percolate(self, job: Dict) -> int:
+        """Write an outbox entry for every active saved search matching the job; returns the match count"""
+        if job.get("status", "active") != "active":
+            return 0
+        pay = parse_pay_rate(job.get("pay_rate"))
+        job = {**job, "trade_mask": trades.doc_mask(job)}
+        query = {"active": True, "terms": {"$in": job_terms(job)}, "min_pay": {"$lte": pay if pay is not None else 0.0}}
+        projection = {"_id": 0, "search_id": 1, "user_id": 1, "states": 1, "cities": 1, "pay_type": 1, "certifications": 1,
+                      "trade_mask": 1, "trade_match": 1}
+        entries: List[Dict] = []
+        matched = 0
+        now = datetime.now(timezone.utc)
+        async for search in self.db.saved_searches.find(query, projection).batch_size(self.batch_size):
+            if search["user_id"] == job.get("contractor_id") or not residual_match(search, job):
+                continue
+            entries.append({"search_id": search["search_id"], "user_id": search["user_id"], "job_id": job["job_id"],
+                            "status": "pending", "created_at": now})
+            if len(entries) >= self.batch_size:
+                matched += await self._write_outbox(entries)
+                entries = []
+        matched += await self._write_outbox(entries)
+        return matched
+
+    async def _write_outbox(self, entries: List[Dict]) -> int:
+        if not entries:
+            return 0
+        try:
+            await self.db.alert_outbox.insert_many(entries, ordered=False)
+            return len(entries)
+        except BulkWriteError as e:
+            # A retried job re-matches searches it already reached; the unique index drops those
+            duplicates = sum(1 for err in e.details.get("writeErrors", []) if err.get("code") == 11000)
+            if duplicates != len(e.details.get("writeErrors", [])):
+                raise
+            return len(entries) - duplicates
+
+    async def percolate_queued(self) -> int:
+        """Match every queued job; claims are per job so several workers can share the queue"""
+        processed = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            item = await self.db.alert_queue.find_one_and_update(
+                {"$or": [{"claimed_at": None}, {"claimed_at": {"$lt": now - STALE_CLAIM}}]},
+                {"$set": {"claimed_at": now}},
+                sort=[("enqueued_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if item is None:
+                return processed
+            job = await self.db.jobs.find_one({"job_id": item["job_id"]}, {"_id": 0})
+            if job:
+                matched = await self.percolate(job)
+                logger.debug("Job %s matched %d saved searches", job["job_id"], matched)
+            await self.db.alert_queue.delete_one({"_id": item["_id"]})
+            processed += 1
+
+    async def flush_digests(self) -> int:
+        """Send pending outbox entries as one digest per user; returns the number of digests sent"""
+        sent = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            claimable = {"$or": [{"status": "pending"}, {"status": "sending", "claimed_at": {"$lt": now - STALE_CLAIM}}]}
+            # Claims are per user, never per entry: a user's pending entries all go out in one digest
+            user_ids = [doc["_id"] async for doc in self.db.alert_outbox.aggregate([
+                {"$match": claimable},
+                {"$group": {"_id": "$user_id"}},
+                {"$limit": self.batch_size},
+            ])]
+            if not user_ids:
+                return sent
+            claim = secrets.token_hex(8)
+            await self.db.alert_outbox.update_many(
+                {"user_id": {"$in": user_ids}, **claimable},
+                {"$set": {"status": "sending", "claim": claim, "claimed_at": now}},
+            )
+            entries = await self.db.alert_outbox.find({"claim": claim}, {"user_id": 1, "job_id": 1}).to_list(None)
+            if not entries:
+                continue
+            digests = await self._build_digests(entries)
+            try:
+                if digests:
+                    await self.sink.send(digests)
+            except Exception as e:
+                logger.warning("Sending %d job alert digests failed: %s", len(digests), e)
+                await self.db.alert_outbox.update_many({"claim": claim}, {"$set": {"status": "pending"}, "$unset": {"claim": ""}})
+                return sent
+            await self.db.alert_outbox.update_many({"claim": claim}, {"$set": {"status": "sent", "sent_at": now}})
+            sent += len(digests)
+
+    async def _build_digests(self, entries: List[Dict]) -> List[Dict]:
+        job_ids_by_user: Dict[str, List[str]] = {}
+        for entry in entries:
+            job_ids = job_ids_by_user.setdefault(entry["user_id"], [])
+            if entry["job_id"] not in job_ids:
+                job_ids.append(entry["job_id"])
+        matched = {job_id for job_ids in job_ids_by_user.values() for job_id in job_ids}
+        job_fields = {"_id": 0, "job_id": 1, "title": 1, "city": 1, "state": 1, "pay_rate": 1, "pay_type": 1, "trade_codes": 1}
+        # Jobs closed, filled or expired since they matched are left out (their entries are still marked sent)
+        jobs = {
+            job["job_id"]: job
+            async for job in self.db.jobs.find({"job_id": {"$in": list(matched)}, "status": "active"}, job_fields)
+        }
+        users = {
+            user["user_id"]: user
+            async for user in self.db.users.find({"user_id": {"$in": list(job_ids_by_user)}}, {"_id": 0, "user_id": 1, "email": 1, "name": 1})
+        }
+        digests = []
+        for user_id, job_ids in job_ids_by_user.items():
+            user = users.get(user_id)
+            live = [jobs[job_id] for job_id in job_ids if job_id in jobs]
+            if user and live:
+                digests.append({
+                    "user_id": user_id,
+                    "email": user["email"],
+                    "name": user["name"],
+                    "jobs": live[:self.max_jobs_per_digest],
+                    "more": max(len(live) - self.max_jobs_per_digest, 0),
+                })
+        return digests
+
+    async def run(self):
+        """Percolate queued jobs as they arrive and send digests every digest_interval seconds"""
+        loop = asyncio.get_running_loop()
+        next_digest = loop.time() + self.digest_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(min(next_digest - loop.time(), 30.0), 0))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.percolate_queued()
+                if loop.time() >= next_digest:
+                    next_digest = loop.time() + self.digest_interval
+                    await self.flush_digests()
+            except Exception as e:
+                logger.warning("Job alert processing failed: %s", e)
@@ -0,0 +1,159 @@
+"""
+Hot/cold separation for jobs, worker profiles and payment transactions.
+
+Closed jobs, inactive profiles and payment transactions older than a cutoff
+are moved, in batches, into "<collection>_archive". The live collections then
+only hold what browse pages query, and their indexes are partial on
+status "active", so the working set tracks live listings rather than total
+history.
+
+Each batch is copied before it is deleted, and the delete re-checks the
+archive condition: a crash in between leaves a document in both places (the
+next run finishes the move), and a document that became live again in the
+meantime stays live and its archive copy is dropped.
+
+    python archiver.py --days 90
+"""
+
+import argparse
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReplaceOne
+
+ARCHIVE_SUFFIX = "_archive"
+
+@dataclass(frozen=True)
+class Policy:
+    id_field: str
+    # Documents that may be archived at all, regardless of age
+    condition: Dict[str, Any]
+    # Age is measured from the first of these fields that is set
+    age_fields: tuple = ("created_at",)
+    days: int = 90
+
+POLICIES: Dict[str, Policy] = {
+    "jobs": Policy("job_id", {"status": {"$ne": "active"}}, ("closed_at", "created_at")),
+    "worker_profiles": Policy("profile_id", {"status": {"$ne": "active"}}, ("updated_at", "created_at"), days=180),
+    # Subscription payments stay live: they back the Enterprise export check
+    "payment_transactions": Policy("transaction_id", {"type": {"$ne": "market_data_subscription"}}, days=365),
+}
+
+def archive_name(collection: str) -> str:
+    return collection + ARCHIVE_SUFFIX
+
+def archive_query(policy: Policy, cutoff: str) -> Dict[str, Any]:
+    """policy.condition AND older than cutoff by the first age field that is set"""
+    clauses = []
+    for i, field in enumerate(policy.age_fields):
+        clause: Dict[str, Any] = {field: {"$lt": cutoff}}
+        for earlier in policy.age_fields[:i]:
+            clause[earlier] = None
+        clauses.append(clause)
+    return {**policy.condition, "$or": clauses}
+
+async def ensure_indexes(db):
+    # Live collections: browse queries always filter on status "active"
+    live = {"status": "active"}
+    await db.jobs.create_index("job_id", unique=True)
+    await db.jobs.create_index([("created_at", -1)], partialFilterExpression=live, name="live_created_at")
+    await db.jobs.create_index([("contractor_id", 1), ("created_at", -1)])
+    await db.worker_profiles.create_index("profile_id", unique=True)
+    await db.worker_profiles.create_index("user_id")
+    await db.worker_profiles.create_index([("created_at", -1)], partialFilterExpression=live, name="live_created_at")
+    await db.payment_transactions.create_index("session_id")
+    await db.payment_transactions.create_index([("user_id", 1), ("type", 1)])
+    await db.payment_transactions.create_index("created_at")
+    for collection, policy in POLICIES.items():
+        await db[archive_name(collection)].create_index(policy.id_field)
+        await db[archive_name(collection)].create_index("archived_at")
+        await db[archive_name(collection)].create_index([("created_at", -1)])
+    # Owners' own listings (dashboard, one profile per user) include their archived ones
+    await db[archive_name("jobs")].create_index([("contractor_id", 1), ("created_at", -1)])
+    await db[archive_name("worker_profiles")].create_index("user_id")
+
+async def archive_collection(db, collection: str, days: Optional[int] = None, batch_size: int = 500,
+                             now: Optional[datetime] = None) -> int:
+    """Move every archivable document older than `days` (default: the policy's); returns the number moved"""
+    policy = POLICIES[collection]
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=policy.days if days is None else days)).isoformat()
+    query = archive_query(policy, cutoff)
+    live, archive = db[collection], db[archive_name(collection)]
+
+    moved = 0
+    while True:
+        docs: List[Dict] = await live.find(query).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return moved
+        ids = [doc["_id"] for doc in docs]
+        await archive.bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, {**doc, "archived_at": now}, upsert=True) for doc in docs],
+            ordered=False
+        )
+        result = await live.delete_many({"_id": {"$in": ids}, **query})
+        moved += result.deleted_count
+        if result.deleted_count < len(ids):
+            # Changed back in the meantime (e.g. reactivated): keep the live copy only
+            still_live = [doc["_id"] async for doc in live.find({"_id": {"$in": ids}}, {"_id": 1})]
+            await archive.delete_many({"_id": {"$in": still_live}})
+            if result.deleted_count == 0:
+                return moved
+        if len(docs) < batch_size:
+            return moved
+
+async def archive_all(db, days: Optional[int] = None, batch_size: int = 500) -> Dict[str, int]:
+    return {collection: await archive_collection(db, collection, days, batch_size) for collection in POLICIES}
+
+async def find_one_with_archive(db, collection: str, query: Dict[str, Any],
+                                projection: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+    """find_one on the live collection, falling back to its archive (marked archived=True)"""
+    doc = await db[collection].find_one(query, projection)
+    if doc is None:
+        doc = await db[archive_name(collection)].find_one(query, projection)
+        if doc is not None:
+            doc["archived"] = True
+    return doc
+
+async def find_with_archive(db, collection: str, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None,
+                            sort_field: str = "created_at", limit: int = 100) -> List[Dict]:
+    """Newest `limit` matches across the live collection and its archive; archived ones are marked archived=True"""
+    live = await db[collection].find(query, projection).sort(sort_field, -1).to_list(limit)
+    archived = await db[archive_name(collection)].find(query, projection).sort(sort_field, -1).to_list(limit)
+    for doc in archived:
+        doc["archived"] = True
+    return sorted(live + archived, key=lambda doc: doc.get(sort_field) or "", reverse=True)[:limit]
+
+async def restore(db, collection: str, query: Dict[str, Any], updates: Dict[str, Any]) -> Optional[Dict]:
+    """
+    Move one archived document back to the live collection with `updates` applied; returns it as it
+    was archived. `updates` should make it live (e.g. status "active"), so archiving leaves it there.
+    """
+    doc = await db[archive_name(collection)].find_one(query)
+    if doc is None:
+        return None
+    doc.pop("archived_at", None)
+    await db[collection].replace_one({"_id": doc["_id"]}, {**doc, **updates}, upsert=True)
+    await db[archive_name(collection)].delete_one({"_id": doc["_id"]})
+    return doc
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Move closed jobs, inactive profiles and old transactions to archive collections")
+    parser.add_argument("--days", type=int, default=None, help="age cutoff for every collection (default: per collection)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("DB_NAME", "test_database")]
+    await ensure_indexes(db)
+    report = await archive_all(db, args.days, args.batch_size)
+    print(", ".join(f"{collection}: {count} archived" for collection, count in report.items()))
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for hot helpers and response serialization.
+
+Each benchmark is timed with auto-calibrated loops over several repeats; the
+best and median time per call are reported. Runs can be saved as a baseline,
+appended to a history file, and compared against the baseline:
+
+    python benchmarks.py                         # run and compare with the baseline
+    python benchmarks.py --save-baseline         # run and store as the new baseline
+    python benchmarks.py -k cart --repeat 9      # only benchmarks matching "cart"
+    python benchmarks.py --fail-on-regression    # exit 1 if anything got slower than --threshold
+
+Timings depend on the machine, so no baseline is committed: record one on the
+machine that runs the comparison. Without one every benchmark is reported as
+"no baseline", and --fail-on-regression exits 2 instead of passing.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmarks")
+
+import server  # noqa: E402
+import trades  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+ROOT_DIR = Path(__file__).parent
+BASELINE_PATH = ROOT_DIR / "benchmark_baseline.json"
+HISTORY_PATH = ROOT_DIR / "benchmark_history.jsonl"
+
+BENCHMARKS: Dict[str, Callable[[], Callable]] = {}
+
+def benchmark(name: str):
+    """Register a setup function returning the callable (sync or async) to time"""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+# ================== FIXTURES ==================
+
+_rng = random.Random(1234)
+_codes = list(server.TRADE_CODES)
+
+def _job(i: int) -> Dict:
+    return {
+        "job_id": f"job_{i:012d}", "contractor_id": "user_bench", "contractor_name": "Bench Contractor",
+        "title": f"Job {i}", "description": "Hang and finish drywall " * 8, "trade_codes": _rng.sample(_codes, 2),
+        "location": "Site", "city": "Austin", "state": "TX", "pay_rate": "35", "pay_type": "hourly",
+        "duration": "2 weeks", "certifications_required": ["OSHA 10"], "experience_years": 3,
+        "status": "active", "created_at": "2026-01-01T00:00:00+00:00",
+    }
+
+def _profile(i: int) -> Dict:
+    return {
+        "profile_id": f"profile_{i:012d}", "user_id": f"user_{i:012d}", "name": f"Worker {i}",
+        "headline": "Drywall finisher", "bio": "Level 5 finishes " * 8, "trade_codes": _rng.sample(_codes, 2),
+        "skills": ["taping", "mudding", "texture"], "experience_years": 8, "certifications": ["OSHA 30"],
+        "location": "Home", "city": "Austin", "state": "TX", "availability": "immediate",
+        "hourly_rate_min": 28.0, "hourly_rate_max": 42.0, "status": "active", "created_at": "2026-01-01T00:00:00+00:00",
+    }
+
+def _product(i: int) -> Dict:
+    return {
+        "product_id": f"prod_{i:012d}", "name": f"Tool {i}", "description": "Professional grade " * 6,
+        "category": "Tools", "price": round(_rng.uniform(5, 300), 2), "compare_price": None,
+        "image_url": "https://example.com/tool.png", "stock": 100, "sku": f"SKU-{i:06d}", "active": True,
+        "created_at": "2026-01-01T00:00:00+00:00",
+    }
+
+BENCH_USER = {"user_id": "user_bench", "email": "bench@example.com", "name": "Bench Contractor",
+              "user_type": "contractor", "picture": None, "created_at": "2026-01-01T00:00:00+00:00"}
+
+class _StubCollection:
+    def __init__(self, doc: Optional[Dict]):
+        self.doc = doc
+
+    async def find_one(self, *args, **kwargs):
+        return self.doc
+
+class _StubDatabase:
+    def __init__(self, **collections):
+        self.__dict__.update(collections)
+
+def _request(headers: Dict[str, str]) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/api/auth/me", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    })
+
+# ================== BENCHMARKS ==================
+
+@benchmark("auth.create_token")
+def bench_create_token():
+    return lambda: server.create_token(BENCH_USER, 0)
+
+@benchmark("auth.verify_token")
+def bench_verify_token():
+    token = server.create_token(BENCH_USER, 0)
+    return lambda: server.verify_token(token)
+
+@benchmark("auth.get_current_user.bearer")
+def bench_get_current_user():
+    token = server.create_token(BENCH_USER, 0)
+    server.db = _StubDatabase(users=_StubCollection(BENCH_USER), user_sessions=_StubCollection(None))
+    request = _request({"Authorization": f"Bearer {token}"})
+    return lambda: server.get_current_user(request)
+
+@benchmark("auth.get_current_user.anonymous")
+def bench_get_current_user_anonymous():
+    server.db = _StubDatabase(users=_StubCollection(None), user_sessions=_StubCollection(None))
+    request = _request({})
+    return lambda: server.get_current_user(request)
+
+def _cart_fixture(size: int):
+    products = [_product(i) for i in range(size)]
+    items = [{"product_id": p["product_id"], "quantity": _rng.randint(1, 5)} for p in products]
+    return items, {p["product_id"]: p for p in products}
+
+@benchmark("cart.price_items.10")
+def bench_price_cart_10():
+    items, products_map = _cart_fixture(10)
+    return lambda: server.price_cart_items(items, products_map)
+
+@benchmark("cart.price_items.100")
+def bench_price_cart_100():
+    items, products_map = _cart_fixture(100)
+    return lambda: server.price_cart_items(items, products_map)
+
+def _serialize(model, docs: List[Dict]):
+    return lambda: [model(**doc) for doc in docs]
+
+for _rows in (100, 1000):
+    benchmark(f"serialize.JobResponse.{_rows}")(lambda n=_rows: _serialize(server.JobResponse, [_job(i) for i in range(n)]))
+    benchmark(f"serialize.WorkerProfileResponse.{_rows}")(
+        lambda n=_rows: _serialize(server.WorkerProfileResponse, [_profile(i) for i in range(n)]))
+    benchmark(f"serialize.ProductResponse.{_rows}")(
+        lambda n=_rows: _serialize(server.ProductResponse, [_product(i) for i in range(n)]))
+
+@benchmark("trade_codes.filter_jobs.1000")
+def bench_trade_code_filter():
+    jobs = [_job(i) for i in range(1000)]
+    return lambda: [job for job in jobs if "09" in job["trade_codes"]]
+
+@benchmark("trade_mask.filter_jobs_any.1000")
+def bench_trade_mask_filter():
+    jobs = [{**job, "trade_mask": trades.trade_mask(job["trade_codes"])} for job in (_job(i) for i in range(1000))]
+    wanted = trades.trade_mask(["06", "09"])
+    return lambda: [job for job in jobs if job["trade_mask"] & wanted]
+
+@benchmark("trade_codes.label_jobs.1000")
+def bench_trade_code_labels():
+    jobs = [_job(i) for i in range(1000)]
+    return lambda: [[server.TRADE_CODES.get(code, code) for code in job["trade_codes"]] for job in jobs]
+
+# ================== RUNNER ==================
+
+def _timer(fn: Callable, loop: asyncio.AbstractEventLoop) -> Callable[[int], float]:
+    """Return a function timing `loops` calls of fn, awaiting it when it returns a coroutine"""
+    if asyncio.iscoroutine(probe := fn()):
+        loop.run_until_complete(probe)
+
+        async def run_async(loops: int) -> float:
+            start = time.perf_counter()
+            for _ in range(loops):
+                await fn()
+            return time.perf_counter() - start
+        return lambda loops: loop.run_until_complete(run_async(loops))
+
+    def run_sync(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter() - start
+    return run_sync
+
+def measure(fn: Callable, loop: asyncio.AbstractEventLoop, repeat: int = 5, min_time: float = 0.1) -> Dict:
+    timer = _timer(fn, loop)
+    loops = 1
+    while (elapsed := timer(loops)) < min_time and loops < 10_000_000:
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+    per_call = sorted(timer(loops) / loops for _ in range(repeat))
+    return {
+        "loops": loops,
+        "best_us": round(per_call[0] * 1e6, 3),
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+    }
+
+def run_benchmarks(pattern: Optional[str] = None, repeat: int = 5, min_time: float = 0.1) -> Dict[str, Dict]:
+    saved_db = server.db
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if pattern and pattern not in name:
+                continue
+            results[name] = measure(setup(), loop, repeat, min_time)
+            server.db = saved_db
+            print(f"  {name:<42} {results[name]['best_us']:>12.3f} us", file=sys.stderr)
+    finally:
+        server.db = saved_db
+        loop.close()
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """Per-benchmark change in best time against the baseline; positive means slower"""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            rows.append({"name": name, "best_us": current["best_us"], "baseline_us": None, "change": None, "status": "new"})
+            continue
+        change = current["best_us"] / previous["best_us"] - 1 if previous["best_us"] else 0.0
+        status = "regressed" if change > threshold else "improved" if change < -threshold else "unchanged"
+        rows.append({"name": name, "best_us": current["best_us"], "baseline_us": previous["best_us"],
+                     "change": round(change, 4), "status": status})
+    return rows
+
+def format_report(rows: List[Dict]) -> str:
+    lines = [f"{'benchmark':<42} {'baseline us':>12} {'current us':>12} {'change':>9}  status"]
+    for row in rows:
+        baseline = f"{row['baseline_us']:.3f}" if row["baseline_us"] is not None else "-"
+        change = f"{row['change']:+.1%}" if row["change"] is not None else "-"
+        lines.append(f"{row['name']:<42} {baseline:>12} {row['best_us']:>12.3f} {change:>9}  {row['status']}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per repeat")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.pattern, args.repeat, args.min_time)
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+    baseline = {}
+    has_baseline = args.baseline.exists()
+    if has_baseline:
+        baseline = json.loads(args.baseline.read_text()).get("results", {})
+    rows = compare(results, baseline, args.threshold)
+    if not has_baseline:
+        for row in rows:
+            row["status"] = "no baseline"
+    print(json.dumps({"run": run, "baseline": str(args.baseline) if has_baseline else None, "comparison": rows}, indent=2)
+          if args.json else format_report(rows))
+    if not has_baseline and not args.save_baseline:
+        print(f"No baseline at {args.baseline}; nothing was compared. Record one with --save-baseline.", file=sys.stderr)
+
+    if args.save_baseline:
+        merged = {**baseline, **results}
+        args.baseline.write_text(json.dumps({**run, "results": merged}, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+    if args.fail_on_regression:
+        if not has_baseline and not args.save_baseline:
+            sys.exit(2)
+        if any(row["status"] == "regressed" for row in rows):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Streaming CSV / NDJSON parsing for bulk imports and encoding for exports.
+
+Uploads are consumed chunk by chunk from the request stream and exports are
+written batch by batch from a Motor cursor, so memory use is bounded by the
+chunk / batch size, not the file size.
+"""
+
+import codecs
+import csv
+import io
+import json
+import re
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+# (row number, parsed record, error message) - exactly one of record / error is set
+ParsedRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+LIST_SEPARATOR = re.compile(r"\s*[;|]\s*")
+
+# Longest line buffered while waiting for its newline; longer ones are reported and skipped
+MAX_LINE_CHARS = 1 << 20
+
+async def iter_line_batches(chunks: AsyncIterator[bytes], encoding: str = "utf-8",
+                            max_line_chars: int = MAX_LINE_CHARS) -> AsyncIterator[List[Optional[str]]]:
+    """
+    Re-chunk a byte stream into lists of complete text lines.
+    A line longer than max_line_chars is yielded as None and the rest of it is skipped
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pieces: List[str] = []
+    pending_chars = 0
+    skipping = False
+
+    def split(text: str) -> List[Optional[str]]:
+        nonlocal pending_chars, skipping
+        lines: List[Optional[str]] = []
+        parts = text.split("\n")
+        for i, part in enumerate(parts):
+            if not skipping:
+                pieces.append(part)
+                pending_chars += len(part)
+                if pending_chars > max_line_chars:
+                    lines.append(None)
+                    skipping = True
+            if i < len(parts) - 1:
+                if not skipping:
+                    lines.append("".join(pieces))
+                pieces.clear()
+                pending_chars, skipping = 0, False
+            elif skipping:
+                pieces.clear()
+        return lines
+
+    async for chunk in chunks:
+        lines = split(decoder.decode(chunk))
+        if lines:
+            yield lines
+    lines = split(decoder.decode(b"", final=True))
+    tail = "".join(pieces)
+    if tail:
+        lines.append(tail)
+    if lines:
+        yield lines
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_line_chars: int = MAX_LINE_CHARS,
+                      **_) -> AsyncIterator[ParsedRow]:
+    row_number = 0
+    async for lines in iter_line_batches(chunks, max_line_chars=max_line_chars):
+        for line in lines:
+            row_number += 1
+            if line is None:
+                yield row_number, None, f"Line longer than {max_line_chars} characters"
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Each line must be a JSON object"
+                continue
+            yield row_number, record, None
+
+def coerce_csv_row(row: Dict[str, str], list_fields: Iterable[str] = ()) -> Dict[str, Any]:
+    """Drop empty cells (so model defaults apply) and split list columns on ; or |"""
+    record: Dict[str, Any] = {}
+    for field, value in row.items():
+        if field is None or value is None:
+            continue
+        value = value.strip()
+        if not value:
+            continue
+        record[field] = [v for v in LIST_SEPARATOR.split(value) if v] if field in list_fields else value
+    return record
+
+# A quoted field spanning lines is buffered until it closes; beyond this a record is rejected
+MAX_CSV_RECORD_CHARS = 1 << 20
+
+def _in_quotes_after(line: str, in_quotes: bool) -> bool:
+    """
+    Whether a quoted field is still open at the end of `line` (RFC 4180, as csv.reader parses it):
+    a quote opens a field only at its start, "" inside a quoted field is a literal quote,
+    and quotes inside an unquoted field (5" board) are plain characters
+    """
+    field_start = not in_quotes
+    i, n = 0, len(line)
+    while i < n:
+        char = line[i]
+        if in_quotes:
+            if char == '"':
+                if i + 1 < n and line[i + 1] == '"':
+                    i += 2
+                    continue
+                in_quotes = False
+        elif char == ",":
+            field_start = True
+            i += 1
+            continue
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = False
+        i += 1
+    return in_quotes
+
+async def iter_csv(chunks: AsyncIterator[bytes], list_fields: Iterable[str] = (),
+                   max_record_chars: int = MAX_CSV_RECORD_CHARS) -> AsyncIterator[ParsedRow]:
+    """Parse CSV with a header row; quoted fields may span lines"""
+    list_fields = set(list_fields)
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    pending_chars = 0
+    in_quotes = False
+    oversized = False
+    row_number = 0
+
+    def parse(record: List[str]):
+        nonlocal header, row_number
+        values = next(csv.reader(["\n".join(record)]), [])
+        if header is None:
+            header = [h.strip() for h in values]
+            return None
+        row_number += 1
+        if len(values) != len(header):
+            return row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+        return row_number, coerce_csv_row(dict(zip(header, values)), list_fields), None
+
+    async for lines in iter_line_batches(chunks, max_line_chars=max_record_chars):
+        for line in lines:
+            if line is None:
+                # A single line past the record limit; assume its newline ends the record
+                if not oversized:
+                    row_number += 1
+                    yield row_number, None, f"Record longer than {max_record_chars} characters"
+                pending, pending_chars, in_quotes, oversized = [], 0, False, False
+                continue
+            line = line.rstrip("\r")
+            in_quotes = _in_quotes_after(line, in_quotes)
+            if oversized:
+                # Skip the rest of the runaway record, keeping only the quote state
+                if not in_quotes:
+                    oversized = False
+                continue
+            pending.append(line)
+            pending_chars += len(line) + 1
+            if in_quotes and pending_chars > max_record_chars:
+                row_number += 1
+                yield row_number, None, f"Record longer than {max_record_chars} characters (unterminated quoted field?)"
+                pending, pending_chars, oversized = [], 0, True
+                continue
+            if in_quotes:
+                continue
+            record, pending, pending_chars = pending, [], 0
+            if not any(part.strip() for part in record):
+                continue
+            parsed = parse(record)
+            if parsed:
+                yield parsed
+    if pending and any(part.strip() for part in pending):
+        yield row_number + 1, None, "Unterminated quoted field"
+
+PARSERS = {
+    "csv": iter_csv,
+    "ndjson": iter_ndjson,
+}
+
+def detect_format(content_type: Optional[str]) -> str:
+    return "csv" if "csv" in (content_type or "") else "ndjson"
+
+class ImportReport:
+    """Per-row import outcome with a bounded error list"""
+
+    def __init__(self, max_errors: int = 1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, row_number: int, errors: List[Dict[str, Any]]):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+def validation_errors(exc) -> List[Dict[str, Any]]:
+    """Flatten a pydantic ValidationError into field/message pairs"""
+    return [
+        {"field": ".".join(str(part) for part in err["loc"]), "message": err["msg"]}
+        for err in exc.errors()
+    ]
+
+# ================== EXPORT ==================
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, list):
+        if any(isinstance(v, dict) for v in value):
+            return json.dumps(value, default=str)
+        return ";".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=str)
+    return "" if value is None else value
+
+async def _encode_csv(cursor, fields: List[str], batch_size: int) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([_csv_cell(doc.get(field)) for field in fields])
+        rows += 1
+        if rows % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def _encode_ndjson(cursor, fields: List[str], batch_size: int) -> AsyncIterator[str]:
+    lines = []
+    async for doc in cursor:
+        lines.append(json.dumps(doc, default=str))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+async def chain_cursors(*cursors) -> AsyncIterator[Dict[str, Any]]:
+    """Iterate several cursors one after the other, as one export stream"""
+    for cursor in cursors:
+        async for doc in cursor:
+            yield doc
+
+ENCODERS = {
+    "csv": _encode_csv,
+    "ndjson": _encode_ndjson,
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+async def stream_export(cursor, fields: List[str], fmt: str, compress: bool = False,
+                        batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """Encode cursor documents as CSV/NDJSON chunks of `batch_size` rows, optionally gzipped"""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    async for text in ENCODERS[fmt](cursor, fields, batch_size):
+        chunk = text.encode("utf-8")
+        if gzip:
+            chunk = gzip.compress(chunk)
+        if chunk:
+            yield chunk
+    if gzip:
+        yield gzip.flush()
@@ -0,0 +1,196 @@
+"""
+Cross-process cache invalidation bus.
+
+Invalidations are keyed strings ("product:prod_123", "catalog", ...) written
+to a small capped collection. Every worker follows that collection, through a
+change stream when MongoDB is a replica set, or a tailable await cursor on a
+standalone mongod, and drops the matching entries from its local caches. The
+publishing process applies its own invalidations immediately. Mode "local"
+skips MongoDB entirely for single-process deployments.
+
+If the follower loses its position (error, reconnect), all subscribers get a
+full flush, so a gap in the stream can never leave stale entries behind.
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "cache_invalidations"
+CAPPED_SIZE_BYTES = 16 * 1024 * 1024
+CAPPED_MAX_DOCS = 100_000
+
+# Subscriber callback: (key, data) - key is None for a full flush
+Callback = Callable[[Optional[str], Optional[Dict[str, Any]]], None]
+
+class CacheBus:
+    def __init__(self, db, mode: str = "auto", collection: str = COLLECTION):
+        self.db = db
+        self.mode = mode
+        self.collection = collection
+        self.origin = secrets.token_hex(8)
+        self._subscribers: List[Tuple[str, Callback]] = []
+        self._collection_ready = False
+        self.active_mode: Optional[str] = None
+
+    def subscribe(self, prefix: str, callback: Callback):
+        """Call `callback(key, data)` for keys starting with prefix (and `(None, None)` on a full flush)"""
+        self._subscribers.append((prefix, callback))
+
+    def cache(self, prefix: str, ttl: float = 60.0, maxsize: int = 10_000) -> "LocalCache":
+        cache = LocalCache(ttl, maxsize)
+        self.subscribe(prefix, lambda key, data: cache.invalidate(key))
+        return cache
+
+    def _dispatch(self, key: Optional[str], data: Optional[Dict[str, Any]] = None):
+        for prefix, callback in self._subscribers:
+            if key is None or key.startswith(prefix):
+                try:
+                    callback(key, data)
+                except Exception as e:
+                    logger.warning("Cache invalidation callback for %r failed: %s", prefix, e)
+
+    async def publish(self, key: str, data: Optional[Dict[str, Any]] = None):
+        self._dispatch(key, data)
+        if self.mode == "local":
+            return
+        if not self._collection_ready:
+            await self.ensure_collection()
+        doc = {"key": key, "origin": self.origin, "at": datetime.now(timezone.utc)}
+        if data:
+            doc["data"] = data
+        await self.db[self.collection].insert_one(doc)
+
+    async def ensure_collection(self):
+        # Must exist as a capped collection before the first insert would create a regular one
+        if self.mode == "local":
+            return
+        try:
+            await self.db.create_collection(self.collection, capped=True, size=CAPPED_SIZE_BYTES, max=CAPPED_MAX_DOCS)
+        except CollectionInvalid:
+            pass
+        self._collection_ready = True
+
+    def _receive(self, doc: Dict[str, Any]):
+        if doc.get("origin") != self.origin:
+            self._dispatch(doc["key"], doc.get("data"))
+
+    async def _follow_change_stream(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async with self.db[self.collection].watch(pipeline) as stream:
+            self.active_mode = "change_stream"
+            async for change in stream:
+                self._receive(change["fullDocument"])
+
+    async def _follow_tailable(self):
+        # Follow in $natural (insertion) order with no _id filter: ObjectIds come from each publisher's
+        # clock and counter, so a later insert can carry a smaller _id than one already seen
+        collection = self.db[self.collection]
+        while True:
+            last = await collection.find_one({}, sort=[("$natural", -1)])
+            if last is None:
+                # Tailable cursors die immediately on an empty collection
+                await collection.insert_one({"key": "", "origin": self.origin, "at": datetime.now(timezone.utc)})
+                last = await collection.find_one({}, sort=[("$natural", -1)])
+            cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT).max_await_time_ms(1000)
+            caught_up = checked = False
+            self.active_mode = "tailable"
+            while cursor.alive:
+                async for doc in cursor:
+                    if not caught_up and doc["_id"] == last["_id"]:
+                        # Skip the history up to the newest entry at the time we (re)started
+                        caught_up = True
+                        continue
+                    if not caught_up and not checked:
+                        checked = True
+                        if await collection.find_one({"_id": last["_id"]}, {"_id": 1}) is None:
+                            # The collection wrapped past `last` before the cursor opened: every entry
+                            # left is newer, and what was evicted in between is unknown
+                            logger.info("Cache bus: tailable start position evicted, flushing local caches")
+                            self._dispatch(None)
+                            caught_up = True
+                    if not caught_up:
+                        continue
+                    if doc["key"]:
+                        self._receive(doc)
+                await asyncio.sleep(0)
+            # The cursor died (e.g. the capped collection wrapped past it); what it missed is unknown
+            logger.info("Cache bus: tailable cursor lost its position, flushing local caches")
+            self._dispatch(None)
+            await asyncio.sleep(0.1)
+
+    async def run(self):
+        """Follow the bus until cancelled, reconnecting with backoff"""
+        if self.mode == "local":
+            return
+        await self.ensure_collection()
+        mode = self.mode
+        backoff = 0.5
+        while True:
+            started = time.monotonic()
+            try:
+                if mode in ("auto", "change_stream"):
+                    try:
+                        await self._follow_change_stream()
+                    except OperationFailure as e:
+                        if mode != "auto":
+                            raise
+                        # Change streams need a replica set; standalone mongod falls back to tailing
+                        logger.info("Cache bus: change streams unavailable (%s), tailing instead", e)
+                        mode = "tailable"
+                        continue
+                else:
+                    await self._follow_tailable()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache bus follower failed, flushing local caches: %s", e)
+            # Whatever was missed while disconnected is unknown; drop everything
+            self._dispatch(None)
+            backoff = 0.5 if time.monotonic() - started > 30 else min(backoff * 2, 30)
+            await asyncio.sleep(backoff)
+
+class LocalCache:
+    """In-process TTL + LRU cache kept coherent by a CacheBus prefix subscription"""
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 10_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,189 @@
+"""
+Idempotent product catalog sync.
+
+Feed records are matched to products by SKU. A content hash of the catalog
+fields lets unchanged products be skipped without comparing field by field;
+changed products get a $set of only the fields that differ. Products from the
+same feed source that are missing from the feed are deactivated, and the
+catalog version in catalog_meta is bumped whenever anything changed so cached
+product listings can be invalidated.
+"""
+
+import hashlib
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Union
+
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateMany, UpdateOne
+
+import bulk_io
+
+CATALOG_FIELDS = ("name", "description", "category", "price", "compare_price", "image_url", "stock", "sku")
+
+META_ID = "products"
+
+class CatalogItem(BaseModel):
+    name: str
+    description: str = ""
+    category: str
+    price: float
+    compare_price: Optional[float] = None
+    image_url: str = ""
+    stock: int = 0
+    sku: str
+
+def content_hash(fields: Dict[str, Any]) -> str:
+    payload = json.dumps([fields.get(name) for name in CATALOG_FIELDS], separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+async def ensure_indexes(db):
+    # Not unique: earlier seed runs may have left duplicate SKUs, which the sync deactivates
+    await db.products.create_index("sku")
+    await db.products.create_index("product_id", unique=True)
+
+async def get_catalog_version(db) -> int:
+    meta = await db.catalog_meta.find_one({"_id": META_ID})
+    return meta["version"] if meta else 0
+
+async def bump_catalog_version(db) -> int:
+    meta = await db.catalog_meta.find_one_and_update(
+        {"_id": META_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+        return_document=True,
+    )
+    return meta["version"]
+
+class SyncReport(bulk_io.ImportReport):
+    def __init__(self, max_errors: int = 1000):
+        super().__init__(max_errors)
+        self.unchanged = 0
+        self.updated = 0
+        self.reactivated = 0
+        self.deactivated = 0
+        self.version: Optional[int] = None
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.reactivated or self.deactivated)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **super().as_dict(),
+            "unchanged": self.unchanged,
+            "updated": self.updated,
+            "reactivated": self.reactivated,
+            "deactivated": self.deactivated,
+            "catalog_version": self.version,
+        }
+
+async def _records(feed: Union[Iterable[Dict], AsyncIterable]):
+    if hasattr(feed, "__aiter__"):
+        async for item in feed:
+            yield item
+    else:
+        for row_number, record in enumerate(feed, start=1):
+            yield row_number, record, None
+
+async def sync_catalog(db, feed: Union[Iterable[Dict], AsyncIterable], source: str = "default",
+                       deactivate_missing: bool = True, batch_size: int = 1000,
+                       max_errors: int = 1000) -> SyncReport:
+    """Upsert feed records by SKU and deactivate this source's products missing from the feed.
+
+    `feed` is an iterable of dicts or an async iterator of bulk_io parsed rows.
+    """
+    report = SyncReport(max_errors)
+    now = datetime.now(timezone.utc).isoformat()
+
+    # One projected scan of the current catalog; 100k products fit comfortably in memory
+    existing: Dict[str, Dict] = {}
+    duplicates: List[str] = []
+    projection = {"_id": 0, "product_id": 1, "active": 1, "content_hash": 1, "catalog_source": 1, **{f: 1 for f in CATALOG_FIELDS}}
+    async for doc in db.products.find({"sku": {"$exists": True}}, projection).sort("created_at", 1):
+        if doc["sku"] in existing:
+            if doc.get("active", True):
+                duplicates.append(doc["product_id"])
+        else:
+            existing[doc["sku"]] = doc
+
+    seen = set()
+    operations: List[Union[UpdateOne, UpdateMany]] = []
+
+    async def flush():
+        if operations:
+            await db.products.bulk_write(list(operations), ordered=False)
+            operations.clear()
+
+    async for row_number, record, error in _records(feed):
+        report.rows += 1
+        if error:
+            report.add_error(row_number, [{"field": None, "message": error}])
+            continue
+        try:
+            item = CatalogItem(**record).model_dump()
+        except ValidationError as e:
+            report.add_error(row_number, bulk_io.validation_errors(e))
+            continue
+        if item["sku"] in seen:
+            report.add_error(row_number, [{"field": "sku", "message": "Duplicate SKU in feed"}])
+            continue
+        seen.add(item["sku"])
+        digest = content_hash(item)
+        current = existing.get(item["sku"])
+
+        if current is None:
+            operations.append(UpdateOne(
+                {"sku": item["sku"]},
+                {
+                    "$set": {**item, "content_hash": digest, "active": True, "catalog_source": source, "updated_at": now},
+                    "$setOnInsert": {"product_id": f"prod_{uuid.uuid4().hex[:12]}", "created_at": now},
+                },
+                upsert=True,
+            ))
+            report.inserted += 1
+        else:
+            changes: Dict[str, Any] = {}
+            if current.get("content_hash") != digest:
+                changes = {f: item[f] for f in CATALOG_FIELDS if current.get(f) != item[f]}
+                changes["content_hash"] = digest
+            if not current.get("active", True):
+                changes["active"] = True
+                report.reactivated += 1
+            if current.get("catalog_source") != source:
+                changes["catalog_source"] = source
+            if not changes:
+                report.unchanged += 1
+                continue
+            if set(changes) - {"content_hash", "active", "catalog_source"}:
+                report.updated += 1
+            changes["updated_at"] = now
+            operations.append(UpdateOne({"product_id": current["product_id"]}, {"$set": changes}))
+        if len(operations) >= batch_size:
+            await flush()
+
+    if deactivate_missing:
+        missing = [
+            doc["product_id"] for sku, doc in existing.items()
+            if sku not in seen and doc.get("active", True) and doc.get("catalog_source") == source
+        ]
+        for start in range(0, len(missing), batch_size):
+            operations.append(UpdateMany(
+                {"product_id": {"$in": missing[start:start + batch_size]}},
+                {"$set": {"active": False, "updated_at": now}},
+            ))
+        report.deactivated += len(missing)
+    if duplicates:
+        operations.append(UpdateMany({"product_id": {"$in": duplicates}}, {"$set": {"active": False, "updated_at": now}}))
+        report.deactivated += len(duplicates)
+    await flush()
+
+    report.version = await bump_catalog_version(db) if report.changed else await get_catalog_version(db)
+    return report
+
+async def file_chunks(path: str, chunk_size: int = 1 << 16):
+    """Async byte-chunk iterator over a local file, for the bulk_io parsers"""
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
@@ -0,0 +1,154 @@
+"""
+Cold start helpers: import timing, lazy imports and startup pre-warming.
+
+The server times its own imports, defers modules only a few endpoints need,
+and imports/initializes integrations (Stripe, bcrypt, the Mongo pools) during
+startup instead of on the first request that needs them. The resulting report
+is logged once the app is ready:
+
+    Startup ready in 1.412s: imports 0.981s (fastapi 521ms, pymongo 163ms, ...),
+    prewarm 0.311s (stripe 88ms, bcrypt 190ms, mongo 33ms)
+"""
+
+import builtins
+import importlib.util
+import logging
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+class ImportTimer:
+    """Times imports made directly by the code between start() and stop()
+
+    Nested imports are counted towards the import that triggered them, so the
+    report answers "what did each of my imports cost", like the cumulative
+    column of `python -X importtime` for the top level only.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._depth = 0
+        self._original: Optional[Callable] = None
+
+    def start(self):
+        if self._original is not None:
+            return
+        self.started_at = time.perf_counter()
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is None:
+            return
+        builtins.__import__ = self._original
+        self._original = None
+        self.stopped_at = time.perf_counter()
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original or builtins.__import__
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                top = name.partition(".")[0]
+                self.timings[top] = self.timings.get(top, 0.0) + time.perf_counter() - started
+
+    @property
+    def total(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.stopped_at or time.perf_counter()) - self.started_at
+
+    def slowest(self, limit: int = 10) -> List[Tuple[str, float]]:
+        return sorted(self.timings.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+def lazy_import(name: str):
+    """Return module `name`, executing it on first attribute access instead of now"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+class Deferred:
+    """Proxy building its target on first attribute access (e.g. a CryptContext)"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._target = None
+
+    def resolve(self) -> Any:
+        if self._target is None:
+            self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+Step = Callable[[], Union[None, Awaitable[None]]]
+
+class Prewarmer:
+    """Named warm-up steps run once at startup; failures are reported, never fatal"""
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Step]] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str):
+        def decorator(step: Step) -> Step:
+            self.steps.append((name, step))
+            return step
+        return decorator
+
+    async def run(self) -> Dict[str, Dict[str, Any]]:
+        for name, step in self.steps:
+            started = time.perf_counter()
+            try:
+                result = step()
+                if hasattr(result, "__await__"):
+                    await result
+                status = "ok"
+            except ImportError as e:
+                status = f"unavailable: {e}"
+            except Exception as e:
+                status = f"failed: {e}"
+                logger.warning("Pre-warming %s failed: %s", name, e)
+            self.results[name] = {"seconds": round(time.perf_counter() - started, 4), "status": status}
+        return self.results
+
+    @property
+    def total(self) -> float:
+        return sum(result["seconds"] for result in self.results.values())
+
+def startup_report(imports: ImportTimer, prewarm: Prewarmer, ready_seconds: float) -> Dict[str, Any]:
+    return {
+        "ready_seconds": round(ready_seconds, 4),
+        "import_seconds": round(imports.total, 4),
+        "imports": {name: round(seconds, 4) for name, seconds in imports.slowest(limit=len(imports.timings))},
+        "prewarm_seconds": round(prewarm.total, 4),
+        "prewarm": prewarm.results,
+    }
+
+def format_report(report: Dict[str, Any], limit: int = 8) -> str:
+    imports = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in list(report["imports"].items())[:limit])
+    prewarm = ", ".join(
+        f"{name} {result['seconds'] * 1000:.0f}ms" + ("" if result["status"] == "ok" else f" ({result['status']})")
+        for name, result in report["prewarm"].items()
+    )
+    return (f"Startup ready in {report['ready_seconds']:.3f}s: imports {report['import_seconds']:.3f}s ({imports}), "
+            f"prewarm {report['prewarm_seconds']:.3f}s ({prewarm})")
@@ -0,0 +1,107 @@
+"""
+Coalesced counters for page views and list impressions.
+
+Increments are summed in memory per (collection, id, metric) and written
+every few seconds as one unordered bulk_write of $inc updates, so a popular
+page costs one write per flush instead of one per view. Counts are therefore
+eventually consistent: up to one flush interval behind. The buffer is flushed
+on shutdown; increments still buffered when a process crashes are lost.
+
+The buffer holds at most `max_keys` distinct keys. Reaching it triggers an
+early flush, and until that flush empties the buffer increments for new keys
+are dropped (and reported) rather than growing memory without bound. Keys
+re-buffered after a failed flush are subject to the same cap.
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Collection -> the field its documents are addressed by
+ID_FIELDS = {
+    "jobs": "job_id",
+    "worker_profiles": "profile_id",
+    "products": "product_id",
+}
+
+METRICS = ("views", "impressions")
+
+Key = Tuple[str, str, str]
+
+class CounterBuffer:
+    def __init__(self, db, flush_interval: float = 5.0, max_keys: int = 100_000,
+                 on_drop: Optional[Callable[[str, int], None]] = None):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.on_drop = on_drop
+        self._pending: Dict[Key, int] = {}
+        self._flushing = False
+        self._full = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def incr(self, collection: str, doc_id: str, metric: str, amount: int = 1):
+        key = (collection, doc_id, metric)
+        if key in self._pending:
+            self._pending[key] += amount
+            return
+        if len(self._pending) >= self.max_keys:
+            self._full.set()
+            if self.on_drop:
+                self.on_drop(collection, amount)
+            return
+        self._pending[key] = amount
+
+    def incr_many(self, collection: str, doc_ids: Iterable[str], metric: str):
+        for doc_id in doc_ids:
+            self.incr(collection, doc_id, metric)
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of documents updated"""
+        if not self._pending or self._flushing:
+            return 0
+        pending, self._pending = self._pending, {}
+        self._full.clear()
+        self._flushing = True
+        updates: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for (collection, doc_id, metric), amount in pending.items():
+            updates.setdefault(collection, {}).setdefault(doc_id, {})[metric] = amount
+        written = 0
+        try:
+            for collection in list(updates):
+                id_field = ID_FIELDS[collection]
+                operations = [UpdateOne({id_field: doc_id}, {"$inc": inc}) for doc_id, inc in updates[collection].items()]
+                try:
+                    await self.db[collection].bulk_write(operations, ordered=False)
+                except Exception as e:
+                    logger.warning("Flushing %d %s counters failed, retrying next flush: %s", len(operations), collection, e)
+                    continue
+                written += len(operations)
+                del updates[collection]
+            return written
+        finally:
+            self._flushing = False
+            # Failed or cancelled collections go back into the buffer for the next flush,
+            # through incr so increments that no longer fit are dropped like any other
+            for collection, docs in updates.items():
+                for doc_id, inc in docs.items():
+                    for metric, amount in inc.items():
+                        self.incr(collection, doc_id, metric, amount)
+
+    async def run(self):
+        """Flush every flush_interval seconds, or early when the buffer fills up"""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("Counter flush failed: %s", e)
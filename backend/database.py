@@ -0,0 +1,267 @@
+"""
+MongoDB access per workload class.
+
+Each workload gets its own Motor client, so a slow export can never exhaust
+the connection pool that serves page loads:
+
+- interactive: browse/search reads, secondaryPreferred, short timeouts
+- write:       carts, checkout, auth and every other read-modify-write, primary
+- background:  exports, rollups and other long scans, small pool
+
+Options per class come from MONGO_<CLASS>_OPTIONS, e.g.
+MONGO_INTERACTIVE_OPTIONS="maxPoolSize=100,timeoutMS=1500,readPreference=nearest".
+timeoutMS (client-side operation timeout) makes the driver send maxTimeMS on
+every operation.
+
+Interactive reads switch to the primary for a short window after the caller's
+own successful write (read-your-writes), tracked per principal in process and
+through a cookie so the next request sees its write on any worker.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import Any, Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, monitoring
+
+WORKLOADS = ("interactive", "write", "background")
+
+COMMON_OPTIONS = {
+    "serverSelectionTimeoutMS": 5000,
+    "connectTimeoutMS": 5000,
+    "maxIdleTimeMS": 300_000,
+}
+
+DEFAULT_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "interactive": {"maxPoolSize": 50, "minPoolSize": 5, "waitQueueTimeoutMS": 1000, "timeoutMS": 2000,
+                    "readPreference": "secondaryPreferred"},
+    "write": {"maxPoolSize": 30, "minPoolSize": 2, "waitQueueTimeoutMS": 2000, "timeoutMS": 5000,
+              "readPreference": "primary"},
+    # Long cursors: no operation timeout, a small pool so scans cannot crowd out requests
+    "background": {"maxPoolSize": 5, "minPoolSize": 0, "readPreference": "secondaryPreferred"},
+}
+
+RYW_COOKIE = "ryw_until"
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+def _coerce(value: str) -> Any:
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def parse_options(spec: Optional[str]) -> Dict[str, Any]:
+    """Parse "maxPoolSize=100,timeoutMS=1500" into client keyword arguments"""
+    options: Dict[str, Any] = {}
+    for item in filter(None, (spec or "").split(",")):
+        key, _, value = item.partition("=")
+        options[key.strip()] = _coerce(value.strip())
+    return options
+
+def load_settings(environ: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+    environ = os.environ if environ is None else environ
+    return {
+        workload: {**COMMON_OPTIONS, **DEFAULT_OPTIONS[workload],
+                   **parse_options(environ.get(f"MONGO_{workload.upper()}_OPTIONS"))}
+        for workload in WORKLOADS
+    }
+
+# ================== POOL STATS ==================
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters for one workload client"""
+
+    def __init__(self, workload: str, checkout_wait_observer: Optional[Callable[[str, float], None]] = None):
+        self.workload = workload
+        self.observer = checkout_wait_observer
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.cleared = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "cleared": self.cleared,
+                "wait_ms_avg": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    # Check-out start/end run on the same (executor) thread
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self) -> float:
+        return time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if self.observer:
+            self.observer(self.workload, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+# ================== READ-YOUR-WRITES ==================
+
+_primary_reads: ContextVar[bool] = ContextVar("primary_reads", default=False)
+
+class RecentWriters:
+    """Bounded principal -> expiry map of callers inside their read-your-writes window"""
+
+    def __init__(self, window: float, maxsize: int = 100_000):
+        self.window = window
+        self.maxsize = maxsize
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+
+    def mark(self, principal: str) -> float:
+        until = time.time() + self.window
+        self._expiry[principal] = until
+        self._expiry.move_to_end(principal)
+        while len(self._expiry) > self.maxsize:
+            self._expiry.popitem(last=False)
+        return until
+
+    def active(self, principal: str) -> bool:
+        until = self._expiry.get(principal)
+        if until is None:
+            return False
+        if until < time.time():
+            del self._expiry[principal]
+            return False
+        return True
+
+def _cookie(headers: Dict[str, str], name: str) -> Optional[str]:
+    raw = headers.get("cookie")
+    if not raw:
+        return None
+    morsel = SimpleCookie(raw).get(name)
+    return morsel.value if morsel else None
+
+def default_principal(headers: Dict[str, str]) -> Optional[str]:
+    return _cookie(headers, "session_token") or _cookie(headers, "cart_id")
+
+class ReadYourWritesMiddleware:
+    """Routes interactive reads to the primary for `window` seconds after the caller's last write"""
+
+    def __init__(self, app, window: float = 10.0, principal: Callable[[Dict[str, str]], Optional[str]] = default_principal):
+        self.app = app
+        self.window = window
+        self.principal = principal
+        self.writers = RecentWriters(window)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.window <= 0:
+            return await self.app(scope, receive, send)
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        principal = self.principal(headers) or default_principal(headers)
+        try:
+            cookie_until = float(_cookie(headers, RYW_COOKIE) or 0)
+        except ValueError:
+            cookie_until = 0
+        token = _primary_reads.set(cookie_until > time.time() or (principal is not None and self.writers.active(principal)))
+        unsafe = scope["method"] in UNSAFE_METHODS
+
+        async def send_marking_writes(message):
+            if unsafe and message["type"] == "http.response.start" and message["status"] < 400:
+                until = self.writers.mark(principal) if principal else time.time() + self.window
+                cookie = f"{RYW_COOKIE}={until:.0f}; Max-Age={int(self.window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_marking_writes if unsafe else send)
+        finally:
+            _primary_reads.reset(token)
+
+def primary_reads_required() -> bool:
+    return _primary_reads.get()
+
+# ================== DATABASES ==================
+
+class Databases:
+    def __init__(self, url: str, name: str, settings: Optional[Dict[str, Dict[str, Any]]] = None,
+                 listeners: Callable[[str], List[Any]] = lambda workload: [],
+                 wrap: Callable[[Any], Any] = lambda database: database,
+                 checkout_wait_observer: Optional[Callable[[str, float], None]] = None):
+        settings = settings or load_settings()
+        self.name = name
+        self.pool_stats_by_workload = {w: PoolStats(w, checkout_wait_observer) for w in WORKLOADS}
+        self.clients = {
+            workload: AsyncIOMotorClient(
+                url,
+                appname=f"hdrywall-{workload}",
+                event_listeners=[self.pool_stats_by_workload[workload], *listeners(workload)],
+                **settings[workload],
+            )
+            for workload in WORKLOADS
+        }
+        self.write = wrap(self.clients["write"][name])
+        self.background = wrap(self.clients["background"][name])
+        self._interactive = wrap(self.clients["interactive"][name])
+        self._interactive_primary = wrap(self.clients["interactive"].get_database(name, read_preference=ReadPreference.PRIMARY))
+
+    def use(self, database):
+        """Serve every workload from one database object (in-memory Mongo for load tests)"""
+        self.write = self.background = self._interactive = self._interactive_primary = database
+
+    def reads(self):
+        """Database for browse/search reads, honouring the caller's read-your-writes window"""
+        return self._interactive_primary if primary_reads_required() else self._interactive
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {workload: stats.snapshot() for workload, stats in self.pool_stats_by_workload.items()}
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
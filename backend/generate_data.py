@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic data for scale testing.
+
+Generates coherent users, jobs, worker_profiles, products, carts, payment
+transactions and orders with realistic distributions (trade codes from
+TRADE_CODES, weighted US cities, pay rates per trade, availability) and loads
+them through concurrent unordered insert_many batches. Chunks are built in a
+pool of worker processes (--workers) while earlier ones are being inserted.
+The same --seed always produces the same documents, whatever the concurrency.
+
+    python generate_data.py --users 1000000 --jobs 500000 --profiles 600000 --drop
+    python generate_data.py --scale 0.01 --seed 7 --rebuild-rollups
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+
+from seed_products import SAMPLE_PRODUCTS
+from trades import trade_mask
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "test_database")
+
+DEFAULT_PASSWORD = "password123"
+
+# (city, state, relative weight)
+CITIES = [
+    ("New York", "NY", 88), ("Los Angeles", "CA", 39), ("Chicago", "IL", 27), ("Houston", "TX", 23),
+    ("Phoenix", "AZ", 16), ("Philadelphia", "PA", 16), ("San Antonio", "TX", 15), ("San Diego", "CA", 14),
+    ("Dallas", "TX", 13), ("Austin", "TX", 10), ("Jacksonville", "FL", 10), ("Fort Worth", "TX", 10),
+    ("Columbus", "OH", 9), ("Charlotte", "NC", 9), ("Indianapolis", "IN", 9), ("Seattle", "WA", 7),
+    ("Denver", "CO", 7), ("Nashville", "TN", 7), ("Oklahoma City", "OK", 7), ("Las Vegas", "NV", 6),
+    ("Atlanta", "GA", 5), ("Miami", "FL", 4), ("Tampa", "FL", 4), ("Orlando", "FL", 3), ("Boise", "ID", 2),
+]
+
+# trade code -> (relative weight, median hourly rate)
+TRADES = {
+    "03": (8, 30.0), "04": (5, 32.0), "05": (4, 36.0), "06": (9, 29.0), "07": (6, 31.0),
+    "08": (5, 30.0), "09": (20, 28.0), "10": (3, 27.0), "22": (9, 38.0), "23": (8, 37.0),
+    "26": (12, 40.0), "31": (5, 29.0), "32": (6, 26.0),
+}
+
+AVAILABILITY = [("immediate", 35), ("1_week", 25), ("2_weeks", 15), ("flexible", 25)]
+PAY_TYPES = [("hourly", 70), ("daily", 15), ("project", 15)]
+DURATIONS = ["1 week", "2 weeks", "1 month", "3 months", "6 months", "Ongoing"]
+CERTIFICATIONS = ["OSHA 10", "OSHA 30", "EPA RRP", "NCCER", "Forklift", "First Aid/CPR", "Scaffold"]
+SKILLS = ["Taping", "Mudding", "Texture", "Framing", "Hanging", "Sanding", "Level 5 Finish", "Patching",
+          "Metal Studs", "Acoustical Ceilings", "Blueprint Reading", "Estimating"]
+FIRST_NAMES = ["James", "Maria", "Robert", "Linda", "Michael", "Ana", "David", "Patricia", "Jose", "Jennifer",
+               "Carlos", "Elizabeth", "Daniel", "Susan", "Luis", "Jessica", "Kevin", "Sarah", "Juan", "Karen"]
+LAST_NAMES = ["Smith", "Garcia", "Johnson", "Martinez", "Williams", "Rodriguez", "Brown", "Hernandez", "Jones",
+              "Lopez", "Miller", "Gonzalez", "Davis", "Wilson", "Anderson", "Perez", "Taylor", "Thomas"]
+JOB_TITLES = ["Drywall Hanger", "Drywall Finisher", "Taper", "Framer", "Commercial Drywall Crew",
+              "Ceiling Installer", "Journeyman", "Helper", "Foreman", "Remodel Specialist"]
+
+# Documents are generated in fixed-size chunks, each with its own RNG, so
+# output depends only on the seed and never on scheduling.
+CHUNK_SIZE = 5000
+
+COLLECTIONS = ["users", "products", "jobs", "worker_profiles", "carts", "payment_transactions", "orders"]
+
+def _weighted(choices):
+    values, weights = zip(*choices)
+    cumulative, total = [], 0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return list(values), cumulative
+
+class Generator:
+    def __init__(self, seed: int, counts: Dict[str, int], password_hash: str, days: int = 365):
+        self.seed = seed
+        self.counts = counts
+        self.password_hash = password_hash
+        self.days = days
+        self.contractors = max(1, counts["users"] * 3 // 10)
+        self.subcontractors = max(0, counts["users"] - self.contractors)
+        self.cities, self.city_weights = _weighted([((c, s), w) for c, s, w in CITIES])
+        self.trades, self.trade_weights = _weighted([(code, w) for code, (w, _) in TRADES.items()])
+        self.availability, self.availability_weights = _weighted(AVAILABILITY)
+        self.pay_types, self.pay_type_weights = _weighted(PAY_TYPES)
+        # A pool of timestamps avoids an isoformat() call per document
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        pool = random.Random(seed)
+        self.timestamps = sorted(
+            (now - timedelta(seconds=pool.randrange(days * 86400))).isoformat() for _ in range(20000)
+        )
+        self.products = self._products()
+
+    def rng(self, collection: str, chunk: int) -> random.Random:
+        return random.Random(f"{self.seed}:{collection}:{chunk}")
+
+    @staticmethod
+    def user_id(index: int) -> str:
+        return f"user_{index:012x}"
+
+    def _name(self, index: int) -> str:
+        return f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+
+    def _trade_codes(self, rng: random.Random, k: int) -> List[str]:
+        codes = []
+        for code in rng.choices(self.trades, cum_weights=self.trade_weights, k=k):
+            if code not in codes:
+                codes.append(code)
+        return codes
+
+    def _products(self) -> List[Dict]:
+        rng = self.rng("products", 0)
+        products = [{**p, "product_id": f"prod_{i:012x}"} for i, p in enumerate(SAMPLE_PRODUCTS)]
+        for i in range(len(products), self.counts["products"]):
+            base = SAMPLE_PRODUCTS[i % len(SAMPLE_PRODUCTS)]
+            price = round(base["price"] * rng.uniform(0.6, 1.6), 2)
+            products.append({
+                **base,
+                "product_id": f"prod_{i:012x}",
+                "name": f"{base['name']} #{i}",
+                "price": price,
+                "compare_price": round(price * 1.2, 2) if rng.random() < 0.3 else None,
+                "stock": rng.randint(0, 500),
+                "sku": f"{base['sku']}-{i:06d}",
+                "created_at": rng.choice(self.timestamps),
+            })
+        return products
+
+    # ---- per-collection chunk builders ----
+
+    def users(self, chunk: int, start: int, stop: int) -> List[Dict]:
+        rng = self.rng("users", chunk)
+        return [{
+            "user_id": self.user_id(i),
+            "email": f"user{i}@example.com",
+            "name": self._name(i),
+            "user_type": "contractor" if i < self.contractors else "subcontractor",
+            "password_hash": self.password_hash,
+            "picture": None,
+            "created_at": rng.choice(self.timestamps),
+        } for i in range(start, stop)]
+
+    def jobs(self, chunk: int, start: int, stop: int) -> List[Dict]:
+        rng = self.rng("jobs", chunk)
+        docs = []
+        for i in range(start, stop):
+            contractor = rng.randrange(self.contractors)
+            trade_codes = self._trade_codes(rng, rng.choices((1, 2, 3), (60, 30, 10))[0])
+            city, state = rng.choices(self.cities, cum_weights=self.city_weights)[0]
+            pay_type = rng.choices(self.pay_types, cum_weights=self.pay_type_weights)[0]
+            hourly = TRADES[trade_codes[0]][1] * rng.lognormvariate(0, 0.2)
+            if pay_type == "hourly":
+                pay_rate = f"{hourly:.2f}"
+            elif pay_type == "daily":
+                pay_rate = f"{hourly * 8:.0f}"
+            else:
+                pay_rate = f"{hourly * 8 * rng.randint(5, 120):.0f}"
+            docs.append({
+                "job_id": f"job_{i:012x}",
+                "contractor_id": self.user_id(contractor),
+                "contractor_name": self._name(contractor),
+                "title": f"{rng.choice(JOB_TITLES)} - {city}",
+                "description": f"{rng.choice(JOB_TITLES)} needed for a {rng.choice(('residential', 'commercial', 'tenant improvement'))} project.",
+                "trade_codes": trade_codes,
+                "trade_mask": trade_mask(trade_codes),
+                "location": f"{rng.randint(100, 9999)} Main St",
+                "city": city,
+                "state": state,
+                "pay_rate": pay_rate,
+                "pay_type": pay_type,
+                "duration": rng.choice(DURATIONS),
+                "certifications_required": rng.sample(CERTIFICATIONS, rng.choices((0, 1, 2), (50, 35, 15))[0]),
+                "experience_years": min(20, int(rng.expovariate(1 / 3))),
+                "status": "active" if rng.random() < 0.8 else "closed",
+                "created_at": rng.choice(self.timestamps),
+            })
+        return docs
+
+    def worker_profiles(self, chunk: int, start: int, stop: int) -> List[Dict]:
+        rng = self.rng("worker_profiles", chunk)
+        docs = []
+        for i in range(start, stop):
+            user_index = self.contractors + i
+            trade_codes = self._trade_codes(rng, rng.choices((1, 2, 3), (50, 35, 15))[0])
+            city, state = rng.choices(self.cities, cum_weights=self.city_weights)[0]
+            experience = min(35, int(rng.expovariate(1 / 7)))
+            rate_min = round(TRADES[trade_codes[0]][1] * rng.lognormvariate(0, 0.15) * (1 + experience / 50), 2)
+            docs.append({
+                "profile_id": f"profile_{i:012x}",
+                "user_id": self.user_id(user_index),
+                "name": self._name(user_index),
+                "headline": f"{rng.choice(JOB_TITLES)} with {experience} years experience",
+                "bio": "Reliable tradesperson with my own tools and transportation.",
+                "trade_codes": trade_codes,
+                "trade_mask": trade_mask(trade_codes),
+                "skills": rng.sample(SKILLS, rng.randint(2, 5)),
+                "experience_years": experience,
+                "certifications": rng.sample(CERTIFICATIONS, rng.choices((0, 1, 2, 3), (30, 40, 20, 10))[0]),
+                "location": city,
+                "city": city,
+                "state": state,
+                "availability": rng.choices(self.availability, cum_weights=self.availability_weights)[0],
+                "hourly_rate_min": rate_min,
+                "hourly_rate_max": round(rate_min * rng.uniform(1.1, 1.6), 2),
+                "status": "active" if rng.random() < 0.9 else "inactive",
+                "created_at": rng.choice(self.timestamps),
+            })
+        return docs
+
+    def carts(self, chunk: int, start: int, stop: int) -> List[Dict]:
+        rng = self.rng("carts", chunk)
+        users = self.counts["users"]
+        return [{
+            # Each cart belongs to a distinct user while there are enough users, else to a guest cart_id
+            "user_id": self.user_id(i) if i < users else f"guest-{self.seed}-{i:012x}",
+            "items": [
+                {"product_id": product["product_id"], "quantity": rng.choices((1, 2, 3, 5), (60, 25, 10, 5))[0]}
+                for product in rng.sample(self.products, min(len(self.products), rng.randint(1, 5)))
+            ],
+        } for i in range(start, stop)]
+
+    def _transaction(self, rng: random.Random, i: int) -> Dict:
+        user = self.user_id(rng.randrange(max(1, self.counts["users"])))
+        status = rng.choices(("complete", "open", "expired"), (70, 10, 20))[0]
+        doc = {
+            "transaction_id": f"txn_{i:012x}",
+            "session_id": f"cs_synthetic_{self.seed}_{i:012x}",
+            "user_id": user,
+            "currency": "usd",
+            "status": status,
+            "payment_status": "paid" if status == "complete" else "unpaid" if status == "open" else "initiated",
+            "created_at": rng.choice(self.timestamps),
+        }
+        if rng.random() < 0.05:
+            tier_id, amount = rng.choices((("basic", 299.0), ("professional", 799.0), ("enterprise", 1999.0)), (60, 30, 10))[0]
+            doc.update(type="market_data_subscription", tier_id=tier_id, amount=amount)
+        else:
+            products = rng.sample(self.products, min(len(self.products), rng.randint(1, 4)))
+            doc["items"] = [
+                {"product_id": p["product_id"], "name": p["name"], "price": p["price"], "quantity": rng.randint(1, 3)}
+                for p in products
+            ]
+            doc["amount"] = round(sum(item["price"] * item["quantity"] for item in doc["items"]), 2)
+        return doc
+
+    def payment_transactions(self, chunk: int, start: int, stop: int) -> List[Dict]:
+        rng = self.rng("payment_transactions", chunk)
+        return [self._transaction(rng, i) for i in range(start, stop)]
+
+    def orders(self, chunk: int, start: int, stop: int) -> List[Dict]:
+        # Orders mirror the paid cart transactions, regenerated from the same chunk RNG
+        rng = self.rng("payment_transactions", chunk)
+        docs = []
+        for i in range(start, stop):
+            txn = self._transaction(rng, i)
+            if txn["payment_status"] == "paid" and txn.get("type") != "market_data_subscription":
+                docs.append({
+                    "order_id": f"order_{i:012x}",
+                    "user_id": txn["user_id"],
+                    "session_id": txn["session_id"],
+                    "amount": txn["amount"],
+                    "items": txn["items"],
+                    "status": "paid",
+                    "created_at": txn["created_at"],
+                })
+        return docs
+
+    def chunk_ranges(self, collection: str) -> Iterator[Tuple[int, int, int]]:
+        """(chunk, start, stop) of every chunk of `collection`"""
+        if collection == "products":
+            yield 0, 0, len(self.products)
+            return
+        total = self.counts["payment_transactions" if collection == "orders" else collection]
+        if collection == "worker_profiles":
+            total = min(total, self.subcontractors)
+        for chunk, start in enumerate(range(0, total, CHUNK_SIZE)):
+            yield chunk, start, min(start + CHUNK_SIZE, total)
+
+    def build(self, collection: str, chunk: int, start: int, stop: int) -> List[Dict]:
+        if collection == "products":
+            return [dict(p) for p in self.products[start:stop]]
+        return getattr(self, collection)(chunk, start, stop)
+
+# Each pool worker rebuilds the Generator once from its (picklable) arguments
+_worker_generator: Optional[Generator] = None
+
+def _init_worker(seed: int, counts: Dict[str, int], password_hash: str, days: int):
+    global _worker_generator
+    _worker_generator = Generator(seed, counts, password_hash, days)
+
+def _build_chunk(collection: str, chunk: int, start: int, stop: int) -> List[Dict]:
+    return _worker_generator.build(collection, chunk, start, stop)
+
+def build_pool(generator: Generator, workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(workers, initializer=_init_worker,
+                               initargs=(generator.seed, generator.counts, generator.password_hash, generator.days))
+
+async def load_collection(db, generator: Generator, collection: str, batch_size: int, concurrency: int,
+                          pool: Optional[ProcessPoolExecutor] = None) -> int:
+    """
+    Generate chunks and insert them with at most `concurrency` batches in flight.
+    With a process pool, up to `concurrency` chunks are built ahead in the workers;
+    without one they are built on the event loop
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    inserted = 0
+
+    async def insert(batch: List[Dict]):
+        nonlocal inserted
+        try:
+            await db[collection].insert_many(batch, ordered=False, bypass_document_validation=True)
+            inserted += len(batch)
+        finally:
+            semaphore.release()
+
+    async def enqueue(docs: List[Dict]):
+        for start in range(0, len(docs), batch_size):
+            await semaphore.acquire()
+            tasks.append(asyncio.ensure_future(insert(docs[start:start + batch_size])))
+
+    if pool is None:
+        for spec in generator.chunk_ranges(collection):
+            await enqueue(generator.build(collection, *spec))
+            # Let in-flight inserts progress between chunk builds
+            await asyncio.sleep(0)
+    else:
+        building = deque()
+        for spec in generator.chunk_ranges(collection):
+            building.append(loop.run_in_executor(pool, _build_chunk, collection, *spec))
+            if len(building) >= concurrency:
+                await enqueue(await building.popleft())
+        while building:
+            await enqueue(await building.popleft())
+    await asyncio.gather(*tasks)
+    return inserted
+
+async def generate(args) -> Dict[str, Dict]:
+    counts = {
+        "users": int(args.users * args.scale),
+        "products": max(len(SAMPLE_PRODUCTS), int(args.products * args.scale)),
+        "jobs": int(args.jobs * args.scale),
+        "worker_profiles": int(args.profiles * args.scale),
+        "carts": int(args.carts * args.scale),
+        "payment_transactions": int(args.transactions * args.scale),
+    }
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(args.password)
+    generator = Generator(args.seed, counts, password_hash)
+
+    client = AsyncIOMotorClient(args.mongo_url, maxPoolSize=max(10, args.concurrency * 2))
+    db = client[args.db_name]
+    pool = build_pool(generator, args.workers) if args.workers else None
+    report = {}
+    try:
+        for collection in COLLECTIONS:
+            if collection in args.skip:
+                continue
+            if args.drop:
+                await db[collection].drop()
+            started = time.perf_counter()
+            inserted = await load_collection(db, generator, collection, args.batch_size, args.concurrency, pool)
+            elapsed = time.perf_counter() - started
+            report[collection] = {"docs": inserted, "seconds": round(elapsed, 2),
+                                  "docs_per_second": round(inserted / elapsed) if elapsed else inserted}
+            print(f"{collection:<22} {inserted:>10} docs  {elapsed:8.2f}s  {report[collection]['docs_per_second']:>9} docs/s")
+        if args.rebuild_rollups:
+            import rollups
+
+            await rollups.ensure_indexes(db)
+            await rollups.rebuild_rollups(db)
+            print("labor_rollups rebuilt")
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        client.close()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    parser.add_argument("--db-name", default=DB_NAME)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every count by this")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--jobs", type=int, default=200_000)
+    parser.add_argument("--profiles", type=int, default=60_000)
+    parser.add_argument("--carts", type=int, default=20_000)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="password of every generated user")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8, help="insert_many batches in flight")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes building chunks (0 builds them on the event loop)")
+    parser.add_argument("--skip", nargs="*", default=[], choices=COLLECTIONS)
+    parser.add_argument("--drop", action="store_true", help="drop each collection before loading it")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="rebuild labor_rollups afterwards")
+    args = parser.parse_args()
+    asyncio.run(generate(args))
+
+if __name__ == "__main__":
+    main()
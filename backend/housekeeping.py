@@ -0,0 +1,78 @@
+"""
+Periodic cleanup run by the scheduler (see scheduler.py).
+
+- Jobs: every listing gets an expires_at when it is posted or edited,
+  derived from its free-text duration and clamped to [min_days, max_days]
+  ("1 week" -> min_days, "3 months" -> 90 days, "Ongoing" -> max_days).
+  expire_jobs closes active listings past it, and listings posted before
+  expires_at existed once they are older than max_days.
+- Sessions: login sessions whose expires_at has passed are deleted.
+- Guest carts: carts not owned by a registered user that have not changed
+  in `days` (the lifetime of the cart_id cookie) are deleted.
+"""
+
+import re
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)?\s*(day|week|month|year)s?\b", re.IGNORECASE)
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+def duration_days(duration) -> Optional[float]:
+    """Days in a free-text duration ("2 weeks", "3 months", "1-2 months"); None if open-ended"""
+    match = _DURATION.search(str(duration or ""))
+    if not match:
+        return None
+    return float(match.group(1) or 1) * UNIT_DAYS[match.group(2).lower()]
+
+def job_expires_at(created_at: str, duration, min_days: float, max_days: float) -> str:
+    days = duration_days(duration)
+    days = max_days if days is None else min(max(days, min_days), max_days)
+    return (datetime.fromisoformat(created_at) + timedelta(days=days)).isoformat()
+
+async def ensure_indexes(db):
+    live = {"status": "active"}
+    await db.jobs.create_index([("expires_at", 1)], partialFilterExpression=live, name="live_expires_at")
+    await db.user_sessions.create_index("session_token")
+    await db.user_sessions.create_index("expires_at")
+    await db.carts.create_index("user_id")
+    await db.carts.create_index("updated_at")
+
+async def expire_jobs(db, max_days: float, batch_size: int = 500, now: Optional[datetime] = None,
+                      on_closed: Optional[Callable[[List[str]], Awaitable]] = None) -> int:
+    """Close active jobs past their expires_at (or older than max_days without one); returns the number closed"""
+    now = now or datetime.now(timezone.utc)
+    query = {"status": "active", "$or": [
+        {"expires_at": {"$lt": now.isoformat()}},
+        {"expires_at": None, "created_at": {"$lt": (now - timedelta(days=max_days)).isoformat()}},
+    ]}
+    closed = 0
+    while True:
+        ids = [doc["job_id"] for doc in await db.jobs.find(query, {"_id": 0, "job_id": 1}).limit(batch_size).to_list(batch_size)]
+        if not ids:
+            return closed
+        result = await db.jobs.update_many(
+            {"job_id": {"$in": ids}, **query},
+            {"$set": {"status": "closed", "closed_at": now.isoformat(), "closed_reason": "expired"}}
+        )
+        closed += result.modified_count
+        if on_closed:
+            await on_closed(ids)
+        if len(ids) < batch_size:
+            return closed
+
+async def purge_sessions(db, now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    result = await db.user_sessions.delete_many({"expires_at": {"$lt": now.isoformat()}})
+    return result.deleted_count
+
+async def purge_guest_carts(db, days: float, now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    # Carts written before carts carried updated_at start their clock now
+    await db.carts.update_many({"updated_at": None}, {"$set": {"updated_at": now.isoformat()}})
+    result = await db.carts.delete_many({
+        "updated_at": {"$lt": (now - timedelta(days=days)).isoformat()},
+        # Registered users' carts are keyed by their user_id; guests by the random cart_id cookie
+        "user_id": {"$not": re.compile("^user_")},
+    })
+    return result.deleted_count
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Hermetic load generator for the HDrywall API.
+
+Boots the FastAPI app in-process (no network, no uvicorn) against a local
+mongod or an in-memory Motor stand-in (mongomock-motor), with Stripe checkout
+and Emergent OAuth stubbed out. Virtual users replay a weighted mix of
+scenarios for a fixed duration; throughput and p50/p95/p99 latency per
+endpoint are written as JSON.
+
+    python load_test.py --mongo memory --concurrency 20 --duration 30 --output load.json
+    python load_test.py --mongo mongodb://localhost:27017 --mix browse_jobs=5,login_burst=1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import types
+import uuid
+from typing import Callable, Dict, List
+
+from generate_data import AVAILABILITY, CITIES, TRADES, Generator, load_collection
+
+DEFAULT_MIX = {
+    "browse_jobs": 40,
+    "search_profiles": 25,
+    "cart_checkout": 20,
+    "login_burst": 10,
+    "google_login": 5,
+}
+
+TRADE_CODE_LIST = list(TRADES)
+STATES = sorted({state for _, state, _ in CITIES})
+AVAILABILITY_VALUES = [value for value, _ in AVAILABILITY]
+LOAD_TEST_PASSWORD = "load-test-password"
+
+# ================== STUBS ==================
+
+def install_stripe_stub(latency_ms: float):
+    """Register a fake emergentintegrations Stripe checkout module"""
+
+    class CheckoutSessionRequest:
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    class StripeCheckout:
+        def __init__(self, api_key=None, webhook_url=None):
+            self.api_key = api_key
+
+        async def create_checkout_session(self, request):
+            await asyncio.sleep(latency_ms / 1000)
+            session_id = f"cs_test_{uuid.uuid4().hex[:16]}"
+            return types.SimpleNamespace(session_id=session_id, url=f"https://checkout.stripe.test/{session_id}")
+
+        async def get_checkout_status(self, session_id):
+            await asyncio.sleep(latency_ms / 1000)
+            return types.SimpleNamespace(status="complete", payment_status="paid", amount_total=0, currency="usd")
+
+        async def handle_webhook(self, body, signature):
+            return types.SimpleNamespace(payment_status="paid", session_id=None)
+
+    checkout = types.ModuleType("emergentintegrations.payments.stripe.checkout")
+    checkout.StripeCheckout = StripeCheckout
+    checkout.CheckoutSessionRequest = CheckoutSessionRequest
+    for name in ("emergentintegrations", "emergentintegrations.payments", "emergentintegrations.payments.stripe"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules[checkout.__name__] = checkout
+
+def install_mongomock_bit_operators():
+    """mongomock lacks $bitsAnySet/$bitsAllSet, which trade filters use; add their integer-mask form"""
+    from mongomock import filtering
+
+    def bits(test):
+        return lambda doc_val, mask: isinstance(doc_val, int) and not isinstance(doc_val, bool) and test(doc_val, mask)
+
+    filtering._filterer_inst._operator_map.update({
+        "$bitsAnySet": bits(lambda value, mask: bool(value & mask)),
+        "$bitsAllSet": bits(lambda value, mask: value & mask == mask),
+    })
+
+def install_oauth_stub(server, latency_ms: float):
+    """Point the server's httpx at a mock transport answering Emergent session-data lookups"""
+    import httpx
+
+    async def handler(request):
+        await asyncio.sleep(latency_ms / 1000)
+        session_id = request.headers.get("X-Session-ID", "unknown")
+        return httpx.Response(200, json={
+            "email": f"{session_id}@oauth.loadtest.hdrywall.com",
+            "name": f"OAuth {session_id}",
+            "picture": None,
+            "session_token": f"tok_{uuid.uuid4().hex}",
+        })
+
+    transport = httpx.MockTransport(handler)
+    server.httpx = types.SimpleNamespace(AsyncClient=lambda **kwargs: httpx.AsyncClient(transport=transport, **kwargs))
+
+# ================== DATA ==================
+
+async def seed(db, seed_value: int, counts: Dict[str, int], password_hash: str) -> Dict:
+    """Load a small synthetic dataset and return the IDs the scenarios pick from"""
+    generator = Generator(seed_value, counts, password_hash)
+    for collection in ("users", "products", "jobs", "worker_profiles"):
+        await load_collection(db, generator, collection, batch_size=5000, concurrency=4)
+    return {
+        "job_ids": [f"job_{i:012x}" for i in range(counts["jobs"])],
+        "profile_ids": [f"profile_{i:012x}" for i in range(min(counts["worker_profiles"], generator.subcontractors))],
+        "product_ids": [p["product_id"] for p in generator.products],
+        "emails": [f"user{i}@example.com" for i in range(counts["users"])],
+    }
+
+# ================== SCENARIOS ==================
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, client, method: str, path: str, endpoint: str, expected=(200, 201), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            ok = response.status_code in expected
+        except Exception:
+            response, ok = None, False
+        self.samples.setdefault(endpoint, []).append((time.perf_counter() - start) * 1000)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+async def browse_jobs(client, rec: Recorder, rng: random.Random, data: Dict):
+    params = {"trade_code": rng.choice(TRADE_CODE_LIST)}
+    if rng.random() < 0.5:
+        params["state"] = rng.choice(STATES)
+    await rec.call(client, "GET", "/api/jobs", "GET /api/jobs", params=params)
+    if data["job_ids"]:
+        await rec.call(client, "GET", f"/api/jobs/{rng.choice(data['job_ids'])}", "GET /api/jobs/{job_id}")
+
+async def search_profiles(client, rec: Recorder, rng: random.Random, data: Dict):
+    params = {"trade_code": rng.choice(TRADE_CODE_LIST)}
+    if rng.random() < 0.5:
+        params["availability"] = rng.choice(AVAILABILITY_VALUES)
+    await rec.call(client, "GET", "/api/profiles", "GET /api/profiles", params=params)
+    if data["profile_ids"]:
+        await rec.call(client, "GET", f"/api/profiles/{rng.choice(data['profile_ids'])}", "GET /api/profiles/{profile_id}")
+
+async def cart_checkout(client, rec: Recorder, rng: random.Random, data: Dict):
+    for product_id in rng.sample(data["product_ids"], min(3, len(data["product_ids"]))):
+        await rec.call(client, "POST", "/api/cart/add", "POST /api/cart/add",
+                       json={"product_id": product_id, "quantity": rng.randint(1, 3)})
+    await rec.call(client, "GET", "/api/cart", "GET /api/cart")
+    await rec.call(client, "POST", "/api/checkout/create-session", "POST /api/checkout/create-session",
+                   json={"origin_url": "https://load.test"})
+    await rec.call(client, "DELETE", "/api/cart", "DELETE /api/cart")
+
+async def login_burst(client, rec: Recorder, rng: random.Random, data: Dict):
+    for _ in range(rng.randint(1, 3)):
+        await rec.call(client, "POST", "/api/auth/login", "POST /api/auth/login",
+                       json={"email": rng.choice(data["emails"]), "password": LOAD_TEST_PASSWORD})
+
+async def google_login(client, rec: Recorder, rng: random.Random, data: Dict):
+    await rec.call(client, "POST", "/api/auth/session", "POST /api/auth/session",
+                   json={"session_id": f"sess{rng.randint(0, 999)}"})
+
+SCENARIOS: Dict[str, Callable] = {
+    "browse_jobs": browse_jobs,
+    "search_profiles": search_profiles,
+    "cart_checkout": cart_checkout,
+    "login_burst": login_burst,
+    "google_login": google_login,
+}
+
+# ================== RUNNER ==================
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+def summarize(rec: Recorder, elapsed: float, config: Dict) -> Dict:
+    endpoints = {}
+    total = errors = 0
+    for endpoint, samples in sorted(rec.samples.items()):
+        values = sorted(samples)
+        total += len(values)
+        errors += rec.errors.get(endpoint, 0)
+        endpoints[endpoint] = {
+            "count": len(values),
+            "errors": rec.errors.get(endpoint, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2),
+        }
+    return {
+        "config": config,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in filter(None, spec.split(",")):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+async def run(args) -> Dict:
+    os.environ.setdefault("DB_NAME", f"loadtest_{uuid.uuid4().hex[:8]}")
+    os.environ["MONGO_URL"] = args.mongo if args.mongo != "memory" else "mongodb://localhost:27017"
+    if args.mongo == "memory":
+        # mongomock has neither change streams nor tailable cursors
+        os.environ["CACHE_BUS_MODE"] = "local"
+    if not args.keep_rate_limits:
+        os.environ["RATE_LIMITS"] = "auth=1e9/1,checkout=1e9/1,bulk=1e9/1,browse=1e9/1"
+    install_stripe_stub(args.stripe_latency_ms)
+
+    import httpx
+    import server
+    import tracing
+
+    databases = server.connect_databases()
+    if args.mongo == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--mongo memory needs mongomock-motor (pip install mongomock-motor)")
+        install_mongomock_bit_operators()
+        databases.use(tracing.TracedDatabase(AsyncMongoMockClient()[os.environ["DB_NAME"]]))
+    install_oauth_stub(server, args.oauth_latency_ms)
+
+    app = server.create_app(databases)
+    lifespan = app.router.lifespan_context(app)
+    await lifespan.__aenter__()
+    counts = {"users": args.users, "products": args.products, "jobs": args.jobs,
+              "worker_profiles": args.profiles, "carts": 0, "payment_transactions": 0}
+    data = await seed(databases.write, args.seed, counts, server.pwd_context.hash(LOAD_TEST_PASSWORD))
+
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    rec = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    deadline = time.perf_counter() + args.warmup + args.duration
+    measure_from = time.perf_counter() + args.warmup
+
+    async def virtual_user(worker: int):
+        user_rng = random.Random(args.seed * 1000 + worker)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            while time.perf_counter() < deadline:
+                scenario = SCENARIOS[user_rng.choices(names, weights)[0]]
+                target = rec if time.perf_counter() >= measure_from else Recorder()
+                await scenario(client, target, user_rng, data)
+
+    try:
+        await asyncio.gather(*(virtual_user(i) for i in range(args.concurrency)))
+    finally:
+        if args.mongo != "memory" and not args.keep_db:
+            await databases.clients["write"].drop_database(os.environ["DB_NAME"])
+        await lifespan.__aexit__(None, None, None)
+
+    return summarize(rec, args.duration, {
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "mix": mix,
+        "mongo": "memory" if args.mongo == "memory" else "mongod",
+        "seed": args.seed,
+        "dataset": {"jobs": args.jobs, "profiles": args.profiles, "products": args.products, "users": args.users},
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="memory", help='"memory" (mongomock-motor) or a mongod URL')
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", help="weighted scenarios, e.g. browse_jobs=5,login_burst=1")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--profiles", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--stripe-latency-ms", type=float, default=150.0)
+    parser.add_argument("--oauth-latency-ms", type=float, default=80.0)
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep RATE_LIMITS instead of disabling them")
+    parser.add_argument("--keep-db", action="store_true", help="do not drop the scratch database afterwards")
+    parser.add_argument("--max-error-rate", type=float, help="exit non-zero when the error rate is above this")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
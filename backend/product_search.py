@@ -0,0 +1,139 @@
+"""
+Faceted product search.
+
+One aggregation answers a search page: a $facet computes the result page, the
+total, and counts per category, price bucket and availability. Each facet
+applies every filter except its own, so the category counts show what picking
+another category would return. Results are cached per catalog version, which
+catalog syncs and product edits bump and announce on the cache bus. The
+popularity order (views) and stock can change without a version bump, so
+entries also expire after a short TTL.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+import catalog
+from cache_bus import LocalCache
+
+PRICE_BOUNDARIES = [0, 25, 50, 100, 250, 500, 1000]
+OVERFLOW_BUCKET = "1000+"
+
+SORTS = {
+    "newest": [("created_at", -1)],
+    "price_asc": [("price", 1), ("product_id", 1)],
+    "price_desc": [("price", -1), ("product_id", 1)],
+    "popular": [("views", -1), ("created_at", -1)],
+}
+# "relevance" (text score) is only meaningful with a text query
+
+TEXT_INDEX = "product_text"
+
+async def ensure_indexes(db):
+    await db.products.create_index([("name", "text"), ("description", "text"), ("category", "text")],
+                                   name=TEXT_INDEX, weights={"name": 10, "category": 5, "description": 1})
+    await db.products.create_index([("active", 1), ("category", 1), ("price", 1)])
+    await db.products.create_index([("active", 1), ("views", -1), ("created_at", -1)])
+
+def _price_label(lower: float) -> str:
+    index = PRICE_BOUNDARIES.index(lower)
+    return f"{lower}-{PRICE_BOUNDARIES[index + 1]}"
+
+def build_pipeline(q: Optional[str] = None, category: Optional[str] = None, min_price: Optional[float] = None,
+                   max_price: Optional[float] = None, in_stock: bool = False, on_sale: bool = False,
+                   sort: str = "newest", skip: int = 0, limit: int = 24) -> List[Dict[str, Any]]:
+    base: Dict[str, Any] = {"active": True}
+    if q:
+        base["$text"] = {"$search": q}
+
+    filters: Dict[str, Dict[str, Any]] = {}
+    if category:
+        filters["category"] = {"category": category}
+    if min_price is not None or max_price is not None:
+        price: Dict[str, float] = {}
+        if min_price is not None:
+            price["$gte"] = min_price
+        if max_price is not None:
+            price["$lte"] = max_price
+        filters["price"] = {"price": price}
+    if in_stock:
+        filters["in_stock"] = {"stock": {"$gt": 0}}
+    if on_sale:
+        filters["on_sale"] = {"$expr": {"$gt": ["$compare_price", "$price"]}}
+
+    def match(*excluded: str) -> List[Dict]:
+        clauses = [clause for name, clause in filters.items() if name not in excluded]
+        return [{"$match": {"$and": clauses}}] if clauses else []
+
+    if sort == "relevance" and q:
+        order: Dict[str, Any] = {"score": {"$meta": "textScore"}, "created_at": -1}
+    else:
+        order = dict(SORTS.get(sort, SORTS["newest"]))
+
+    return [
+        {"$match": base},
+        {"$facet": {
+            "items": [*match(), {"$sort": order}, {"$skip": skip}, {"$limit": limit}, {"$project": {"_id": 0}}],
+            "total": [*match(), {"$count": "count"}],
+            "categories": [*match("category"), {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                           {"$sort": {"count": -1, "_id": 1}}],
+            "price_buckets": [*match("price"), {"$bucket": {
+                "groupBy": "$price", "boundaries": PRICE_BOUNDARIES, "default": OVERFLOW_BUCKET,
+                "output": {"count": {"$sum": 1}},
+            }}],
+            "availability": [*match("in_stock", "on_sale"), {"$group": {
+                "_id": None,
+                "in_stock": {"$sum": {"$cond": [{"$gt": ["$stock", 0]}, 1, 0]}},
+                "on_sale": {"$sum": {"$cond": [{"$gt": ["$compare_price", "$price"]}, 1, 0]}},
+            }}],
+        }},
+    ]
+
+def shape_result(raw: Dict[str, Any]) -> Dict[str, Any]:
+    availability = raw["availability"][0] if raw["availability"] else {}
+    return {
+        "items": raw["items"],
+        "total": raw["total"][0]["count"] if raw["total"] else 0,
+        "facets": {
+            "categories": [{"value": c["_id"], "count": c["count"]} for c in raw["categories"]],
+            "price": [
+                {"value": b["_id"] if b["_id"] == OVERFLOW_BUCKET else _price_label(b["_id"]), "count": b["count"]}
+                for b in raw["price_buckets"]
+            ],
+            "availability": {"in_stock": availability.get("in_stock", 0), "on_sale": availability.get("on_sale", 0)},
+        },
+    }
+
+class ProductSearch:
+    def __init__(self, bus, ttl: float = 60.0, maxsize: int = 2000):
+        self.results = LocalCache(ttl, maxsize)
+        self._version: Optional[int] = None
+        bus.subscribe("catalog", self._on_catalog_change)
+
+    def _on_catalog_change(self, key: Optional[str], data: Optional[Dict]):
+        # A full flush (key None) or a version-less notice forces a re-read of the version
+        if data and "version" in data:
+            self._version = max(self._version or 0, data["version"])
+        else:
+            self._version = None
+        if key is None:
+            self.results.invalidate()
+
+    async def catalog_version(self, db) -> int:
+        if self._version is None:
+            self._version = await catalog.get_catalog_version(db)
+        return self._version
+
+    async def search(self, db, **params) -> Dict[str, Any]:
+        version = await self.catalog_version(db)
+        if params.get("q"):
+            params["q"] = re.sub(r"\s+", " ", params["q"]).strip().lower()
+        key = f"{version}:{json.dumps(params, sort_keys=True, default=str)}"
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+        raw = await db.products.aggregate(build_pipeline(**params)).to_list(1)
+        result = {**shape_result(raw[0]), "catalog_version": version}
+        self.results.set(key, result)
+        return result
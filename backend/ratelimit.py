@@ -0,0 +1,186 @@
+"""
+Token-bucket rate limiting per principal (authenticated user) or client IP.
+
+Routes are grouped into classes with their own limits. Buckets live in process
+memory by default; RATE_LIMIT_BACKEND=mongo shares them across workers through
+an atomic findOneAndUpdate on the rate_limit_buckets collection.
+"""
+
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+BUCKET_COLLECTION = "rate_limit_buckets"
+
+# (route class, HTTP method or None for any, path pattern) - first match wins
+ROUTE_CLASSES: List[Tuple[str, Optional[str], re.Pattern]] = [
+    ("auth", "POST", re.compile(r"^/api/auth/(login|register)$")),
+    ("checkout", "POST", re.compile(r"^/api/(checkout/create-session|market-data/subscribe)$")),
+    ("bulk", None, re.compile(r"^/api/(jobs/import|export/)")),
+    ("browse", "GET", re.compile(r"^/api/(profiles|jobs)(/|$)")),
+]
+
+class Limit:
+    """`capacity` requests per `period` seconds, refilled continuously"""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def __repr__(self):
+        return f"Limit({self.capacity:g}/{self.period:g}s)"
+
+DEFAULT_LIMITS = {
+    "auth": Limit(10, 60),
+    "checkout": Limit(5, 60),
+    "bulk": Limit(20, 3600),
+    "browse": Limit(120, 60),
+}
+
+def parse_limits(spec: Optional[str]) -> Dict[str, Limit]:
+    """Parse "auth=10/60,browse=300/60" overrides on top of DEFAULT_LIMITS"""
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, (spec or "").split(",")):
+        name, _, value = item.partition("=")
+        capacity, _, period = value.partition("/")
+        limits[name.strip()] = Limit(float(capacity), float(period or 60))
+    return limits
+
+def route_class(method: str, path: str) -> Optional[str]:
+    for name, route_method, pattern in ROUTE_CLASSES:
+        if (route_method is None or route_method == method) and pattern.match(path):
+            return name
+    return None
+
+class MemoryBuckets:
+    """In-process token buckets with LRU eviction to bound memory"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        """Consume one token; returns (allowed, tokens left)"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [limit.capacity, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True, bucket[0]
+        return False, bucket[0]
+
+    async def ensure_indexes(self):
+        pass
+
+class MongoBuckets:
+    """Token buckets shared by all workers; one atomic round trip per request"""
+
+    def __init__(self, db):
+        self.collection = db[BUCKET_COLLECTION]
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        now = time.time()
+        refilled = {"$min": [
+            limit.capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", limit.capacity]},
+                {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$ts", now]}]}]}, limit.rate]},
+            ]},
+        ]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "ts": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=limit.period),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["allowed"], doc["tokens"]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+def client_ip(scope, trusted_proxy_hops: int) -> str:
+    """Client address, taken from X-Forwarded-For when behind `trusted_proxy_hops` proxies"""
+    if trusted_proxy_hops:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                hops = [h.strip() for h in value.decode("latin-1").split(",") if h.strip()]
+                if hops:
+                    return hops[max(len(hops) - trusted_proxy_hops, 0)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After once a bucket is empty.
+
+    `principal` maps a request's headers to a user id (or None), so
+    authenticated clients are limited per user and anonymous ones per IP.
+    """
+
+    def __init__(self, app, buckets, limits: Dict[str, Limit],
+                 principal: Optional[Callable[[Dict[str, str]], Optional[str]]] = None,
+                 trusted_proxy_hops: int = 0):
+        self.app = app
+        self.buckets = buckets
+        self.limits = limits
+        self.principal = principal
+        self.trusted_proxy_hops = trusted_proxy_hops
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = route_class(scope["method"], scope["path"])
+        limit = self.limits.get(name) if name else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        user_id = None
+        if self.principal and name != "auth":
+            headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+            user_id = self.principal(headers)
+        key = f"{name}:user:{user_id}" if user_id else f"{name}:ip:{client_ip(scope, self.trusted_proxy_hops)}"
+
+        allowed, tokens = await self.buckets.take(key, limit)
+        if allowed:
+            return await self.app(scope, receive, send)
+
+        retry_after = max(1, math.ceil((1 - tokens) / limit.rate))
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+                (b"x-ratelimit-limit", f"{limit.capacity:g}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+def build_buckets(db):
+    if os.environ.get("RATE_LIMIT_BACKEND", "memory") == "mongo":
+        return MongoBuckets(db)
+    return MemoryBuckets()
@@ -0,0 +1,155 @@
+"""
+"Frequently bought together" recommendations, rebuilt in batch.
+
+Orders (and, with a lower weight, current cart contents) become rows of a
+sparse basket x product incidence matrix B. The co-occurrence matrix is
+C = B^T B; each pair's count is normalized by the popularity of both products
+(cosine), so best sellers do not show up next to everything. Only the top-N
+neighbours per product are kept, one compact document per product:
+
+    {"_id": "prod_abc", "ids": ["prod_x", "prod_y"], "scores": [0.41, 0.22], "orders": [17, 9], "build": "..."}
+
+    python recommendations.py --days 365 --top 20
+
+Serving is a single _id lookup (cached in process); the rebuild announces
+itself on the cache bus so every worker drops its cached neighbours.
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Tuple
+
+from pymongo import ReplaceOne
+
+COLLECTION = "product_recommendations"
+BUS_KEY = "recommendations"
+
+class _Baskets:
+    """Accumulates COO coordinates of the basket x product matrix"""
+
+    def __init__(self, product_index: Dict[str, int]):
+        self.product_index = product_index
+        self.rows: List[int] = []
+        self.cols: List[int] = []
+        self.weights: List[float] = []
+        self.count = 0
+
+    def add(self, product_ids, weight: float):
+        cols = {self.product_index[p] for p in product_ids if p in self.product_index}
+        if len(cols) < 2:
+            return
+        self.rows.extend([self.count] * len(cols))
+        self.cols.extend(cols)
+        self.weights.extend([weight] * len(cols))
+        self.count += 1
+
+def top_neighbours(rows, cols, weights, n_baskets: int, n_products: int, top_n: int = 20, min_support: float = 2.0):
+    """Top-N neighbours per product from COO basket arrays, as (product, neighbour, score, co-occurrence) arrays"""
+    # NumPy/SciPy load only in the batch job, never in the API process
+    import numpy as np
+    from scipy import sparse
+
+    # Row-scaled incidence: a basket row of weight w contributes w to every pair it contains
+    baskets = sparse.csr_matrix((np.sqrt(weights), (rows, cols)), shape=(n_baskets, n_products), dtype=np.float64)
+    co = (baskets.T @ baskets).tocsr()
+    # The diagonal is each product's own (weighted) basket count
+    popularity = co.diagonal()
+    co = co.tocoo()
+
+    keep = (co.row != co.col) & (co.data >= min_support)
+    product, neighbour, together = co.row[keep], co.col[keep], co.data[keep]
+    scores = together / np.sqrt(popularity[product] * popularity[neighbour])
+
+    # Sort by product, then score descending, and keep each product's first top_n entries
+    order = np.lexsort((-scores, product))
+    product, neighbour, scores, together = product[order], neighbour[order], scores[order], together[order]
+    starts = np.searchsorted(product, product, side="left")
+    rank = np.arange(len(product)) - starts
+    top = rank < top_n
+    return product[top], neighbour[top], scores[top], together[top]
+
+async def build_recommendations(db, days: int = 365, top_n: int = 20, cart_weight: float = 0.25,
+                                min_support: float = 2.0, batch_size: int = 1000) -> Dict:
+    started = datetime.now(timezone.utc)
+    since = (started - timedelta(days=days)).isoformat()
+
+    product_ids = [doc["product_id"] async for doc in db.products.find({"active": {"$ne": False}}, {"_id": 0, "product_id": 1})]
+    product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+    baskets = _Baskets(product_index)
+
+    orders = 0
+    async for order in db.orders.find({"created_at": {"$gte": since}, "items": {"$exists": True}},
+                                      {"_id": 0, "items.product_id": 1}, batch_size=batch_size):
+        baskets.add((item["product_id"] for item in order["items"]), 1.0)
+        orders += 1
+    carts = 0
+    if cart_weight > 0:
+        async for cart in db.carts.find({}, {"_id": 0, "items.product_id": 1}, batch_size=batch_size):
+            baskets.add((item["product_id"] for item in cart.get("items", [])), cart_weight)
+            carts += 1
+
+    build = f"{started:%Y%m%dT%H%M%S}-{secrets.token_hex(3)}"
+    written = 0
+    if baskets.count:
+        import numpy as np
+
+        product, neighbour, scores, together = top_neighbours(
+            np.asarray(baskets.rows, dtype=np.int64), np.asarray(baskets.cols, dtype=np.int64),
+            np.asarray(baskets.weights, dtype=np.float64), baskets.count, len(product_ids), top_n, min_support)
+        bounds = np.flatnonzero(np.diff(product)) + 1
+        operations = []
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(product)]):
+            if start == stop:
+                continue
+            operations.append(ReplaceOne({"_id": product_ids[product[start]]}, {
+                "ids": [product_ids[i] for i in neighbour[start:stop]],
+                "scores": [round(float(s), 4) for s in scores[start:stop]],
+                "orders": [round(float(c), 2) for c in together[start:stop]],
+                "build": build,
+                "built_at": started,
+            }, upsert=True))
+        for i in range(0, len(operations), batch_size):
+            await db[COLLECTION].bulk_write(operations[i:i + batch_size], ordered=False)
+        written = len(operations)
+    # Products that lost all neighbours (or were deactivated) keep no stale row
+    await db[COLLECTION].delete_many({"build": {"$ne": build}})
+
+    return {
+        "build": build,
+        "orders": orders,
+        "carts": carts,
+        "products": written,
+        "seconds": round((datetime.now(timezone.utc) - started).total_seconds(), 3),
+    }
+
+async def get_neighbours(db, product_id: str, limit: int = 8) -> List[Tuple[str, float]]:
+    doc = await db[COLLECTION].find_one({"_id": product_id}, {"ids": {"$slice": limit}, "scores": {"$slice": limit}})
+    if not doc:
+        return []
+    return list(zip(doc["ids"], doc["scores"]))
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    import cache_bus
+
+    parser = argparse.ArgumentParser(description="Rebuild frequently-bought-together recommendations")
+    parser.add_argument("--days", type=int, default=365, help="order history window")
+    parser.add_argument("--top", type=int, default=20, help="neighbours kept per product")
+    parser.add_argument("--cart-weight", type=float, default=0.25, help="weight of cart contents relative to orders")
+    parser.add_argument("--min-support", type=float, default=2.0, help="minimum weighted co-occurrences")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("DB_NAME", "test_database")]
+    report = await build_recommendations(db, args.days, args.top, args.cart_weight, args.min_support)
+    await cache_bus.CacheBus(db, mode=os.environ.get("CACHE_BUS_MODE", "auto")).publish(BUS_KEY, {"build": report["build"]})
+    print(f"Recommendations for {report['products']} products from {report['orders']} orders "
+          f"and {report['carts']} carts in {report['seconds']}s")
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
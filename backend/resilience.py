@@ -0,0 +1,223 @@
+"""
+Fault isolation for outbound calls (OAuth, Stripe, Market Data API).
+
+Every upstream gets its own:
+
+- timeout per attempt, instead of the client library's default;
+- bulkhead: at most max_concurrent calls in flight; a caller waits up to
+  queue_timeout seconds for a slot and is then rejected, so a slow upstream
+  holds a bounded number of requests instead of every worker's capacity;
+- circuit breaker: failure_threshold consecutive failures open the circuit
+  and calls fail immediately for reset_timeout seconds; then a single probe
+  is let through (half-open) and its outcome closes or re-opens the circuit;
+- bounded retries with full jitter, only for calls the caller marks
+  idempotent.
+
+Rejections, timeouts and exhausted retries raise UpstreamUnavailable, which
+the API turns into a 503 with Retry-After.
+
+Options per upstream come from UPSTREAM_<NAME>_OPTIONS, e.g.
+UPSTREAM_STRIPE_OPTIONS="timeout=5,retries=1,max_concurrent=20,failure_threshold=5,reset_timeout=30".
+"""
+
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+DEFAULT_OPTIONS: Dict[str, Any] = {
+    "timeout": 5.0,
+    "retries": 2,
+    "backoff": 0.2,
+    "max_backoff": 2.0,
+    "max_concurrent": 20,
+    "queue_timeout": 0.5,
+    "failure_threshold": 5,
+    "reset_timeout": 30.0,
+}
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was rejected (circuit open, bulkhead full) or failed after its retries"""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float = 0.0):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+def parse_options(spec: Optional[str]) -> Dict[str, float]:
+    """Parse "timeout=5,retries=1" into Upstream keyword arguments"""
+    options: Dict[str, float] = {}
+    for item in filter(None, (spec or "").split(",")):
+        key, _, value = item.partition("=")
+        options[key.strip()] = float(value.strip())
+    return options
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 on_state_change: Optional[Callable[[str], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            if self.on_state_change:
+                self.on_state_change(state)
+
+    def retry_after(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def try_acquire(self) -> bool:
+        """Whether a call may proceed now; in half-open only one probe is admitted at a time"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self):
+        """The admitted call ended without an outcome (e.g. it was cancelled)"""
+        self._probing = False
+
+    def record_success(self):
+        self._probing = False
+        self.failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+class Upstream:
+    def __init__(self, name: str, timeout: float = 5.0, retries: int = 2, backoff: float = 0.2,
+                 max_backoff: float = 2.0, max_concurrent: int = 20, queue_timeout: float = 0.5,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 is_error: Optional[Callable[[Exception], bool]] = None,
+                 on_event: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.timeout = timeout
+        self.retries = int(retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_concurrent = int(max_concurrent)
+        self.queue_timeout = queue_timeout
+        # Which exceptions count against the breaker (default: all); others mean the upstream answered
+        self.is_error = is_error
+        self.on_event = on_event
+        self.breaker = CircuitBreaker(int(failure_threshold), reset_timeout, on_state_change=self._event)
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self.in_flight = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _event(self, event: str):
+        if self.on_event:
+            self.on_event(self.name, event)
+
+    def _reject(self, reason: str, retry_after: float) -> UpstreamUnavailable:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        self._event(reason)
+        return UpstreamUnavailable(self.name, reason, retry_after)
+
+    @asynccontextmanager
+    async def _slot(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("bulkhead_full", self.queue_timeout) from None
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def call(self, fn: Callable[[], Awaitable[T]], idempotent: bool = False,
+                   is_failure: Optional[Callable[[T], bool]] = None) -> T:
+        """
+        Run fn() under this upstream's breaker, bulkhead and timeout.
+
+        Only idempotent calls are retried. is_failure marks a returned result
+        (e.g. an HTTP 5xx response) as a failure; if every attempt fails that
+        way, the last result is returned to the caller.
+        """
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            if attempt:
+                self._event("retry")
+                await asyncio.sleep(self._delay(attempt))
+            if not self.breaker.try_acquire():
+                raise self._reject("circuit_open", self.breaker.retry_after())
+            outcome = False
+            try:
+                async with self._slot():
+                    try:
+                        result = await asyncio.wait_for(fn(), timeout=self.timeout)
+                    except Exception as e:
+                        outcome = True
+                        if self.is_error and not isinstance(e, asyncio.TimeoutError) and not self.is_error(e):
+                            # The upstream answered (e.g. a 4xx surfaced as an exception)
+                            self.breaker.record_success()
+                            raise
+                        self.breaker.record_failure()
+                        if attempt == attempts - 1:
+                            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                            raise UpstreamUnavailable(self.name, reason, self.breaker.retry_after()) from e
+                        continue
+                    if is_failure and is_failure(result):
+                        self.breaker.record_failure()
+                        outcome = True
+                        if attempt < attempts - 1:
+                            continue
+                    else:
+                        self.breaker.record_success()
+                        outcome = True
+                    return result
+            finally:
+                if not outcome:
+                    self.breaker.release()
+        raise AssertionError("unreachable")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retry_after": round(self.breaker.retry_after(), 3),
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rejected": dict(self.rejected),
+        }
+
+def build_upstreams(defaults: Dict[str, Dict[str, Any]], environ: Optional[Dict[str, str]] = None,
+                    on_event: Optional[Callable[[str, str], None]] = None) -> Dict[str, Upstream]:
+    """One Upstream per name: DEFAULT_OPTIONS < per-upstream defaults < UPSTREAM_<NAME>_OPTIONS"""
+    environ = os.environ if environ is None else environ
+    upstreams = {}
+    for name, options in defaults.items():
+        settings = {**DEFAULT_OPTIONS, **options,
+                    **parse_options(environ.get(f"UPSTREAM_{name.upper()}_OPTIONS"))}
+        upstreams[name] = Upstream(name, on_event=on_event, **settings)
+    return upstreams
@@ -0,0 +1,306 @@
+"""
+Labor market rollups - time-bucketed aggregates per trade code x state x ISO week.
+
+Jobs and worker profiles feed these incrementally on every write, so the
+market data endpoints only ever read pre-aggregated documents. Each write also
+updates "*" rows (all trades / all states) so any filter combination is served
+by at most one document per week.
+"""
+
+import asyncio
+import os
+import re
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+import archiver
+
+ROLLUP_COLLECTION = "labor_rollups"
+ALL = "*"
+
+# Histogram bucket width in dollars and number of buckets per pay type;
+# values beyond the last bucket are clamped into it
+PAY_BUCKETS = {
+    "hourly": (1.0, 300),
+    "daily": (10.0, 300),
+    "project": (250.0, 400),
+}
+RATE_BUCKET = (1.0, 300)
+
+PERCENTILES = (25, 50, 75, 90)
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+def parse_pay_rate(pay_rate) -> Optional[float]:
+    """Extract a numeric pay value from free-text pay rates ("25", "$30/hr", "28-35")"""
+    numbers = [float(n) for n in _NUMBER.findall(str(pay_rate or "").replace(",", ""))][:2]
+    if not numbers:
+        return None
+    return sum(numbers) / len(numbers)
+
+def week_key(created_at) -> str:
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    year, week, _ = created_at.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def week_start(weeks_back: int, now: Optional[datetime] = None) -> datetime:
+    """Monday 00:00 UTC of the ISO week `weeks_back` weeks before the current one"""
+    now = now or datetime.now(timezone.utc)
+    monday = (now - timedelta(days=now.weekday(), weeks=weeks_back)).date()
+    return datetime(monday.year, monday.month, monday.day, tzinfo=timezone.utc)
+
+def _bucket(value: float, width: float, count: int) -> str:
+    return str(min(max(int(value // width), 0), count - 1))
+
+def _normalize_state(state) -> str:
+    return str(state or "").strip().upper() or "UNKNOWN"
+
+# Rollup document fields that are not counters
+_META_FIELDS = {"_id", "trade_code", "state", "week", "updated_at"}
+
+def _counters(doc: Dict, prefix: str = "") -> Dict[str, float]:
+    """A rollup document's counters as dotted paths ("pay.hourly.hist.30" -> 2)"""
+    counters: Dict[str, float] = {}
+    for field, value in doc.items():
+        if not prefix and field in _META_FIELDS:
+            continue
+        if isinstance(value, dict):
+            counters.update(_counters(value, f"{prefix}{field}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            counters[prefix + field] = value
+    return counters
+
+class RollupBatch:
+    """Accumulates $inc deltas per rollup key and flushes them as one bulk_write"""
+
+    def __init__(self):
+        self._incs: Dict[tuple, Dict[str, float]] = {}
+
+    def __len__(self):
+        return len(self._incs)
+
+    def _keys(self, doc: Dict) -> List[tuple]:
+        week = week_key(doc["created_at"])
+        state = _normalize_state(doc.get("state"))
+        keys = [(ALL, state, week), (ALL, ALL, week)]
+        for code in set(doc.get("trade_codes") or []):
+            keys.append((code, state, week))
+            keys.append((code, ALL, week))
+        return keys
+
+    def _inc(self, keys: List[tuple], fields: Dict[str, float]):
+        for key in keys:
+            incs = self._incs.setdefault(key, {})
+            for field, amount in fields.items():
+                incs[field] = incs.get(field, 0) + amount
+
+    def add_job(self, job: Dict, sign: int = 1):
+        fields = {"jobs_posted": sign}
+        pay = parse_pay_rate(job.get("pay_rate"))
+        pay_type = job.get("pay_type")
+        if pay is not None and pay_type in PAY_BUCKETS:
+            width, count = PAY_BUCKETS[pay_type]
+            fields[f"pay.{pay_type}.count"] = sign
+            fields[f"pay.{pay_type}.sum"] = sign * pay
+            fields[f"pay.{pay_type}.hist.{_bucket(pay, width, count)}"] = sign
+        self._inc(self._keys(job), fields)
+
+    def add_profile(self, profile: Dict, sign: int = 1):
+        fields = {
+            "profiles_listed": sign,
+            f"availability.{profile.get('availability') or 'unknown'}": sign,
+        }
+        width, count = RATE_BUCKET
+        for name in ("hourly_rate_min", "hourly_rate_max"):
+            rate = profile.get(name)
+            if rate is not None:
+                fields[f"{name}.count"] = sign
+                fields[f"{name}.sum"] = sign * rate
+                fields[f"{name}.hist.{_bucket(rate, width, count)}"] = sign
+        self._inc(self._keys(profile), fields)
+
+    def operations(self) -> List[UpdateOne]:
+        ops = []
+        for (trade_code, state, week), incs in self._incs.items():
+            # Float sums of a rebuild's (rebuilt - stored) can miss zero by rounding noise
+            incs = {field: amount for field, amount in incs.items() if abs(amount) > 1e-9}
+            if not incs:
+                continue
+            ops.append(UpdateOne(
+                {"_id": f"{trade_code}|{state}|{week}"},
+                {
+                    "$inc": incs,
+                    "$setOnInsert": {"trade_code": trade_code, "state": state, "week": week},
+                    "$currentDate": {"updated_at": True},
+                },
+                upsert=True
+            ))
+        return ops
+
+    def subtract_doc(self, doc: Dict):
+        """Subtract a stored rollup document's counters, so flushing applies (accumulated - stored)"""
+        key = (doc["trade_code"], doc["state"], doc["week"])
+        self._inc([key], {field: -amount for field, amount in _counters(doc).items()})
+
+    async def flush(self, db):
+        ops = self.operations()
+        self._incs.clear()
+        if ops:
+            await db[ROLLUP_COLLECTION].bulk_write(ops, ordered=False)
+
+async def record_job_change(db, old: Optional[Dict] = None, new: Optional[Dict] = None):
+    """Apply the rollup delta of a job write (create: new only, update: both)"""
+    batch = RollupBatch()
+    if old:
+        batch.add_job(old, -1)
+    if new:
+        batch.add_job(new, 1)
+    await batch.flush(db)
+
+async def record_profile_change(db, old: Optional[Dict] = None, new: Optional[Dict] = None):
+    """Apply the rollup delta of a worker profile write"""
+    batch = RollupBatch()
+    if old:
+        batch.add_profile(old, -1)
+    if new:
+        batch.add_profile(new, 1)
+    await batch.flush(db)
+
+async def rebuild_rollups(db, weeks: Optional[int] = None, batch_size: int = 1000):
+    """Recompute rollups from raw jobs/profiles, for backfills and drift repair.
+
+    With `weeks`, only the most recent weeks are recomputed and older rollup
+    documents are left untouched. The stored rollups are read before the scan
+    and corrected with $inc (rebuilt - stored) rather than replaced: increments
+    from live writes landing while the rebuild runs are kept, and readers never
+    see a week go missing. Documents created after the rebuild started are left
+    out of the scan, since their own writes count them.
+    """
+    started = datetime.now(timezone.utc).isoformat()
+    query: Dict = {"created_at": {"$lt": started}}
+    rollup_query: Dict = {}
+    if weeks is not None:
+        since = week_start(weeks - 1)
+        query["created_at"]["$gte"] = since.isoformat()
+        rollup_query = {"week": {"$gte": week_key(since)}}
+
+    batch = RollupBatch()
+    async for doc in db[ROLLUP_COLLECTION].find(rollup_query, batch_size=batch_size):
+        batch.subtract_doc(doc)
+    # Archived jobs and profiles were counted when they were live, so they stay in the history
+    for collection in ("jobs", archiver.archive_name("jobs")):
+        async for job in db[collection].find(query, {"_id": 0}, batch_size=batch_size):
+            batch.add_job(job)
+    for collection in ("worker_profiles", archiver.archive_name("worker_profiles")):
+        async for profile in db[collection].find(query, {"_id": 0}, batch_size=batch_size):
+            batch.add_profile(profile)
+
+    # Only keys whose stored counters drifted produce an update
+    ops = batch.operations()
+    for i in range(0, len(ops), batch_size):
+        await db[ROLLUP_COLLECTION].bulk_write(ops[i:i + batch_size], ordered=False)
+    return len(ops)
+
+async def ensure_indexes(db):
+    await db[ROLLUP_COLLECTION].create_index([("trade_code", 1), ("state", 1), ("week", 1)])
+
+# ================== READ SIDE ==================
+
+async def fetch_rollups(db, trade_code: Optional[str], state: Optional[str], weeks: int) -> List[Dict]:
+    query = {
+        "trade_code": trade_code or ALL,
+        "state": _normalize_state(state) if state else ALL,
+        "week": {"$gte": week_key(week_start(weeks - 1))},
+    }
+    return await db[ROLLUP_COLLECTION].find(query, {"_id": 0}).sort("week", 1).to_list(None)
+
+def _merge_hist(target: Dict[str, float], hist: Dict[str, float]):
+    for bucket, count in (hist or {}).items():
+        target[bucket] = target.get(bucket, 0) + count
+
+def percentiles(hist: Dict[str, float], width: float) -> Dict[str, Optional[float]]:
+    """Percentiles from a fixed-width histogram, interpolated within buckets"""
+    buckets = sorted((int(b), c) for b, c in hist.items() if c > 0)
+    total = sum(c for _, c in buckets)
+    result = {}
+    for p in PERCENTILES:
+        if not total:
+            result[f"p{p}"] = None
+            continue
+        rank = total * p / 100
+        seen = 0
+        for bucket, count in buckets:
+            if seen + count >= rank:
+                result[f"p{p}"] = round((bucket + (rank - seen) / count) * width, 2)
+                break
+            seen += count
+    return result
+
+def _stats(section: Dict, width: float) -> Dict:
+    count = section.get("count", 0)
+    return {
+        "count": count,
+        "mean": round(section.get("sum", 0) / count, 2) if count else None,
+        **percentiles(section.get("hist", {}), width),
+    }
+
+def _merge_section(docs: Iterable[Dict], path: List[str]) -> Dict:
+    merged = {"count": 0, "sum": 0.0, "hist": {}}
+    for doc in docs:
+        section = doc
+        for part in path:
+            section = (section or {}).get(part)
+        if not section:
+            continue
+        merged["count"] += section.get("count", 0)
+        merged["sum"] += section.get("sum", 0)
+        _merge_hist(merged["hist"], section.get("hist"))
+    return merged
+
+def wage_summary(docs: List[Dict]) -> Dict:
+    return {
+        "pay": {
+            pay_type: _stats(_merge_section(docs, ["pay", pay_type]), width)
+            for pay_type, (width, _) in PAY_BUCKETS.items()
+        },
+        "hourly_rate_min": _stats(_merge_section(docs, ["hourly_rate_min"]), RATE_BUCKET[0]),
+        "hourly_rate_max": _stats(_merge_section(docs, ["hourly_rate_max"]), RATE_BUCKET[0]),
+    }
+
+def supply_summary(docs: List[Dict]) -> Dict:
+    availability: Dict[str, int] = {}
+    for doc in docs:
+        for key, count in (doc.get("availability") or {}).items():
+            availability[key] = availability.get(key, 0) + count
+    return {
+        "profiles_listed": sum(doc.get("profiles_listed", 0) for doc in docs),
+        "availability": {k: v for k, v in availability.items() if v},
+    }
+
+def trend_series(docs: List[Dict]) -> List[Dict]:
+    hourly_width = PAY_BUCKETS["hourly"][0]
+    return [
+        {
+            "week": doc["week"],
+            "jobs_posted": doc.get("jobs_posted", 0),
+            "profiles_listed": doc.get("profiles_listed", 0),
+            "hourly_pay": _stats(_merge_section([doc], ["pay", "hourly"]), hourly_width),
+        }
+        for doc in docs
+    ]
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("DB_NAME", "test_database")]
+    await ensure_indexes(db)
+    count = await rebuild_rollups(db)
+    print(f"Corrected {count} rollup documents")
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
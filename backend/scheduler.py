@@ -0,0 +1,192 @@
+"""
+Periodic background tasks, each run by one instance at a time.
+
+Every task has a lease document in `scheduler_leases`:
+
+    {"_id": "expire_jobs", "owner": "host:1234:ab12cd", "expires_at": ..., "next_run_at": ...,
+     "last_status": "ok", "last_result": {...}, "last_seconds": 0.42}
+
+An instance takes a task with one conditional upsert that only matches when
+the lease is free (expires_at passed) and the task is due (next_run_at
+passed); every other instance gets a duplicate key error and moves on. The
+runner extends its lease while the task runs and releases it when done, so
+the interval is shared by the whole fleet. If the runner dies, the lease
+expires and another instance picks the task up; tasks must therefore be
+idempotent. A runner that cannot renew its lease (it was taken over, or
+MongoDB was unreachable until the lease ran out) cancels the task, so two
+instances never run it at once.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import secrets
+import socket
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "scheduler_leases"
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable[[], Awaitable[Any]]
+    # Seconds between starts, across all instances
+    interval: float
+    # How long a runner that stopped heartbeating keeps the task
+    lease: float = 120.0
+
+class Scheduler:
+    def __init__(self, db, tick: float = 5.0, owner: Optional[str] = None,
+                 on_finish: Optional[Callable[[str, str, float], None]] = None):
+        self.db = db
+        self.tick = tick
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+        self.on_finish = on_finish
+        self.tasks: Dict[str, Task] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        # Tasks cancelled by their heartbeat rather than by stop()
+        self._lost: Set[str] = set()
+
+    def register(self, name: str, interval: float, lease: float = 120.0):
+        def decorator(fn: Callable[[], Awaitable[Any]]):
+            self.tasks[name] = Task(name, fn, interval, lease)
+            return fn
+        return decorator
+
+    @property
+    def collection(self):
+        return self.db[COLLECTION]
+
+    async def try_acquire(self, task: Task) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": task.name, "expires_at": {"$lte": now}, "next_run_at": {"$lte": now}},
+                {"$set": {
+                    "owner": self.owner,
+                    "expires_at": now + timedelta(seconds=task.lease),
+                    "next_run_at": now + timedelta(seconds=task.interval),
+                    "started_at": now,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Held by another instance, or not due yet
+            return False
+        return doc is not None and doc["owner"] == self.owner
+
+    async def _heartbeat(self, task: Task, runner: asyncio.Task):
+        """Renew the lease while `runner` works; cancel it once the lease is lost"""
+        renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(task.lease / 3)
+            try:
+                result = await self.collection.update_one(
+                    {"_id": task.name, "owner": self.owner},
+                    {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=task.lease)}}
+                )
+            except Exception as e:
+                # Retried on the next beat, unless the lease may have run out in the meantime
+                logger.warning("Renewing the lease on %s failed: %s", task.name, e)
+                if time.monotonic() - renewed < task.lease * 2 / 3:
+                    continue
+            else:
+                if result.matched_count:
+                    renewed = time.monotonic()
+                    continue
+            logger.warning("Lost the lease on %s while it was running; cancelling it", task.name)
+            self._lost.add(task.name)
+            runner.cancel()
+            return
+
+    async def _release(self, task: Task, fields: Dict[str, Any]):
+        await self.collection.update_one(
+            {"_id": task.name, "owner": self.owner},
+            {"$set": {"expires_at": datetime.now(timezone.utc), **fields}}
+        )
+
+    async def _run(self, task: Task):
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(task, asyncio.current_task()))
+        status, fields = "ok", {}
+        try:
+            result = await task.fn()
+            fields = {"last_result": result, "last_error": None}
+        except asyncio.CancelledError:
+            if task.name in self._lost:
+                # The lease belongs to someone else now: nothing to release, and nobody to re-raise to
+                status = "lease_lost"
+                return
+            status = "cancelled"
+            raise
+        except Exception as e:
+            status = "error"
+            fields = {"last_error": str(e)}
+            logger.exception("Scheduled task %s failed", task.name)
+        finally:
+            heartbeat.cancel()
+            seconds = time.perf_counter() - started
+            self._lost.discard(task.name)
+            if status not in ("cancelled", "lease_lost"):
+                try:
+                    await self._release(task, {
+                        **fields,
+                        "last_status": status,
+                        "last_seconds": round(seconds, 3),
+                        "finished_at": datetime.now(timezone.utc),
+                    })
+                except Exception as e:
+                    logger.warning("Releasing the lease on %s failed: %s", task.name, e)
+            if self.on_finish:
+                self.on_finish(task.name, status, seconds)
+            self._running.pop(task.name, None)
+
+    async def run(self):
+        """Poll for due tasks every `tick` seconds (jittered, so instances do not poll in lockstep)"""
+        while True:
+            for task in self.tasks.values():
+                if task.name in self._running:
+                    continue
+                try:
+                    if await self.try_acquire(task):
+                        self._running[task.name] = asyncio.create_task(self._run(task))
+                except Exception as e:
+                    logger.warning("Scheduler could not check %s: %s", task.name, e)
+            await asyncio.sleep(self.tick * random.uniform(0.8, 1.2))
+
+    async def stop(self):
+        """Cancel tasks running here and hand their leases back, so another instance can take over at once"""
+        running = list(self._running.values())
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        if self.tasks:
+            await self.collection.update_many(
+                {"_id": {"$in": list(self.tasks)}, "owner": self.owner},
+                {"$set": {"expires_at": datetime.now(timezone.utc), "last_status": "cancelled"}}
+            )
+
+    def running(self) -> List[str]:
+        return sorted(self._running)
+
+    async def status(self) -> List[Dict[str, Any]]:
+        docs = {doc["_id"]: doc async for doc in self.collection.find({"_id": {"$in": list(self.tasks)}})}
+        return [
+            {
+                "task": name,
+                "interval_seconds": task.interval,
+                "running_here": name in self._running,
+                **{k: v for k, v in docs.get(name, {}).items() if k != "_id"},
+            }
+            for name, task in self.tasks.items()
+        ]
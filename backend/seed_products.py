@@ -1,9 +1,15 @@
+import argparse
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from datetime import datetime, timezone
+from typing import Optional
 import uuid
 
+import bulk_io
+import cache_bus
+import catalog
+
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "test_database")
 
@@ -166,21 +172,47 @@ SAMPLE_PRODUCTS = [
     }
 ]
 
-async def seed_products():
+async def seed_products(feed_path: Optional[str] = None, fmt: Optional[str] = None, source: Optional[str] = None,
+                        deactivate_missing: bool = True, batch_size: int = 1000):
     client = AsyncIOMotorClient(MONGO_URL)
     db = client[DB_NAME]
-    
-    # Check if products already exist
-    count = await db.products.count_documents({})
-    if count > 0:
-        print(f"Products already seeded ({count} products found)")
-        return
-    
-    # Insert products
-    result = await db.products.insert_many(SAMPLE_PRODUCTS)
-    print(f"Seeded {len(result.inserted_ids)} products")
-    
-    client.close()
+    try:
+        await catalog.ensure_indexes(db)
+        if feed_path:
+            fmt = fmt or ("csv" if feed_path.endswith(".csv") else "ndjson")
+            feed = bulk_io.PARSERS[fmt](catalog.file_chunks(feed_path))
+        else:
+            feed = SAMPLE_PRODUCTS
+        report = await catalog.sync_catalog(
+            db, feed,
+            source=source or (os.path.basename(feed_path) if feed_path else "sample"),
+            deactivate_missing=deactivate_missing,
+            batch_size=batch_size,
+        )
+        if report.changed:
+            # Running API workers drop their cached product data
+            await cache_bus.CacheBus(db).publish("catalog", {"version": report.version})
+    finally:
+        client.close()
+    result = report.as_dict()
+    print(
+        f"Catalog sync: {result['rows']} rows, {result['inserted']} new, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {result['reactivated']} reactivated, {result['deactivated']} deactivated, "
+        f"{result['failed']} failed (catalog version {result['catalog_version']})"
+    )
+    for error in result["errors"][:20]:
+        print(f"  row {error['row']}: {error['errors']}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the product catalog (built-in samples or a supplier feed)")
+    parser.add_argument("--feed", help="CSV (header row) or NDJSON file; defaults to the built-in sample products")
+    parser.add_argument("--format", choices=sorted(bulk_io.PARSERS), help="feed format (default: from extension)")
+    parser.add_argument("--source", help="feed name; only products from the same source are deactivated")
+    parser.add_argument("--keep-missing", action="store_true", help="do not deactivate products missing from the feed")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(seed_products(args.feed, args.format, args.source, not args.keep_missing, args.batch_size))
 
 if __name__ == "__main__":
-    asyncio.run(seed_products())
+    main()
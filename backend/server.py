@@ -1,62 +1,199 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends
-from fastapi.responses import JSONResponse
+import coldstart
+
+# Time the imports below; the startup report lists what each one cost
+import_timer = coldstart.ImportTimer()
+import_timer.start()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import Iterable, List, Optional, Dict, Any, Tuple
 import uuid
+import secrets
 from datetime import datetime, timezone, timedelta
-import httpx
-from passlib.context import CryptContext
 import jwt as pyjwt
+from pymongo.errors import BulkWriteError
+
+import alerts
+import archiver
+import bulk_io
+import cache_bus
+import catalog
+import counters
+import database
+import housekeeping
+import metrics
+import product_search
+import ratelimit
+import recommendations
+import resilience
+import singleflight
+import rollups
+import scheduler
+import slowlog
+import token_epochs
+import tracing
+import trades
+
+import_timer.stop()
+
+# Only the OAuth and password endpoints need these; password hashing is pre-warmed at startup
+httpx = coldstart.lazy_import("httpx")
+passlib_context = coldstart.lazy_import("passlib.context")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Query shapes slower than SLOW_QUERY_MS are aggregated and logged with their plan
+slow_queries = slowlog.SlowQueryRecorder(threshold_ms=float(os.environ.get("SLOW_QUERY_MS", "100")))
+mongo_command_listener = metrics.MongoCommandListener()
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = coldstart.Deferred(lambda: passlib_context.CryptContext(schemes=["bcrypt"], deprecated="auto"))
 
 # JWT Configuration
 JWT_SECRET = os.environ.get("JWT_SECRET", "hdrywall-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 168  # 7 days
 
+def connect_databases() -> database.Databases:
+    # Separate pools per workload (interactive reads / writes / background); see database.py for MONGO_*_OPTIONS
+    return database.Databases(
+        mongo_url,
+        os.environ['DB_NAME'],
+        listeners=lambda workload: [mongo_command_listener, slow_queries],
+        # Every Motor call is recorded as a span of the current request
+        wrap=tracing.TracedDatabase,
+        checkout_wait_observer=lambda workload, seconds: metrics.MONGO_POOL_CHECKOUT_WAIT.observe(seconds, workload=workload)
+    )
+
+def init_services(dbs: database.Databases):
+    """
+    Build everything that holds a database handle around `dbs` and bind it to the module names the
+    route handlers use. create_app calls this, so it is the one place the database is injected
+    (load_test.py passes an in-memory one).
+    """
+    global databases, client, db, bus, epochs, alert_engine, counter_buffer
+    global product_searcher, recommendation_cache, detail_cache, task_scheduler
+    databases = dbs
+    client = dbs.clients["write"]
+    db = dbs.write
+
+    # Cache invalidations are broadcast to every worker (change stream, or a tailable cursor on standalone mongod)
+    bus = cache_bus.CacheBus(db, mode=os.environ.get("CACHE_BUS_MODE", "auto"))
+
+    # Bumping a user's epoch revokes their earlier tokens; other instances pick it up within the refresh interval
+    epochs = token_epochs.TokenEpochs(db, refresh_interval=float(os.environ.get("TOKEN_EPOCH_REFRESH_SECONDS", "30")), bus=bus)
+
+    # New jobs are matched against saved searches in the background; matches go out as periodic digests
+    alert_engine = alerts.AlertEngine(
+        db,
+        sink=alerts.build_sink(os.environ.get("ALERT_SINK"), sender=os.environ.get("ALERT_EMAIL_FROM", "alerts@hdrywall.com")),
+        digest_interval=float(os.environ.get("ALERT_DIGEST_SECONDS", "300"))
+    )
+
+    # View/impression counts are summed in memory and written as one bulk $inc per flush
+    counter_buffer = counters.CounterBuffer(
+        db,
+        flush_interval=float(os.environ.get("COUNTER_FLUSH_SECONDS", "5")),
+        max_keys=int(os.environ.get("COUNTER_MAX_KEYS", "100000")),
+        on_drop=lambda collection, amount: metrics.COUNTER_INCREMENTS_DROPPED.inc(amount, collection=collection)
+    )
+
+    # Faceted search results are cached per catalog version (bumped on every catalog change)
+    product_searcher = product_search.ProductSearch(bus, ttl=float(os.environ.get("PRODUCT_SEARCH_CACHE_SECONDS", "60")))
+
+    # Frequently-bought-together lists only change when the batch job runs; it announces itself on the bus
+    recommendation_cache = cache_bus.LocalCache(ttl=600, maxsize=20_000)
+    bus.subscribe(recommendations.BUS_KEY, lambda key, data: recommendation_cache.invalidate())
+    bus.subscribe("catalog", lambda key, data: recommendation_cache.invalidate())
+
+    # Job/profile/product detail reads: concurrent identical lookups share one query, and the result is
+    # kept for DETAIL_CACHE_SECONDS; edits drop it on every worker through the bus
+    detail_cache = singleflight.CoalescingCache(ttl=float(os.environ.get("DETAIL_CACHE_SECONDS", "1")), maxsize=50_000)
+    for detail_prefix in ("job:", "profile:", "product:"):
+        bus.subscribe(detail_prefix, lambda key, data: detail_cache.invalidate(key))
+    # Catalog syncs only announce a new version, not the products they touched
+    bus.subscribe("catalog", lambda key, data: detail_cache.invalidate())
+
+    task_scheduler = build_scheduler(db)
+
+# Gauges read whichever services init_services bound last
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "mongo_pool_connections", "Pooled connections by workload and state", ["workload", "state"],
+    lambda: {(workload, state): stats[state] for workload, stats in databases.pool_stats().items()
+             for state in ("open", "checked_out")}
+))
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "counter_buffer_keys", "Distinct counters waiting for the next flush", [],
+    lambda: {(): len(counter_buffer)}
+))
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "detail_lookups", "Detail reads by outcome (cache hit, joined an in-flight query, database load)", ["outcome"],
+    lambda: {(outcome,): detail_cache.stats()[stat] for outcome, stat in (("hit", "hits"), ("shared", "shared"), ("load", "loads"))}
+))
+
+# Listings close by themselves after their stated duration, clamped to JOB_LISTING_MIN_DAYS..JOB_LISTING_MAX_DAYS
+JOB_LISTING_MIN_DAYS = float(os.environ.get("JOB_LISTING_MIN_DAYS", "14"))
+JOB_LISTING_MAX_DAYS = float(os.environ.get("JOB_LISTING_MAX_DAYS", "60"))
+# Guest carts untouched this long are purged (the lifetime of the cart_id cookie)
+GUEST_CART_DAYS = float(os.environ.get("GUEST_CART_DAYS", "30"))
+
 # Stripe Configuration
 STRIPE_API_KEY = os.environ.get("STRIPE_API_KEY")
 
-# Create the main app
-app = FastAPI(title="HDrywall Repair Platform API")
+def stripe_is_error(e: Exception) -> bool:
+    """
+    Network, 5xx and rate-limit errors count against the Stripe breaker; Stripe rejecting the
+    request (unknown session id, card errors - any other 4xx) means it is up and answering
+    """
+    # Checked by attribute: stripe is only imported by the lazily loaded checkout integration
+    status = getattr(e, "http_status", None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return type(e).__name__ not in ("InvalidRequestError", "CardError", "AuthenticationError", "PermissionError",
+                                    "IdempotencyError", "SignatureVerificationError")
+
+# Outbound calls get a timeout, a concurrency bulkhead, a circuit breaker and (if idempotent) jittered
+# retries per upstream; see resilience.py for UPSTREAM_*_OPTIONS
+upstreams = resilience.build_upstreams(
+    {
+        "emergent_auth": {"timeout": 5.0, "max_concurrent": 20},
+        # Checkout creation is not idempotent and is never retried; status polls are
+        "stripe": {"timeout": 10.0, "retries": 1, "max_concurrent": 30, "is_error": stripe_is_error},
+    },
+    on_event=lambda upstream, event: metrics.UPSTREAM_EVENTS.inc(upstream=upstream, event=event)
+)
+CIRCUIT_STATES = {resilience.CLOSED: 0, resilience.HALF_OPEN: 1, resilience.OPEN: 2}
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "upstream_circuit_state", "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)", ["upstream"],
+    lambda: {(name,): CIRCUIT_STATES[upstream.breaker.state] for name, upstream in upstreams.items()}
+))
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "upstream_in_flight", "Outbound calls currently holding a bulkhead slot", ["upstream"],
+    lambda: {(name,): upstream.in_flight for name, upstream in upstreams.items()}
+))
+
+# Staff/back-office API key (data exports, diagnostics); admin endpoints are disabled when unset
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY")
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # ================== MODELS ==================
 
-# Trade Codes Reference
-TRADE_CODES = {
-    "03": "Concrete",
-    "04": "Masonry",
-    "05": "Metals",
-    "06": "Wood, Plastics, Composites",
-    "07": "Thermal & Moisture Protection",
-    "08": "Openings (Doors/Windows)",
-    "09": "Finishes (Drywall/Paint)",
-    "10": "Specialties",
-    "22": "Plumbing",
-    "23": "HVAC",
-    "26": "Electrical",
-    "31": "Earthwork",
-    "32": "Exterior Improvements"
-}
+# Trade Codes Reference (bit positions for trade_mask live in trades.py)
+TRADE_CODES = trades.TRADE_CODES
 
 # Auth Models
 class UserRegister(BaseModel):
@@ -115,6 +252,34 @@ class JobResponse(BaseModel):
     experience_years: int
     status: str
     created_at: str
+    views: int = 0
+    impressions: int = 0
+    archived: bool = False
+
+# Saved Search Models
+class SavedSearchCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    trade_codes: List[str] = Field(default=[], max_length=alerts.MAX_TRADE_CODES)
+    states: List[str] = Field(default=[], max_length=alerts.MAX_LOCATIONS)
+    cities: List[str] = Field(default=[], max_length=alerts.MAX_LOCATIONS)
+    min_pay: Optional[float] = Field(default=None, ge=0)
+    pay_type: Optional[str] = Field(default=None, pattern="^(hourly|daily|project)$")
+    certifications: List[str] = []  # only match jobs requiring a subset of these
+    trade_match: str = Field(default="any", pattern="^(any|all)$")  # jobs with any / all of trade_codes
+
+class SavedSearchResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    search_id: str
+    name: str
+    trade_codes: List[str]
+    states: List[str]
+    cities: List[str]
+    min_pay: float
+    pay_type: Optional[str]
+    certifications: List[str]
+    trade_match: str = "any"
+    active: bool
+    created_at: str
 
 # Worker Profile Models
 class WorkerProfileCreate(BaseModel):
@@ -150,6 +315,9 @@ class WorkerProfileResponse(BaseModel):
     hourly_rate_max: Optional[float]
     status: str
     created_at: str
+    views: int = 0
+    impressions: int = 0
+    archived: bool = False
 
 # Product Models
 class ProductCreate(BaseModel):
@@ -175,6 +343,8 @@ class ProductResponse(BaseModel):
     sku: str
     active: bool
     created_at: str
+    views: int = 0
+    impressions: int = 0
 
 # Cart Models
 class CartItemAdd(BaseModel):
@@ -212,11 +382,14 @@ class CheckoutResponse(BaseModel):
 
 # ================== HELPERS ==================
 
-def create_token(user_id: str, email: str, user_type: str) -> str:
+# User fields carried in the token so bearer requests need no users lookup
+TOKEN_CLAIMS = ("user_id", "email", "name", "user_type", "picture", "created_at")
+
+def create_token(user: Dict, epoch: int) -> str:
+    """epoch must come from the database (epochs.load / epochs.bump), not this worker's copy"""
     payload = {
-        "user_id": user_id,
-        "email": email,
-        "user_type": user_type,
+        **{claim: user.get(claim) for claim in TOKEN_CLAIMS},
+        "tep": epoch,
         "exp": datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
     }
     return pyjwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
@@ -251,10 +424,32 @@ async def get_current_user(request: Request) -> Optional[Dict]:
         token = auth_header.split(" ")[1]
         payload = verify_token(token)
         if payload:
+            # Tokens issued before epochs existed count as epoch 0, so logout-all revokes them too
+            if not epochs.is_current(payload["user_id"], payload.get("tep", 0)):
+                return None
+            if "tep" in payload:
+                return {claim: payload.get(claim) for claim in TOKEN_CLAIMS}
+            # Tokens issued before claims were embedded
             user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0})
             return user
     return None
 
+def job_expires_at(created_at: str, duration: str) -> str:
+    return housekeeping.job_expires_at(created_at, duration, JOB_LISTING_MIN_DAYS, JOB_LISTING_MAX_DAYS)
+
+def new_job_doc(data: JobCreate, user: Dict, created_at: Optional[str] = None) -> Dict:
+    created_at = created_at or datetime.now(timezone.utc).isoformat()
+    return {
+        "job_id": f"job_{uuid.uuid4().hex[:12]}",
+        "contractor_id": user["user_id"],
+        "contractor_name": user["name"],
+        **data.model_dump(),
+        "trade_mask": trades.trade_mask(data.trade_codes),
+        "status": "active",
+        "created_at": created_at,
+        "expires_at": job_expires_at(created_at, data.duration)
+    }
+
 async def require_user(request: Request) -> Dict:
     user = await get_current_user(request)
     if not user:
@@ -273,6 +468,11 @@ async def require_subcontractor(request: Request) -> Dict:
         raise HTTPException(status_code=403, detail="Subcontractor access required")
     return user
 
+async def require_admin(request: Request):
+    key = request.headers.get("X-Admin-Key")
+    if not ADMIN_API_KEY or not key or not secrets.compare_digest(key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
 # ================== AUTH ROUTES ==================
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -296,7 +496,8 @@ async def register(data: UserRegister):
     }
     await db.users.insert_one(user_doc)
     
-    token = create_token(user_id, data.email, data.user_type)
+    # A brand-new user has never been revoked
+    token = create_token(user_doc, 0)
     user_response = UserResponse(
         user_id=user_id,
         email=data.email,
@@ -313,7 +514,7 @@ async def login(data: UserLogin):
     if not user or not pwd_context.verify(data.password, user.get("password_hash", "")):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = create_token(user["user_id"], user["email"], user["user_type"])
+    token = create_token(user, await epochs.load(user["user_id"]))
     user_response = UserResponse(
         user_id=user["user_id"],
         email=user["email"],
@@ -333,10 +534,15 @@ async def process_google_session(request: Request, response: Response):
         raise HTTPException(status_code=400, detail="session_id required")
     
     # Fetch user data from Emergent Auth
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-            headers={"X-Session-ID": session_id}
+    async with httpx.AsyncClient() as client, metrics.track_upstream("emergent_auth"), \
+            tracing.span("GET emergent oauth session-data", "http"):
+        resp = await upstreams["emergent_auth"].call(
+            lambda: client.get(
+                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+                headers={"X-Session-ID": session_id}
+            ),
+            idempotent=True,
+            is_failure=lambda r: r.status_code >= 500
         )
         if resp.status_code != 200:
             raise HTTPException(status_code=401, detail="Invalid session")
@@ -429,7 +635,18 @@ async def update_user_type(request: Request, body: dict):
     if new_type not in ["contractor", "subcontractor"]:
         raise HTTPException(status_code=400, detail="Invalid user type")
     await db.users.update_one({"user_id": user["user_id"]}, {"$set": {"user_type": new_type}})
-    return {"message": "User type updated", "user_type": new_type}
+    # Tokens carry user_type, so revoke the old ones and hand out a fresh token
+    epoch = await epochs.bump(user["user_id"])
+    token = create_token({**user, "user_type": new_type}, epoch)
+    return {"message": "User type updated", "user_type": new_type, "access_token": token}
+
+@api_router.post("/auth/logout-all")
+async def logout_all(request: Request, response: Response):
+    user = await require_user(request)
+    await epochs.bump(user["user_id"])
+    await db.user_sessions.delete_many({"user_id": user["user_id"]})
+    response.delete_cookie(key="session_token", path="/")
+    return {"message": "Logged out from all sessions"}
 
 # ================== JOBS ROUTES ==================
 
@@ -441,48 +658,134 @@ async def get_trade_codes():
 async def create_job(data: JobCreate, request: Request):
     user = await require_contractor(request)
     
-    job_id = f"job_{uuid.uuid4().hex[:12]}"
-    job_doc = {
-        "job_id": job_id,
-        "contractor_id": user["user_id"],
-        "contractor_name": user["name"],
-        **data.model_dump(),
-        "status": "active",
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+    job_doc = new_job_doc(data, user)
     await db.jobs.insert_one(job_doc)
     job_doc.pop("_id", None)
+    await rollups.record_job_change(db, new=job_doc)
+    await alert_engine.enqueue([job_doc["job_id"]])
     return JobResponse(**job_doc)
 
+# Bulk import: rows are validated and written in batches while the upload streams in
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+async def _insert_job_batch(docs: List[Dict], row_numbers: List[int], report: bulk_io.ImportReport):
+    failed = set()
+    try:
+        await db.jobs.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed.add(err["index"])
+            report.add_error(row_numbers[err["index"]], [{"field": None, "message": err.get("errmsg", "Write failed")}])
+    batch = rollups.RollupBatch()
+    for i, doc in enumerate(docs):
+        if i not in failed:
+            doc.pop("_id", None)
+            batch.add_job(doc)
+    report.inserted += len(docs) - len(failed)
+    await batch.flush(db)
+    await alert_engine.enqueue(doc["job_id"] for i, doc in enumerate(docs) if i not in failed)
+
+@api_router.post("/jobs/import")
+async def import_jobs(request: Request, format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")):
+    """Bulk-create jobs from a streamed CSV or NDJSON upload.
+
+    CSV needs a header row with JobCreate field names; list columns
+    (trade_codes, certifications_required) are separated by ; or |.
+    """
+    user = await require_contractor(request)
+    parser = bulk_io.PARSERS[format or bulk_io.detect_format(request.headers.get("content-type"))]
+    report = bulk_io.ImportReport(max_errors=IMPORT_MAX_REPORTED_ERRORS)
+
+    docs: List[Dict] = []
+    row_numbers: List[int] = []
+    in_flight = None
+    created_at = datetime.now(timezone.utc).isoformat()
+    async for row_number, record, error in parser(request.stream(), list_fields=("trade_codes", "certifications_required")):
+        report.rows += 1
+        if error:
+            report.add_error(row_number, [{"field": None, "message": error}])
+            continue
+        try:
+            data = JobCreate.model_validate(record)
+        except ValidationError as e:
+            report.add_error(row_number, bulk_io.validation_errors(e))
+            continue
+        docs.append(new_job_doc(data, user, created_at))
+        row_numbers.append(row_number)
+        if len(docs) >= IMPORT_BATCH_SIZE:
+            # Keep at most one batch writing while the next one is parsed
+            if in_flight:
+                await in_flight
+            in_flight = asyncio.ensure_future(_insert_job_batch(docs, row_numbers, report))
+            docs, row_numbers = [], []
+            created_at = datetime.now(timezone.utc).isoformat()
+    if in_flight:
+        await in_flight
+    if docs:
+        await _insert_job_batch(docs, row_numbers, report)
+    return report.as_dict()
+
+def trade_filter(trade_code: Optional[str], trade_codes: Optional[str], trade_match: str) -> Dict:
+    """Query on trade_mask for ?trade_code=09 and/or ?trade_codes=09,06&trade_match=any|all"""
+    codes = [code.strip() for code in [trade_code or "", *(trade_codes or "").split(",")] if code.strip()]
+    if not codes:
+        return {}
+    unknown = trades.unknown_codes(codes)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown trade codes: {', '.join(unknown)}")
+    return trades.mask_query(codes, trade_match)
+
 @api_router.get("/jobs", response_model=List[JobResponse])
 async def list_jobs(
     trade_code: Optional[str] = None,
+    trade_codes: Optional[str] = Query(None, description="Comma-separated trade codes"),
+    trade_match: str = Query("any", pattern="^(any|all)$"),
     state: Optional[str] = None,
     city: Optional[str] = None,
-    status: str = "active"
+    status: str = "active",
+    archived: bool = Query(False, description="Also search closed jobs moved to the archive")
 ):
-    query = {"status": status}
-    if trade_code:
-        query["trade_codes"] = trade_code
+    query = {"status": status, **trade_filter(trade_code, trade_codes, trade_match)}
     if state:
         query["state"] = {"$regex": state, "$options": "i"}
     if city:
         query["city"] = {"$regex": city, "$options": "i"}
     
-    jobs = await db.jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    if archived:
+        jobs = await archiver.find_with_archive(databases.reads(), "jobs", query, {"_id": 0})
+    else:
+        jobs = await databases.reads().jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    counter_buffer.incr_many("jobs", (job["job_id"] for job in jobs), "impressions")
     return [JobResponse(**job) for job in jobs]
 
+async def find_detail(kind: str, collection: str, id_field: str, doc_id: str) -> Optional[Dict]:
+    """
+    Point read through the detail cache, falling back to the archive collection;
+    callers inside their read-your-writes window read the primary
+    """
+    reads = databases.reads()
+
+    def load():
+        return archiver.find_one_with_archive(reads, collection, {id_field: doc_id}, {"_id": 0})
+
+    if database.primary_reads_required():
+        return await load()
+    return await detail_cache.get(f"{kind}:{doc_id}", load)
+
 @api_router.get("/jobs/{job_id}", response_model=JobResponse)
 async def get_job(job_id: str):
-    job = await db.jobs.find_one({"job_id": job_id}, {"_id": 0})
+    job = await find_detail("job", "jobs", "job_id", job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    counter_buffer.incr("jobs", job_id, "views")
     return JobResponse(**job)
 
 @api_router.get("/my-jobs", response_model=List[JobResponse])
 async def get_my_jobs(request: Request):
     user = await require_contractor(request)
-    jobs = await db.jobs.find({"contractor_id": user["user_id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    # Closed jobs move to the archive after a while; the owner still sees them, flagged archived
+    jobs = await archiver.find_with_archive(databases.reads(), "jobs", {"contractor_id": user["user_id"]}, {"_id": 0})
     return [JobResponse(**job) for job in jobs]
 
 @api_router.put("/jobs/{job_id}")
@@ -494,7 +797,16 @@ async def update_job(job_id: str, data: JobCreate, request: Request):
     if job["contractor_id"] != user["user_id"]:
         raise HTTPException(status_code=403, detail="Not your job listing")
     
-    await db.jobs.update_one({"job_id": job_id}, {"$set": data.model_dump()})
+    await db.jobs.update_one(
+        {"job_id": job_id},
+        {"$set": {
+            **data.model_dump(),
+            "trade_mask": trades.trade_mask(data.trade_codes),
+            "expires_at": job_expires_at(job["created_at"], data.duration)
+        }}
+    )
+    await rollups.record_job_change(db, old=job, new={**job, **data.model_dump()})
+    await bus.publish(f"job:{job_id}")
     return {"message": "Job updated"}
 
 @api_router.delete("/jobs/{job_id}")
@@ -506,9 +818,57 @@ async def delete_job(job_id: str, request: Request):
     if job["contractor_id"] != user["user_id"]:
         raise HTTPException(status_code=403, detail="Not your job listing")
     
-    await db.jobs.update_one({"job_id": job_id}, {"$set": {"status": "closed"}})
+    await db.jobs.update_one(
+        {"job_id": job_id},
+        {"$set": {"status": "closed", "closed_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    await bus.publish(f"job:{job_id}")
     return {"message": "Job closed"}
 
+# ================== SAVED SEARCHES & JOB ALERTS ==================
+
+MAX_SAVED_SEARCHES = 25
+
+@api_router.post("/saved-searches", response_model=SavedSearchResponse, status_code=201)
+async def create_saved_search(data: SavedSearchCreate, request: Request):
+    user = await require_subcontractor(request)
+    unknown = [code for code in data.trade_codes if code not in TRADE_CODES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown trade codes: {', '.join(unknown)}")
+    if await db.saved_searches.count_documents({"user_id": user["user_id"]}) >= MAX_SAVED_SEARCHES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SAVED_SEARCHES} saved searches allowed")
+
+    search_doc = alerts.new_search_doc(user["user_id"], **data.model_dump())
+    await db.saved_searches.insert_one(search_doc)
+    return SavedSearchResponse(**search_doc)
+
+@api_router.get("/saved-searches", response_model=List[SavedSearchResponse])
+async def list_saved_searches(request: Request):
+    user = await require_subcontractor(request)
+    searches = await db.saved_searches.find({"user_id": user["user_id"]}, {"_id": 0}).sort("created_at", -1).to_list(MAX_SAVED_SEARCHES)
+    return [SavedSearchResponse(**s) for s in searches]
+
+@api_router.put("/saved-searches/{search_id}/active", response_model=SavedSearchResponse)
+async def set_saved_search_active(search_id: str, request: Request, active: bool = Query(...)):
+    user = await require_subcontractor(request)
+    search = await db.saved_searches.find_one_and_update(
+        {"search_id": search_id, "user_id": user["user_id"]},
+        {"$set": {"active": active}},
+        projection={"_id": 0},
+        return_document=True
+    )
+    if not search:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    return SavedSearchResponse(**search)
+
+@api_router.delete("/saved-searches/{search_id}")
+async def delete_saved_search(search_id: str, request: Request):
+    user = await require_subcontractor(request)
+    result = await db.saved_searches.delete_one({"search_id": search_id, "user_id": user["user_id"]})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    return {"message": "Saved search deleted"}
+
 # ================== WORKER PROFILES ROUTES ==================
 
 @api_router.post("/profiles", response_model=WorkerProfileResponse, status_code=201)
@@ -520,29 +880,50 @@ async def create_profile(data: WorkerProfileCreate, request: Request):
     if existing:
         raise HTTPException(status_code=400, detail="Profile already exists")
     
+    # An archived (long inactive) profile is brought back with the new details instead of duplicated
+    updates = {
+        **data.model_dump(),
+        "trade_mask": trades.trade_mask(data.trade_codes),
+        "name": user["name"],
+        "status": "active",
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    archived = await archiver.restore(db, "worker_profiles", {"user_id": user["user_id"]}, updates)
+    if archived:
+        archived.pop("_id", None)
+        archived.pop("archived_at", None)
+        profile_doc = {**archived, **updates}
+        await rollups.record_profile_change(db, old=archived, new=profile_doc)
+        await bus.publish(f"profile:{profile_doc['profile_id']}")
+        return WorkerProfileResponse(**profile_doc)
+    
     profile_id = f"profile_{uuid.uuid4().hex[:12]}"
     profile_doc = {
         "profile_id": profile_id,
         "user_id": user["user_id"],
         "name": user["name"],
         **data.model_dump(),
+        "trade_mask": trades.trade_mask(data.trade_codes),
         "status": "active",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.worker_profiles.insert_one(profile_doc)
+    profile_doc.pop("_id", None)
+    await rollups.record_profile_change(db, new=profile_doc)
     return WorkerProfileResponse(**profile_doc)
 
 @api_router.get("/profiles", response_model=List[WorkerProfileResponse])
 async def list_profiles(
     trade_code: Optional[str] = None,
+    trade_codes: Optional[str] = Query(None, description="Comma-separated trade codes"),
+    trade_match: str = Query("any", pattern="^(any|all)$"),
     state: Optional[str] = None,
     city: Optional[str] = None,
     availability: Optional[str] = None,
-    status: str = "active"
+    status: str = "active",
+    archived: bool = Query(False, description="Also search inactive profiles moved to the archive")
 ):
-    query = {"status": status}
-    if trade_code:
-        query["trade_codes"] = trade_code
+    query = {"status": status, **trade_filter(trade_code, trade_codes, trade_match)}
     if state:
         query["state"] = {"$regex": state, "$options": "i"}
     if city:
@@ -550,29 +931,46 @@ async def list_profiles(
     if availability:
         query["availability"] = availability
     
-    profiles = await db.worker_profiles.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    if archived:
+        profiles = await archiver.find_with_archive(databases.reads(), "worker_profiles", query, {"_id": 0})
+    else:
+        profiles = await databases.reads().worker_profiles.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    counter_buffer.incr_many("worker_profiles", (p["profile_id"] for p in profiles), "impressions")
     return [WorkerProfileResponse(**p) for p in profiles]
 
 @api_router.get("/profiles/{profile_id}", response_model=WorkerProfileResponse)
 async def get_profile(profile_id: str):
-    profile = await db.worker_profiles.find_one({"profile_id": profile_id}, {"_id": 0})
+    profile = await find_detail("profile", "worker_profiles", "profile_id", profile_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
+    counter_buffer.incr("worker_profiles", profile_id, "views")
     return WorkerProfileResponse(**profile)
 
 @api_router.get("/my-profile")
 async def get_my_profile(request: Request):
     user = await require_subcontractor(request)
-    profile = await db.worker_profiles.find_one({"user_id": user["user_id"]}, {"_id": 0})
-    return profile
+    return await archiver.find_one_with_archive(databases.reads(), "worker_profiles", {"user_id": user["user_id"]}, {"_id": 0})
 
 @api_router.put("/profiles")
 async def update_profile(data: WorkerProfileCreate, request: Request):
     user = await require_subcontractor(request)
-    await db.worker_profiles.update_one(
-        {"user_id": user["user_id"]},
-        {"$set": {**data.model_dump(), "name": user["name"]}}
-    )
+    existing = await db.worker_profiles.find_one({"user_id": user["user_id"]}, {"_id": 0})
+    updates = {
+        **data.model_dump(),
+        "trade_mask": trades.trade_mask(data.trade_codes),
+        "name": user["name"],
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    result = await db.worker_profiles.update_one({"user_id": user["user_id"]}, {"$set": updates})
+    if result.matched_count == 0:
+        # Editing an archived profile brings it back to the live collection
+        existing = await archiver.restore(db, "worker_profiles", {"user_id": user["user_id"]}, updates)
+        if existing:
+            existing.pop("_id", None)
+            existing.pop("archived_at", None)
+    if existing:
+        await rollups.record_profile_change(db, old=existing, new={**existing, **updates})
+        await bus.publish(f"profile:{existing['profile_id']}")
     return {"message": "Profile updated"}
 
 # ================== PRODUCTS (E-COMMERCE) ROUTES ==================
@@ -582,20 +980,68 @@ async def list_products(category: Optional[str] = None, active: bool = True):
     query = {"active": active}
     if category:
         query["category"] = category
-    products = await db.products.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    products = await databases.reads().products.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    counter_buffer.incr_many("products", (p["product_id"] for p in products), "impressions")
     return [ProductResponse(**p) for p in products]
 
+@api_router.get("/products/search")
+async def search_products(
+    q: Optional[str] = Query(None, max_length=200),
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = False,
+    on_sale: bool = False,
+    sort: str = Query("newest", pattern="^(newest|price_asc|price_desc|popular|relevance)$"),
+    page: int = Query(1, ge=1, le=500),
+    limit: int = Query(24, ge=1, le=100)
+):
+    """Product search with per-category, price bucket and availability counts"""
+    result = await product_searcher.search(
+        databases.reads(), q=q, category=category, min_price=min_price, max_price=max_price,
+        in_stock=in_stock, on_sale=on_sale, sort=sort, skip=(page - 1) * limit, limit=limit
+    )
+    counter_buffer.incr_many("products", (p["product_id"] for p in result["items"]), "impressions")
+    return {
+        **result,
+        "items": [ProductResponse(**p) for p in result["items"]],
+        "page": page,
+        "limit": limit,
+    }
+
 @api_router.get("/products/{product_id}", response_model=ProductResponse)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"product_id": product_id}, {"_id": 0})
+    product = await find_detail("product", "products", "product_id", product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    counter_buffer.incr("products", product_id, "views")
     return ProductResponse(**product)
 
+@api_router.get("/products/{product_id}/recommendations", response_model=List[ProductResponse])
+async def get_product_recommendations(product_id: str, limit: int = Query(8, ge=1, le=20)):
+    """Frequently bought together, from the latest batch build (recommendations.py)"""
+    key = f"{product_id}:{limit}"
+    cached = recommendation_cache.get(key)
+    if cached is None:
+        reads = databases.reads()
+        ids = [neighbour for neighbour, _ in await recommendations.get_neighbours(reads, product_id, limit)]
+        products = {}
+        if ids:
+            products = {p["product_id"]: p async for p in reads.products.find({"product_id": {"$in": ids}, "active": True}, {"_id": 0})}
+        cached = [ProductResponse(**products[neighbour]) for neighbour in ids if neighbour in products]
+        recommendation_cache.set(key, cached)
+    return cached
+
 @api_router.get("/product-categories")
 async def get_product_categories():
-    categories = await db.products.distinct("category")
-    return categories
+    # Served from the cached search facets instead of a distinct over the whole collection
+    result = await product_searcher.search(databases.reads(), limit=1)
+    return sorted(c["value"] for c in result["facets"]["categories"])
+
+async def publish_catalog_change(product_id: str):
+    version = await catalog.bump_catalog_version(db)
+    await bus.publish(f"product:{product_id}")
+    await bus.publish("catalog", {"version": version})
 
 @api_router.post("/products", response_model=ProductResponse)
 async def create_product(data: ProductCreate, request: Request):
@@ -604,19 +1050,43 @@ async def create_product(data: ProductCreate, request: Request):
     product_doc = {
         "product_id": product_id,
         **data.model_dump(),
+        "content_hash": catalog.content_hash(data.model_dump()),
         "active": True,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.products.insert_one(product_doc)
+    await publish_catalog_change(product_id)
     return ProductResponse(**product_doc)
 
 @api_router.put("/products/{product_id}")
 async def update_product(product_id: str, data: ProductCreate, request: Request):
-    await db.products.update_one({"product_id": product_id}, {"$set": data.model_dump()})
+    fields = data.model_dump()
+    await db.products.update_one(
+        {"product_id": product_id},
+        {"$set": {**fields, "content_hash": catalog.content_hash(fields), "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    await publish_catalog_change(product_id)
     return {"message": "Product updated"}
 
 # ================== CART ROUTES ==================
 
+def price_cart_items(items: List[Dict], products_map: Dict[str, Dict]) -> Tuple[List[CartItemResponse], float]:
+    """Line items and unrounded subtotal; items whose product no longer exists are skipped"""
+    lines = []
+    subtotal = 0.0
+    for item in items:
+        product = products_map.get(item["product_id"])
+        if product:
+            lines.append(CartItemResponse(
+                product_id=item["product_id"],
+                name=product["name"],
+                price=product["price"],
+                quantity=item["quantity"],
+                image_url=product["image_url"]
+            ))
+            subtotal += product["price"] * item["quantity"]
+    return lines, subtotal
+
 @api_router.get("/cart", response_model=CartResponse)
 async def get_cart(request: Request):
     user = await get_current_user(request)
@@ -634,20 +1104,7 @@ async def get_cart(request: Request):
     products = await db.products.find({"product_id": {"$in": product_ids}}, {"_id": 0}).to_list(None)
     products_map = {p["product_id"]: p for p in products}
     
-    items = []
-    subtotal = 0.0
-    for item in cart.get("items", []):
-        product = products_map.get(item["product_id"])
-        if product:
-            items.append(CartItemResponse(
-                product_id=item["product_id"],
-                name=product["name"],
-                price=product["price"],
-                quantity=item["quantity"],
-                image_url=product["image_url"]
-            ))
-            subtotal += product["price"] * item["quantity"]
-    
+    items, subtotal = price_cart_items(cart.get("items", []), products_map)
     return CartResponse(items=items, subtotal=round(subtotal, 2), item_count=sum(i.quantity for i in items))
 
 @api_router.post("/cart/add")
@@ -666,19 +1123,20 @@ async def add_to_cart(data: CartItemAdd, request: Request, response: Response):
     cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0})
     if not cart:
         cart = {"user_id": user_id, "items": []}
-        await db.carts.insert_one(cart)
+        await db.carts.insert_one({**cart, "updated_at": datetime.now(timezone.utc).isoformat()})
     
     # Check if item exists
     existing = next((i for i in cart["items"] if i["product_id"] == data.product_id), None)
     if existing:
         await db.carts.update_one(
             {"user_id": user_id, "items.product_id": data.product_id},
-            {"$inc": {"items.$.quantity": data.quantity}}
+            {"$inc": {"items.$.quantity": data.quantity}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
         )
     else:
         await db.carts.update_one(
             {"user_id": user_id},
-            {"$push": {"items": {"product_id": data.product_id, "quantity": data.quantity}}}
+            {"$push": {"items": {"product_id": data.product_id, "quantity": data.quantity}},
+             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
         )
     
     return {"message": "Added to cart"}
@@ -695,12 +1153,13 @@ async def update_cart_item(data: CartItemAdd, request: Request):
     if data.quantity <= 0:
         await db.carts.update_one(
             {"user_id": user_id},
-            {"$pull": {"items": {"product_id": data.product_id}}}
+            {"$pull": {"items": {"product_id": data.product_id}},
+             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
         )
     else:
         await db.carts.update_one(
             {"user_id": user_id, "items.product_id": data.product_id},
-            {"$set": {"items.$.quantity": data.quantity}}
+            {"$set": {"items.$.quantity": data.quantity, "updated_at": datetime.now(timezone.utc).isoformat()}}
         )
     return {"message": "Cart updated"}
 
@@ -715,7 +1174,7 @@ async def remove_from_cart(product_id: str, request: Request):
     
     await db.carts.update_one(
         {"user_id": user_id},
-        {"$pull": {"items": {"product_id": product_id}}}
+        {"$pull": {"items": {"product_id": product_id}}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     return {"message": "Removed from cart"}
 
@@ -751,12 +1210,7 @@ async def create_checkout_session(data: CheckoutRequest, request: Request):
     products = await db.products.find({"product_id": {"$in": product_ids}}, {"_id": 0}).to_list(None)
     products_map = {p["product_id"]: p for p in products}
     
-    # Calculate total
-    total = 0.0
-    for item in cart["items"]:
-        product = products_map.get(item["product_id"])
-        if product:
-            total += product["price"] * item["quantity"]
+    lines, total = price_cart_items(cart["items"], products_map)
     
     if total <= 0:
         raise HTTPException(status_code=400, detail="Invalid cart total")
@@ -778,7 +1232,8 @@ async def create_checkout_session(data: CheckoutRequest, request: Request):
         metadata={"user_id": user_id, "cart_total": str(total)}
     )
     
-    session = await stripe_checkout.create_checkout_session(checkout_request)
+    async with metrics.track_upstream("stripe"), tracing.span("stripe.create_checkout_session", "stripe"):
+        session = await upstreams["stripe"].call(lambda: stripe_checkout.create_checkout_session(checkout_request))
     
     # Create payment transaction
     await db.payment_transactions.insert_one({
@@ -787,6 +1242,8 @@ async def create_checkout_session(data: CheckoutRequest, request: Request):
         "user_id": user_id,
         "amount": total,
         "currency": "usd",
+        # Priced line items at checkout time; copied onto the order once paid
+        "items": [line.model_dump(exclude={"image_url"}) for line in lines],
         "status": "pending",
         "payment_status": "initiated",
         "created_at": datetime.now(timezone.utc).isoformat()
@@ -794,15 +1251,45 @@ async def create_checkout_session(data: CheckoutRequest, request: Request):
     
     return CheckoutResponse(url=session.url, session_id=session.session_id)
 
+async def record_paid_order(session_id: str):
+    """Create the order for a paid session exactly once and clear the buyer's cart"""
+    txn = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+    if not txn:
+        return
+    result = await db.orders.update_one(
+        {"session_id": session_id},
+        {"$setOnInsert": {
+            "order_id": f"order_{uuid.uuid4().hex[:12]}",
+            "user_id": txn["user_id"],
+            "session_id": session_id,
+            "amount": txn["amount"],
+            "items": txn.get("items", []),
+            "status": "paid",
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+    if result.upserted_id is None:
+        return
+    if txn.get("type") == "market_data_subscription":
+        await grant_market_data_access(txn["user_id"], txn["tier_id"])
+    else:
+        await db.carts.delete_one({"user_id": txn["user_id"]})
+
 @api_router.get("/checkout/status/{session_id}")
 async def get_checkout_status(session_id: str, request: Request):
+    # Only sessions this platform created are looked up at Stripe
+    if not await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Checkout session not found")
+    
     from emergentintegrations.payments.stripe.checkout import StripeCheckout
     
     host_url = str(request.base_url).rstrip("/")
     webhook_url = f"{host_url}/api/webhook/stripe"
     stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
     
-    status = await stripe_checkout.get_checkout_status(session_id)
+    async with metrics.track_upstream("stripe"), tracing.span("stripe.get_checkout_status", "stripe"):
+        status = await upstreams["stripe"].call(lambda: stripe_checkout.get_checkout_status(session_id), idempotent=True)
     
     # Update transaction
     await db.payment_transactions.update_one(
@@ -810,21 +1297,9 @@ async def get_checkout_status(session_id: str, request: Request):
         {"$set": {"status": status.status, "payment_status": status.payment_status}}
     )
     
-    # If paid, clear cart
+    # If paid, create the order (repeated status polls and the webhook create it only once)
     if status.payment_status == "paid":
-        txn = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
-        if txn:
-            await db.carts.delete_one({"user_id": txn["user_id"]})
-            # Create order
-            cart = await db.carts.find_one({"user_id": txn["user_id"]}, {"_id": 0})
-            await db.orders.insert_one({
-                "order_id": f"order_{uuid.uuid4().hex[:12]}",
-                "user_id": txn["user_id"],
-                "session_id": session_id,
-                "amount": txn["amount"],
-                "status": "paid",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
+        await record_paid_order(session_id)
     
     return {
         "status": status.status,
@@ -845,12 +1320,14 @@ async def stripe_webhook(request: Request):
     stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
     
     try:
-        event = await stripe_checkout.handle_webhook(body, signature)
+        async with metrics.track_upstream("stripe_webhook"), tracing.span("stripe.handle_webhook", "stripe"):
+            event = await stripe_checkout.handle_webhook(body, signature)
         if event.payment_status == "paid":
             await db.payment_transactions.update_one(
                 {"session_id": event.session_id},
                 {"$set": {"status": "complete", "payment_status": "paid"}}
             )
+            await record_paid_order(event.session_id)
     except Exception as e:
         logging.error(f"Webhook error: {e}")
     
@@ -905,10 +1382,97 @@ MARKET_DATA_TIERS = [
     }
 ]
 
+BILLING_PERIOD_DAYS = {"monthly": 30, "yearly": 365}
+
+async def grant_market_data_access(user_id: str, tier_id: str):
+    """
+    Extend the user's access to a tier by one billing period.
+    Checkout is a one-off payment, so each paid session buys one period; renewing early
+    adds the period to the current one instead of restarting it.
+    """
+    tier = next(t for t in MARKET_DATA_TIERS if t["tier_id"] == tier_id)
+    now = datetime.now(timezone.utc)
+    current = await db.market_data_subscriptions.find_one(
+        {"user_id": user_id, "tier_id": tier_id}, {"_id": 0, "expires_at": 1})
+    start = max(now, datetime.fromisoformat(current["expires_at"])) if current else now
+    await db.market_data_subscriptions.update_one(
+        {"user_id": user_id, "tier_id": tier_id},
+        {"$set": {
+            "expires_at": (start + timedelta(days=BILLING_PERIOD_DAYS[tier["billing_period"]])).isoformat(),
+            "updated_at": now.isoformat()
+        }, "$setOnInsert": {"created_at": now.isoformat()}},
+        upsert=True
+    )
+
+async def has_market_data_access(user_id: str, tier_ids: Iterable[str]) -> bool:
+    """Whether the user has an unexpired subscription to any of `tier_ids`"""
+    tiers = [t for t in MARKET_DATA_TIERS if t["tier_id"] in set(tier_ids)]
+    now = datetime.now(timezone.utc)
+    subscription = await db.market_data_subscriptions.find_one(
+        {"user_id": user_id, "tier_id": {"$in": [t["tier_id"] for t in tiers]}, "expires_at": {"$gt": now.isoformat()}},
+        {"_id": 1}
+    )
+    if subscription:
+        return True
+    # Payments made before market_data_subscriptions existed count for the period they bought
+    txn = await db.payment_transactions.find_one(
+        {"user_id": user_id, "type": "market_data_subscription", "payment_status": "paid", "$or": [
+            {"tier_id": t["tier_id"],
+             "created_at": {"$gt": (now - timedelta(days=BILLING_PERIOD_DAYS[t["billing_period"]])).isoformat()}}
+            for t in tiers
+        ]},
+        {"_id": 1}
+    )
+    return txn is not None
+
+async def require_market_data_access(request: Request):
+    """Rollup endpoints are the product of the paid tiers: any active subscription, or the admin key"""
+    if request.headers.get("X-Admin-Key"):
+        await require_admin(request)
+        return
+    user = await require_user(request)
+    if not await has_market_data_access(user["user_id"], [t["tier_id"] for t in MARKET_DATA_TIERS]):
+        raise HTTPException(status_code=403, detail="Market data subscription required")
+
 @api_router.get("/market-data/tiers", response_model=List[TierResponse])
 async def get_market_data_tiers():
     return [TierResponse(**tier) for tier in MARKET_DATA_TIERS]
 
+# Labor market rollups - served from pre-aggregated labor_rollups documents only
+
+@api_router.get("/market-data/trends")
+async def get_market_trends(
+    request: Request,
+    trade_code: Optional[str] = None,
+    state: Optional[str] = None,
+    weeks: int = Query(12, ge=1, le=104)
+):
+    await require_market_data_access(request)
+    docs = await rollups.fetch_rollups(databases.reads(), trade_code, state, weeks)
+    return {"trade_code": trade_code, "state": state, "series": rollups.trend_series(docs)}
+
+@api_router.get("/market-data/wages")
+async def get_wage_analytics(
+    request: Request,
+    trade_code: Optional[str] = None,
+    state: Optional[str] = None,
+    weeks: int = Query(12, ge=1, le=104)
+):
+    await require_market_data_access(request)
+    docs = await rollups.fetch_rollups(databases.reads(), trade_code, state, weeks)
+    return {"trade_code": trade_code, "state": state, "weeks": weeks, **rollups.wage_summary(docs)}
+
+@api_router.get("/market-data/supply")
+async def get_worker_supply(
+    request: Request,
+    trade_code: Optional[str] = None,
+    state: Optional[str] = None,
+    weeks: int = Query(12, ge=1, le=104)
+):
+    await require_market_data_access(request)
+    docs = await rollups.fetch_rollups(databases.reads(), trade_code, state, weeks)
+    return {"trade_code": trade_code, "state": state, "weeks": weeks, **rollups.supply_summary(docs)}
+
 @api_router.post("/market-data/subscribe")
 async def subscribe_to_tier(request: Request, body: dict):
     from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionRequest
@@ -938,7 +1502,8 @@ async def subscribe_to_tier(request: Request, body: dict):
         metadata={"user_id": user_id, "tier_id": tier_id, "type": "market_data_subscription"}
     )
     
-    session = await stripe_checkout.create_checkout_session(checkout_request)
+    async with metrics.track_upstream("stripe"), tracing.span("stripe.create_checkout_session", "stripe"):
+        session = await upstreams["stripe"].call(lambda: stripe_checkout.create_checkout_session(checkout_request))
     
     await db.payment_transactions.insert_one({
         "transaction_id": f"txn_{uuid.uuid4().hex[:12]}",
@@ -955,6 +1520,155 @@ async def subscribe_to_tier(request: Request, body: dict):
     
     return {"url": session.url, "session_id": session.session_id}
 
+# ================== DATA EXPORT ==================
+
+EXPORT_BATCH_SIZE = 1000
+
+# Exportable datasets: allowed columns, equality filters (query param -> field), whether
+# trade_code / trade_codes / trade_match filter on trade_mask as in the listings,
+# and whether Enterprise subscribers may use them (otherwise admin key only)
+EXPORTS = {
+    "jobs": {
+        "collection": "jobs",
+        "fields": ["job_id", "contractor_id", "contractor_name", "title", "description", "trade_codes",
+                   "location", "city", "state", "pay_rate", "pay_type", "duration",
+                   "certifications_required", "experience_years", "status", "created_at"],
+        "filters": {"status": "status", "state": "state", "city": "city"},
+        "trades": True,
+        "enterprise": True,
+    },
+    "profiles": {
+        "collection": "worker_profiles",
+        "fields": ["profile_id", "name", "headline", "trade_codes", "skills", "experience_years",
+                   "certifications", "location", "city", "state", "availability",
+                   "hourly_rate_min", "hourly_rate_max", "status", "created_at"],
+        "filters": {"status": "status", "state": "state", "city": "city", "availability": "availability"},
+        "trades": True,
+        "enterprise": True,
+    },
+    "orders": {
+        "collection": "orders",
+        "fields": ["order_id", "user_id", "session_id", "amount", "items", "status", "created_at"],
+        "filters": {"status": "status", "user_id": "user_id"},
+        "enterprise": False,
+    },
+    "transactions": {
+        "collection": "payment_transactions",
+        "fields": ["transaction_id", "session_id", "user_id", "amount", "currency", "type", "tier_id",
+                   "status", "payment_status", "created_at"],
+        "filters": {"status": "status", "payment_status": "payment_status", "type": "type", "user_id": "user_id"},
+        "enterprise": False,
+    },
+}
+
+async def has_enterprise_access(user: Dict) -> bool:
+    return await has_market_data_access(user["user_id"], ["enterprise"])
+
+@api_router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    fields: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    gzip: bool = False,
+    archived: bool = False
+):
+    """
+    Stream a dataset as CSV/NDJSON; other query params matching the dataset's filters are applied in MongoDB.
+    With archived=true, archived documents follow the live ones.
+    """
+    spec = EXPORTS.get(dataset)
+    if not spec:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    if request.headers.get("X-Admin-Key") or not spec["enterprise"]:
+        await require_admin(request)
+    else:
+        user = await require_user(request)
+        if not await has_enterprise_access(user):
+            raise HTTPException(status_code=403, detail="Enterprise subscription required")
+
+    columns = spec["fields"]
+    if fields:
+        columns = [f for f in fields.split(",") if f in spec["fields"]]
+        if not columns:
+            raise HTTPException(status_code=400, detail="No valid fields requested")
+
+    query: Dict[str, Any] = {}
+    for param, field in spec["filters"].items():
+        value = request.query_params.get(param)
+        if value is not None:
+            query[field] = value
+    if spec.get("trades"):
+        params = request.query_params
+        trade_match = params.get("trade_match", trades.MATCH_ANY)
+        if trade_match not in (trades.MATCH_ANY, trades.MATCH_ALL):
+            raise HTTPException(status_code=400, detail="trade_match must be any or all")
+        query.update(trade_filter(params.get("trade_code"), params.get("trade_codes"), trade_match))
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = since
+        if until:
+            query["created_at"]["$lt"] = until
+
+    projection = {"_id": 0, **{f: 1 for f in columns}}
+    collections = [spec["collection"]]
+    if archived and spec["collection"] in archiver.POLICIES:
+        collections.append(archiver.archive_name(spec["collection"]))
+    cursor = bulk_io.chain_cursors(*(
+        databases.background[name].find(query, projection, batch_size=EXPORT_BATCH_SIZE) for name in collections
+    ))
+
+    filename = f"{dataset}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        bulk_io.stream_export(cursor, columns, format, compress=gzip, batch_size=EXPORT_BATCH_SIZE),
+        media_type="application/gzip" if gzip else bulk_io.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# ================== ADMIN ==================
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    request: Request,
+    min_ms: float = 0,
+    sort: str = Query("total_ms", pattern="^(total_ms|max_ms|avg_ms|count|slow_count)$"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    await require_admin(request)
+    return {
+        "threshold_ms": slow_queries.threshold_ms,
+        "shapes": slow_queries.report(min_ms=min_ms, sort=sort, limit=limit)
+    }
+
+@api_router.delete("/admin/slow-queries")
+async def reset_slow_queries(request: Request):
+    await require_admin(request)
+    slow_queries.reset()
+    return {"message": "Slow query stats reset"}
+
+@api_router.get("/admin/startup")
+async def get_startup_report(request: Request):
+    await require_admin(request)
+    return request.app.state.startup_report
+
+@api_router.get("/admin/db-pools")
+async def get_db_pools(request: Request):
+    await require_admin(request)
+    return {"pools": databases.pool_stats()}
+
+@api_router.get("/admin/upstreams")
+async def get_upstreams(request: Request):
+    await require_admin(request)
+    return {"upstreams": {name: upstream.snapshot() for name, upstream in upstreams.items()}}
+
+@api_router.get("/admin/scheduler")
+async def get_scheduler(request: Request):
+    await require_admin(request)
+    return {"owner": task_scheduler.owner, "enabled": SCHEDULER_ENABLED, "tasks": await task_scheduler.status()}
+
 # ================== HEALTH CHECK ==================
 
 @api_router.get("/")
@@ -965,16 +1679,25 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
-# Include the router
-app.include_router(api_router)
+async def upstream_unavailable(request: Request, exc: resilience.UpstreamUnavailable):
+    # A degraded dependency fails fast; clients may retry once the circuit could close again
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.upstream} is temporarily unavailable ({exc.reason})"},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def get_metrics():
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
+# Rate limiting - per user for valid bearer tokens, otherwise per client IP
+def rate_limit_principal(headers: Dict[str, str]) -> Optional[str]:
+    auth_header = headers.get("authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        payload = verify_token(auth_header.split(" ")[1])
+        if payload:
+            return payload["user_id"]
+    return None
 
 # Configure logging
 logging.basicConfig(
@@ -983,6 +1706,152 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+# ================== STARTUP ==================
+
+# Integrations are loaded while the instance is not yet ready, never by the first request that needs them
+prewarm = coldstart.Prewarmer()
+
+@prewarm.register("stripe")
+def prewarm_stripe():
+    from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionRequest  # noqa: F401
+
+@prewarm.register("bcrypt")
+def prewarm_bcrypt():
+    # Loads and self-tests the bcrypt backend, which the first login would otherwise pay for
+    pwd_context.handler().get_backend()
+
+@prewarm.register("mongo")
+async def prewarm_mongo():
+    # One connection per workload pool before traffic arrives
+    await asyncio.gather(*(target.command("ping") for target in (databases.write, databases.reads(), databases.background)))
+
+# ================== SCHEDULED TASKS ==================
+
+# Each task runs on one instance at a time, on a lease in MongoDB; SCHEDULER_ENABLED=false opts an instance out
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() not in ("0", "false", "no")
+
+async def expire_jobs_task():
+    async def invalidate(job_ids: List[str]):
+        for job_id in job_ids:
+            await bus.publish(f"job:{job_id}")
+
+    closed = await housekeeping.expire_jobs(databases.background, JOB_LISTING_MAX_DAYS, on_closed=invalidate)
+    return {"closed": closed}
+
+async def purge_sessions_task():
+    return {"deleted": await housekeeping.purge_sessions(databases.background)}
+
+async def purge_guest_carts_task():
+    return {"deleted": await housekeeping.purge_guest_carts(databases.background, GUEST_CART_DAYS)}
+
+async def refresh_rollups_task():
+    # Repairs drift in the current and previous week; older weeks only change through backfills.
+    # The repair is applied as $inc deltas, so increments from live writes during the run are kept
+    return {"rollups": await rollups.rebuild_rollups(databases.background, weeks=2)}
+
+async def backfill_trade_masks_task():
+    # Documents written before trade_mask existed are invisible to trade filters until this runs
+    return await trades.backfill(databases.background)
+
+def build_scheduler(db) -> scheduler.Scheduler:
+    task_scheduler = scheduler.Scheduler(
+        db,
+        tick=float(os.environ.get("SCHEDULER_TICK_SECONDS", "5")),
+        on_finish=lambda task, status, seconds: metrics.SCHEDULED_TASK_DURATION.observe(seconds, task=task, status=status)
+    )
+    task_scheduler.register("expire_jobs", interval=15 * 60)(expire_jobs_task)
+    task_scheduler.register("purge_sessions", interval=60 * 60)(purge_sessions_task)
+    task_scheduler.register("purge_guest_carts", interval=6 * 60 * 60)(purge_guest_carts_task)
+    task_scheduler.register("refresh_rollups", interval=60 * 60, lease=600)(refresh_rollups_task)
+    task_scheduler.register("backfill_trade_masks", interval=24 * 60 * 60, lease=600)(backfill_trade_masks_task)
+    return task_scheduler
+
+async def create_indexes(app: FastAPI):
+    await rollups.ensure_indexes(db)
+    await archiver.ensure_indexes(db)
+    await trades.ensure_indexes(db)
+    await housekeeping.ensure_indexes(db)
+    await catalog.ensure_indexes(db)
+    await product_search.ensure_indexes(db)
+    await epochs.ensure_indexes()
+    await alert_engine.ensure_indexes()
+    await bus.ensure_collection()
+    await db.market_data_subscriptions.create_index([("user_id", 1), ("tier_id", 1)], unique=True)
+    await app.state.rate_limit_buckets.ensure_indexes()
+
+async def start_background_tasks(app: FastAPI) -> List[asyncio.Task]:
+    slow_queries.attach(client)
+    await epochs.refresh()
+    background_tasks = [
+        asyncio.create_task(epochs.run()),
+        asyncio.create_task(bus.run()),
+        asyncio.create_task(alert_engine.run()),
+        asyncio.create_task(counter_buffer.run()),
+        asyncio.create_task(metrics.monitor_event_loop_lag()),
+    ]
+    if app.state.trace_exporter:
+        background_tasks.append(asyncio.create_task(app.state.trace_exporter.run()))
+    if SCHEDULER_ENABLED:
+        background_tasks.append(asyncio.create_task(task_scheduler.run()))
+    return background_tasks
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await prewarm.run()
+    await create_indexes(app)
+    background_tasks = await start_background_tasks(app)
+    app.state.startup_report = coldstart.startup_report(
+        import_timer, prewarm, time.perf_counter() - import_timer.started_at)
+    logger.info(coldstart.format_report(app.state.startup_report))
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await task_scheduler.stop()
+        await counter_buffer.flush()
+        databases.close()
+
+def create_app(dbs: Optional[database.Databases] = None) -> FastAPI:
+    """
+    Build the ASGI app and its services around `dbs` (by default the MongoDB at MONGO_URL);
+    serve with `uvicorn server:app` or `uvicorn server:create_app --factory`
+    """
+    init_services(dbs or connect_databases())
+    app = FastAPI(title="HDrywall Repair Platform API", lifespan=lifespan)
+    app.include_router(api_router)
+    app.add_api_route("/metrics", get_metrics, include_in_schema=False)
+    app.add_exception_handler(resilience.UpstreamUnavailable, upstream_unavailable)
+
+    app.state.rate_limit_buckets = ratelimit.build_buckets(db)
+    app.add_middleware(
+        ratelimit.RateLimitMiddleware,
+        buckets=app.state.rate_limit_buckets,
+        limits=ratelimit.parse_limits(os.environ.get("RATE_LIMITS")),
+        principal=rate_limit_principal,
+        trusted_proxy_hops=int(os.environ.get("TRUSTED_PROXY_HOPS", "0"))
+    )
+
+    # Read-your-writes - browse reads go to the primary for a short window after the caller's own write
+    app.add_middleware(
+        database.ReadYourWritesMiddleware,
+        window=float(os.environ.get("READ_YOUR_WRITES_SECONDS", "10")),
+        principal=rate_limit_principal
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    # Request tracing - X-Request-ID / Server-Timing on every response, optional OTLP export
+    app.state.trace_exporter = tracing.build_exporter()
+    app.add_middleware(tracing.TracingMiddleware, exporter=app.state.trace_exporter)
+    return app
+
+app = create_app()
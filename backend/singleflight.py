@@ -0,0 +1,93 @@
+"""
+Request coalescing for hot point reads.
+
+SingleFlight lets concurrent callers asking for the same key share one
+in-flight load: the first caller starts it, everyone arriving before it
+finishes awaits the same result (or exception). A caller that goes away
+(client disconnect) does not cancel the load for the others.
+
+CoalescingCache puts a short-lived LocalCache in front of it, so a spike on
+one popular document costs one query per TTL window per process instead of
+one per request. invalidate() drops the cached entry and detaches any load
+already in flight, and a load that was running while an invalidation
+happened is returned to its callers but not cached.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cache_bus import LocalCache
+
+_MISSING = object()
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.loads = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _done(self, key: str, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Mark the outcome as retrieved even if every waiter was cancelled
+        if not flight.cancelled():
+            flight.exception()
+
+    async def do(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(load())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda f: self._done(key, f))
+            self.loads += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(flight)
+
+    def forget(self, key: Optional[str] = None):
+        """Later callers start a new load instead of joining the current one"""
+        if key is None:
+            self._flights.clear()
+        else:
+            self._flights.pop(key, None)
+
+class CoalescingCache:
+    def __init__(self, ttl: float = 1.0, maxsize: int = 10_000):
+        # ttl 0 keeps only the coalescing of concurrent reads
+        self.cache = LocalCache(ttl, maxsize) if ttl > 0 else None
+        self.flights = SingleFlight()
+        self._generation = 0
+
+    async def get(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        if self.cache is not None:
+            hit = self.cache.get(key, _MISSING)
+            if hit is not _MISSING:
+                return hit
+        # Taken now, not when the load task first runs, so an invalidation in between still counts
+        generation = self._generation
+        return await self.flights.do(key, lambda: self._load(key, load, generation))
+
+    async def _load(self, key: str, load: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        value = await load()
+        if self.cache is not None and generation == self._generation:
+            self.cache.set(key, value)
+        return value
+
+    def invalidate(self, key: Optional[str] = None):
+        self._generation += 1
+        if self.cache is not None:
+            self.cache.invalidate(key)
+        self.flights.forget(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached": len(self.cache) if self.cache is not None else 0,
+            "hits": self.cache.hits if self.cache is not None else 0,
+            "loads": self.flights.loads,
+            "shared": self.flights.shared,
+            "in_flight": len(self.flights),
+        }
+
@@ -0,0 +1,169 @@
+"""
+Slow-query log with query-shape fingerprinting.
+
+A pymongo CommandListener normalizes every query filter to its shape (field
+names and operators, never values) and aggregates count / total / max time per
+shape. Shapes slower than the threshold are logged once per cooldown together
+with their explain() plan.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Where each command keeps the filter that determines its shape
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+OTHER_SHAPE = "<other>"
+
+def shape(value: Any) -> Any:
+    """Replace values with "?" while keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: shape(val) for key, val in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            item_shape = shape(item)
+            if item_shape not in shapes:
+                shapes.append(item_shape)
+        return shapes
+    return "?"
+
+def query_filter(command_name: str, command: Dict) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Extract (filter, sort) from a command document"""
+    if command_name in _FILTER_FIELDS:
+        return command.get(_FILTER_FIELDS[command_name]) or {}, command.get("sort")
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        match = pipeline[0].get("$match", {}) if pipeline else {}
+        sort = next((stage["$sort"] for stage in pipeline if "$sort" in stage), None)
+        return match, sort
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or []
+        return (statements[0].get("q", {}) if statements else {}), None
+    return None, None
+
+def fingerprint(collection: str, command_name: str, filter_doc: Dict, sort: Optional[Dict] = None) -> str:
+    key = f"{collection}.{command_name} {json.dumps(shape(filter_doc), sort_keys=True)}"
+    if sort:
+        key += f" sort={json.dumps(list(sort.keys()) if isinstance(sort, dict) else sort)}"
+    return key
+
+def _winning_plan_stages(explain: Dict) -> List[str]:
+    plan = (explain.get("queryPlanner") or {}).get("winningPlan") or {}
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?") + (f"({plan['indexName']})" if plan.get("indexName") else ""))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = 100.0, max_shapes: int = 1000, explain_cooldown: float = 300.0):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self.explain_cooldown = explain_cooldown
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[int, object], Tuple[str, str, Dict]] = {}
+        self._shapes: Dict[str, Dict[str, Any]] = {}
+        self._explained_at: Dict[str, float] = {}
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, client, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Enable explain() of slow shapes; call from the running event loop at startup"""
+        self._client = client
+        self._loop = loop or asyncio.get_running_loop()
+
+    def started(self, event):
+        filter_doc, sort = query_filter(event.command_name, event.command)
+        if filter_doc is None:
+            return
+        collection = event.command.get(event.command_name)
+        key = fingerprint(str(collection), event.command_name, filter_doc, sort)
+        self._pending[(event.request_id, event.connection_id)] = (key, event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending is None:
+            return
+        key, database_name, command = pending
+        elapsed_ms = event.duration_micros / 1000
+        slow = elapsed_ms >= self.threshold_ms
+        with self._lock:
+            if key not in self._shapes and len(self._shapes) >= self.max_shapes:
+                key = OTHER_SHAPE
+            stats = self._shapes.setdefault(key, {"count": 0, "slow_count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if slow:
+                stats["slow_count"] += 1
+                stats["last_slow_at"] = time.time()
+        if slow and key != OTHER_SHAPE:
+            self._maybe_explain(key, database_name, command, elapsed_ms)
+
+    def _maybe_explain(self, key: str, database_name: str, command: Dict, elapsed_ms: float):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained_at.get(key, -self.explain_cooldown) < self.explain_cooldown:
+                return
+            self._explained_at[key] = now
+        if self._client is None or self._loop is None:
+            logger.warning("Slow query %.1fms: %s", elapsed_ms, key)
+            return
+        # Listener callbacks run on Motor's executor threads; explain on the event loop
+        self._loop.call_soon_threadsafe(
+            lambda: self._loop.create_task(self._explain(key, database_name, command, elapsed_ms))
+        )
+
+    async def _explain(self, key: str, database_name: str, command: Dict, elapsed_ms: float):
+        explained = {k: v for k, v in command.items() if not k.startswith("$") and k not in ("lsid", "txnNumber")}
+        try:
+            plan = await self._client[database_name].command({"explain": explained, "verbosity": "queryPlanner"})
+        except Exception as e:
+            logger.warning("Slow query %.1fms: %s (explain failed: %s)", elapsed_ms, key, e)
+            return
+        stages = _winning_plan_stages(plan)
+        with self._lock:
+            if key in self._shapes:
+                self._shapes[key]["plan"] = stages
+        logger.warning("Slow query %.1fms: %s plan=%s", elapsed_ms, key, " <- ".join(stages))
+
+    def report(self, min_ms: float = 0.0, sort: str = "total_ms", limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [
+                {
+                    "shape": key,
+                    **stats,
+                    "total_ms": round(stats["total_ms"], 2),
+                    "max_ms": round(stats["max_ms"], 2),
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                }
+                for key, stats in self._shapes.items()
+                if stats["max_ms"] >= min_ms
+            ]
+        rows.sort(key=lambda row: row.get(sort, 0), reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+            self._explained_at.clear()
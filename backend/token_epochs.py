@@ -0,0 +1,84 @@
+"""
+Per-user token epochs for revoking bearer JWTs without a per-request lookup.
+
+Every token carries the user's epoch at issue time ("tep"). Bumping a user's
+epoch revokes all of their earlier tokens. Only users who have ever been
+bumped have a row in token_epochs, so the whole table is mirrored in memory
+and refreshed periodically. With a cache bus, other instances see a bump
+within milliseconds, otherwise within one refresh interval.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+BUS_PREFIX = "token_epoch:"
+
+class TokenEpochs:
+    def __init__(self, db, refresh_interval: float = 30.0, bus=None):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.bus = bus
+        self._epochs: Dict[str, int] = {}
+        self._synced_at: Optional[str] = None
+        if bus is not None:
+            bus.subscribe(BUS_PREFIX, self._on_invalidation)
+
+    def _on_invalidation(self, key: Optional[str], data: Optional[Dict]):
+        if key is None:
+            # The bus lost its position; catch up from the collection
+            asyncio.get_running_loop().create_task(self.refresh())
+        elif data and "epoch" in data:
+            user_id = key[len(BUS_PREFIX):]
+            self._epochs[user_id] = max(self._epochs.get(user_id, 0), data["epoch"])
+
+    def current(self, user_id: str) -> int:
+        return self._epochs.get(user_id, 0)
+
+    async def load(self, user_id: str) -> int:
+        """The user's epoch as stored, for issuing tokens; the in-memory copy may lag a bump made elsewhere"""
+        doc = await self.db.token_epochs.find_one({"_id": user_id}, {"epoch": 1})
+        epoch = doc["epoch"] if doc else 0
+        self._epochs[user_id] = max(self._epochs.get(user_id, 0), epoch)
+        return self._epochs[user_id]
+
+    def is_current(self, user_id: str, epoch: int) -> bool:
+        return epoch >= self._epochs.get(user_id, 0)
+
+    async def bump(self, user_id: str) -> int:
+        """Revoke every token issued to the user so far; returns the new epoch"""
+        doc = await self.db.token_epochs.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {"epoch": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._epochs[user_id] = max(self._epochs.get(user_id, 0), doc["epoch"])
+        if self.bus is not None:
+            await self.bus.publish(BUS_PREFIX + user_id, {"epoch": doc["epoch"]})
+        return doc["epoch"]
+
+    async def refresh(self):
+        """Pull epochs changed since the last refresh (everything on the first call)"""
+        query = {"updated_at": {"$gte": self._synced_at}} if self._synced_at else {}
+        # Overlap refreshes a little so clock skew between instances cannot hide a bump
+        started_at = (datetime.now(timezone.utc) - timedelta(seconds=5)).isoformat()
+        async for doc in self.db.token_epochs.find(query, {"epoch": 1}):
+            self._epochs[doc["_id"]] = max(self._epochs.get(doc["_id"], 0), doc["epoch"])
+        self._synced_at = started_at
+
+    async def ensure_indexes(self):
+        await self.db.token_epochs.create_index("updated_at")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Token epoch refresh failed: %s", e)
@@ -0,0 +1,132 @@
+"""
+Trade codes (CSI MasterFormat divisions) and their bitmask encoding.
+
+Jobs, worker profiles and saved searches store `trade_mask` next to
+`trade_codes`, one bit per division. A multi-trade filter is then a single
+$bitsAnySet ("any of these trades") or $bitsAllSet ("all of them") test on
+an integer instead of an $in/$all over a multikey array, and matching code
+compares trades with one AND.
+
+The bit of a division is its position in TRADE_CODES, and it is stored in
+every document: add new divisions at the end, never reorder or remove.
+
+    python trades.py    # backfill trade_mask on documents written before it existed
+
+The API also runs the backfill as a scheduled task (see scheduler.py), so
+documents written before the upgrade reappear in trade-filtered listings
+without a manual step.
+"""
+
+import argparse
+import asyncio
+import os
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+import archiver
+
+TRADE_CODES = {
+    "03": "Concrete",
+    "04": "Masonry",
+    "05": "Metals",
+    "06": "Wood, Plastics, Composites",
+    "07": "Thermal & Moisture Protection",
+    "08": "Openings (Doors/Windows)",
+    "09": "Finishes (Drywall/Paint)",
+    "10": "Specialties",
+    "22": "Plumbing",
+    "23": "HVAC",
+    "26": "Electrical",
+    "31": "Earthwork",
+    "32": "Exterior Improvements"
+}
+
+TRADE_BITS = {code: bit for bit, code in enumerate(TRADE_CODES)}
+
+MATCH_ANY, MATCH_ALL = "any", "all"
+
+# Collections carrying trade_codes + trade_mask
+COLLECTIONS = ("jobs", "worker_profiles", "saved_searches",
+               archiver.archive_name("jobs"), archiver.archive_name("worker_profiles"))
+
+def unknown_codes(codes: Iterable[str]) -> List[str]:
+    return [code for code in codes if code not in TRADE_BITS]
+
+def trade_mask(codes: Optional[Iterable[str]]) -> int:
+    """Bitmask of the known codes in `codes` (unknown codes have no bit and are left out)"""
+    mask = 0
+    for code in codes or ():
+        bit = TRADE_BITS.get(code)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+def mask_codes(mask: int) -> List[str]:
+    return [code for code, bit in TRADE_BITS.items() if mask >> bit & 1]
+
+def doc_mask(doc: Dict) -> int:
+    """A document's stored trade_mask, or one computed from its trade_codes if it predates the field"""
+    mask = doc.get("trade_mask")
+    return trade_mask(doc.get("trade_codes")) if mask is None else mask
+
+def mask_matches(mask: int, wanted: int, match: str = MATCH_ANY) -> bool:
+    if match == MATCH_ALL:
+        return mask & wanted == wanted
+    return bool(mask & wanted)
+
+def mask_query(codes: Iterable[str], match: str = MATCH_ANY) -> Dict:
+    """Filter on trade_mask for documents with any (or all) of `codes`"""
+    operator = "$bitsAllSet" if match == MATCH_ALL else "$bitsAnySet"
+    return {"trade_mask": {operator: trade_mask(codes)}}
+
+async def ensure_indexes(db):
+    # Bit tests cannot bound an index scan, so the mask trails the sort key: browse queries walk the
+    # newest live listings in order and test the mask on the index entry, fetching only matches
+    live = {"status": "active"}
+    await db.jobs.create_index([("created_at", -1), ("trade_mask", 1)], partialFilterExpression=live,
+                               name="live_created_at_trade_mask")
+    await db.worker_profiles.create_index([("created_at", -1), ("trade_mask", 1)], partialFilterExpression=live,
+                                          name="live_created_at_trade_mask")
+    # Superseded by the indexes above: listings and exports filter trades through trade_mask
+    # (server.trade_filter), and a multikey index costs a write per trade code on every write
+    for collection in ("jobs", "worker_profiles"):
+        try:
+            await db[collection].drop_index("live_trade_codes_created_at")
+        except OperationFailure:
+            pass  # never created, or already dropped
+
+async def backfill(db, batch_size: int = 1000) -> Dict[str, int]:
+    """Set trade_mask wherever it is missing; returns the number of documents updated per collection"""
+    report = {}
+    for collection in COLLECTIONS:
+        updated = 0
+        cursor = db[collection].find({"trade_mask": {"$exists": False}}, {"_id": 1, "trade_codes": 1})
+        ops: List[UpdateOne] = []
+        async for doc in cursor.batch_size(batch_size):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"trade_mask": trade_mask(doc.get("trade_codes"))}}))
+            if len(ops) >= batch_size:
+                updated += (await db[collection].bulk_write(ops, ordered=False)).modified_count
+                ops = []
+        if ops:
+            updated += (await db[collection].bulk_write(ops, ordered=False)).modified_count
+        report[collection] = updated
+    return report
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Backfill trade_mask from trade_codes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("DB_NAME", "test_database")]
+    await ensure_indexes(db)
+    report = await backfill(db, args.batch_size)
+    print(", ".join(f"{collection}: {count} updated" for collection, count in report.items()))
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -175,7 +175,11 @@ function AuthProvider({ children }) {
   };
 
   const updateUserType = async (userType) => {
-    await api.put("/auth/update-type", { user_type: userType });
+    const response = await api.put("/auth/update-type", { user_type: userType });
+    // The old token is revoked by the switch; keep the one issued with the new type
+    if (response.data.access_token) {
+      localStorage.setItem("token", response.data.access_token);
+    }
     setUser({ ...user, user_type: userType });
   };
 
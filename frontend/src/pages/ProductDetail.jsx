@@ -15,9 +15,11 @@ export default function ProductDetail() {
   const [product, setProduct] = useState(null);
   const [loading, setLoading] = useState(true);
   const [quantity, setQuantity] = useState(1);
+  const [related, setRelated] = useState([]);
 
   useEffect(() => {
     fetchProduct();
+    fetchRelated();
   }, [productId]);
 
   const fetchProduct = async () => {
@@ -31,6 +33,15 @@ export default function ProductDetail() {
     }
   };
 
+  const fetchRelated = async () => {
+    try {
+      const response = await api.get(`/products/${productId}/recommendations`, { params: { limit: 4 } });
+      setRelated(response.data);
+    } catch (error) {
+      setRelated([]);
+    }
+  };
+
   const addToCart = async () => {
     try {
       await api.post("/cart/add", { product_id: productId, quantity });
@@ -183,6 +194,33 @@ export default function ProductDetail() {
             </div>
           </div>
         </div>
+
+        {related.length > 0 && (
+          <div className="mt-12" data-testid="frequently-bought-together">
+            <h2 className="text-xl font-bold text-slate-900 font-['Oswald'] uppercase tracking-tight mb-4">
+              Frequently Bought Together
+            </h2>
+            <div className="grid grid-cols-2 md:grid-cols-4 gap-6">
+              {related.map((item) => (
+                <Link key={item.product_id} to={`/shop/${item.product_id}`}>
+                  <Card className="product-card border border-slate-200 rounded-sm overflow-hidden group h-full">
+                    <div className="aspect-square bg-slate-100 overflow-hidden">
+                      <img
+                        src={item.image_url}
+                        alt={item.name}
+                        className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
+                      />
+                    </div>
+                    <CardContent className="p-4">
+                      <h3 className="font-semibold text-slate-900 mb-1 line-clamp-2">{item.name}</h3>
+                      <span className="text-lg font-bold text-slate-900">${item.price.toFixed(2)}</span>
+                    </CardContent>
+                  </Card>
+                </Link>
+              ))}
+            </div>
+          </div>
+        )}
       </div>
 
       <Footer />
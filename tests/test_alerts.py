@@ -0,0 +1,51 @@
+import alerts
+import trades
+
+def search(trade_codes=(), states=(), cities=(), trade_match=trades.MATCH_ANY, **kwargs):
+    return alerts.new_search_doc("user_1", "s", list(trade_codes), list(states), list(cities),
+                                 kwargs.get("min_pay"), kwargs.get("pay_type"), kwargs.get("certifications", []),
+                                 trade_match)
+
+def job(**fields):
+    doc = {"job_id": "job_1", "trade_codes": ["09"], "state": "TX", "city": "Austin", **fields}
+    doc["trade_mask"] = trades.doc_mask(doc)
+    return doc
+
+def percolates(search_doc, job_doc):
+    """What AlertEngine.percolate decides: a shared term, then the residual filters"""
+    return bool(set(search_doc["terms"]) & set(alerts.job_terms(job_doc))) and alerts.residual_match(search_doc, job_doc)
+
+def test_search_terms_use_the_most_specific_location():
+    assert alerts.search_terms(["09"], ["tx"], [" San  Antonio "]) == ["09|c:san antonio"]
+    assert alerts.search_terms(["26", "09"], ["tx", "ok"], []) == ["09|s:OK", "09|s:TX", "26|s:OK", "26|s:TX"]
+    assert alerts.search_terms([], [], []) == ["*|*"]
+
+def test_job_terms_cover_any_trade_and_location():
+    assert sorted(alerts.job_terms(job())) == sorted([
+        "09|*", "09|s:TX", "09|c:austin", "*|*", "*|s:TX", "*|c:austin",
+    ])
+
+def test_matching_by_trade_and_location():
+    assert percolates(search(["09"], ["tx"]), job())
+    assert percolates(search([], [], ["austin"]), job())
+    assert percolates(search(), job())
+    assert not percolates(search(["26"]), job())
+    assert not percolates(search(["09"], ["OK"]), job())
+
+def test_city_search_also_checks_its_states():
+    # "Springfield" alone matches on the city term; the state list is checked on the candidate
+    springfield = search([], ["IL"], ["Springfield"])
+    assert percolates(springfield, job(city="Springfield", state="IL"))
+    assert not percolates(springfield, job(city="Springfield", state="MO"))
+
+def test_all_of_trades_indexes_one_term_and_checks_the_mask():
+    wanted = search(["09", "26"], trade_match=trades.MATCH_ALL)
+    assert wanted["terms"] == ["09|*"]
+    assert percolates(wanted, job(trade_codes=["09", "26", "22"]))
+    assert not percolates(wanted, job(trade_codes=["09"]))
+
+def test_residual_filters():
+    assert not alerts.residual_match(search(pay_type="hourly"), job(pay_type="daily"))
+    certified = search(certifications=["OSHA 10"])
+    assert alerts.residual_match(certified, job(certifications_required=["OSHA 10"]))
+    assert not alerts.residual_match(certified, job(certifications_required=["OSHA 10", "OSHA 30"]))
@@ -0,0 +1,32 @@
+import pytest
+
+import archiver
+
+CUTOFF = "2025-01-01T00:00:00+00:00"
+
+def test_age_is_measured_from_the_first_field_that_is_set():
+    query = archiver.archive_query(archiver.POLICIES["jobs"], CUTOFF)
+    assert query == {
+        "status": {"$ne": "active"},
+        "$or": [
+            {"closed_at": {"$lt": CUTOFF}},
+            {"created_at": {"$lt": CUTOFF}, "closed_at": None},
+        ],
+    }
+
+def test_single_age_field():
+    query = archiver.archive_query(archiver.POLICIES["payment_transactions"], CUTOFF)
+    assert query == {"type": {"$ne": "market_data_subscription"}, "$or": [{"created_at": {"$lt": CUTOFF}}]}
+
+@pytest.mark.anyio
+async def test_archive_query_selects_old_inactive_jobs(mongo):
+    old, new = "2024-06-01T00:00:00+00:00", "2025-06-01T00:00:00+00:00"
+    await mongo.jobs.insert_many([
+        {"job_id": "closed_long_ago", "status": "closed", "created_at": old, "closed_at": old},
+        {"job_id": "old_but_closed_recently", "status": "closed", "created_at": old, "closed_at": new},
+        {"job_id": "closed_before_closed_at_existed", "status": "closed", "created_at": old},
+        {"job_id": "old_and_active", "status": "active", "created_at": old},
+    ])
+    query = archiver.archive_query(archiver.POLICIES["jobs"], CUTOFF)
+    selected = sorted([doc["job_id"] async for doc in mongo.jobs.find(query)])
+    assert selected == ["closed_before_closed_at_existed", "closed_long_ago"]
@@ -0,0 +1,61 @@
+import pytest
+
+import bulk_io
+
+pytestmark = pytest.mark.anyio
+
+async def chunks(data: bytes, size: int = 7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+async def parse(text: str, **kwargs):
+    return [row async for row in bulk_io.iter_csv(chunks(text.encode()), **kwargs)]
+
+async def test_plain_rows_and_list_fields():
+    rows = await parse("title,trade_codes\nPatch,09;26\nHang, \n", list_fields=["trade_codes"])
+    assert rows == [(1, {"title": "Patch", "trade_codes": ["09", "26"]}, None), (2, {"title": "Hang"}, None)]
+
+async def test_quoted_fields_span_lines_and_escape_quotes():
+    rows = await parse('title,description\n"Ceiling","Line one\nline ""two"", done"\nNext,x\n')
+    assert rows == [
+        (1, {"title": "Ceiling", "description": 'Line one\nline "two", done'}, None),
+        (2, {"title": "Next", "description": "x"}, None),
+    ]
+
+async def test_quote_inside_an_unquoted_field_is_literal():
+    # Per RFC 4180 a quote only opens a quoted field at its start; 12" is an inch mark
+    rows = await parse('title,description\nPatch,12" hole\nNext,x\n')
+    assert [row[1]["description"] for row in rows] == ['12" hole', "x"]
+
+async def test_crlf_line_endings():
+    rows = await parse('title,description\r\n"A","two\r\nlines"\r\n')
+    assert rows == [(1, {"title": "A", "description": "two\nlines"}, None)]
+
+async def test_column_count_mismatch_is_reported():
+    rows = await parse("title,city\nPatch\nHang,Austin\n")
+    assert rows[0] == (1, None, "Expected 2 columns, got 1")
+    assert rows[1] == (2, {"title": "Hang", "city": "Austin"}, None)
+
+async def test_unterminated_quote_is_capped_and_reported():
+    rows = await parse('title,description\n"A","never closed\n' + "filler\n" * 20, max_record_chars=50)
+    assert rows == [(1, None, "Record longer than 50 characters (unterminated quoted field?)")]
+
+async def test_unterminated_quote_at_end_of_input():
+    rows = await parse('title,description\n"A","never closed\n')
+    assert rows == [(1, None, "Unterminated quoted field")]
+
+async def test_overlong_csv_line_is_reported_and_skipped():
+    rows = await parse("title,city\n" + "x" * 200 + "\nHang,Austin\n", max_record_chars=50)
+    assert rows == [(1, None, "Record longer than 50 characters"), (2, {"title": "Hang", "city": "Austin"}, None)]
+
+async def test_line_batches_cap_a_line_without_newline():
+    async def endless():
+        for _ in range(1000):
+            yield b"y" * 64
+    batches = [batch async for batch in bulk_io.iter_line_batches(endless(), max_line_chars=100)]
+    assert batches == [[None]]
+
+async def test_overlong_ndjson_line_is_reported():
+    data = b'{"a": "' + b"z" * 50 + b'"}\n{"a": 1}\n'
+    rows = [row async for row in bulk_io.iter_ndjson(chunks(data), max_line_chars=20)]
+    assert rows == [(1, None, "Line longer than 20 characters"), (2, {"a": 1}, None)]
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import cache_bus
+
+pytestmark = pytest.mark.anyio
+
+class TailedCollection:
+    """Capped collection stand-in: find() returns the documents left at open time, then dies"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def find_one(self, query, projection=None, sort=None):
+        if "_id" in query:
+            return next((doc for doc in self.docs if doc["_id"] == query["_id"]), None)
+        return self.docs[-1] if self.docs else None
+
+    def find(self, query, cursor_type=None):
+        return TailCursor(list(self.docs))
+
+class TailCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.alive = True
+
+    def max_await_time_ms(self, ms):
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            self.alive = False
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+def record(bus):
+    events = []
+    bus.subscribe("product:", lambda key, data: events.append(key))
+    return events
+
+async def follow_until(bus, events, count):
+    task = asyncio.create_task(bus._follow_tailable())
+    for _ in range(100):
+        if len(events) >= count:
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+def test_local_cache_expires_and_evicts_least_recent():
+    cache = cache_bus.LocalCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+
+async def test_publish_applies_locally_and_ignores_own_echo():
+    bus = cache_bus.CacheBus(None, mode="local")
+    cache = bus.cache("product:")
+    other = bus.cache("catalog")
+    cache.set("product:1", "x")
+    other.set("catalog", "y")
+    await bus.publish("product:1")
+    assert cache.get("product:1") is None and other.get("catalog") == "y"
+
+    cache.set("product:1", "x")
+    bus._receive({"key": "product:1", "origin": bus.origin})
+    assert cache.get("product:1") == "x"
+    bus._receive({"key": "product:1", "origin": "elsewhere"})
+    assert cache.get("product:1") is None
+
+async def test_tailing_skips_history_up_to_the_start_position():
+    bus = cache_bus.CacheBus(None, mode="tailable")
+    events = record(bus)
+    bus.db = {bus.collection: TailedCollection([
+        {"_id": 1, "key": "product:old", "origin": "x"},
+        {"_id": 2, "key": "product:last", "origin": "x"},
+    ])}
+    await follow_until(bus, events, 1)
+    # Nothing after the start position is delivered; the cursor dying flushes
+    assert events and set(events) == {None}
+
+async def test_tailing_flushes_when_start_position_was_evicted():
+    bus = cache_bus.CacheBus(None, mode="tailable")
+    events = record(bus)
+    collection = TailedCollection([{"_id": 1, "key": "product:last", "origin": "x"}])
+    bus.db = {bus.collection: collection}
+
+    # The capped collection wraps between reading `last` and opening the cursor
+    open_cursor = collection.find
+
+    def find(query, cursor_type=None):
+        collection.docs = [{"_id": 2, "key": "product:new", "origin": "x"}]
+        return open_cursor(query, cursor_type)
+    collection.find = find
+
+    await follow_until(bus, events, 2)
+    assert events[:2] == [None, "product:new"]
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+import counters
+
+pytestmark = pytest.mark.anyio
+
+async def views(mongo, job_id):
+    doc = await mongo.jobs.find_one({"job_id": job_id})
+    return doc.get("views", 0), doc.get("impressions", 0)
+
+async def test_increments_are_coalesced_into_one_write(mongo):
+    await mongo.jobs.insert_many([{"job_id": "j1"}, {"job_id": "j2"}])
+    buffer = counters.CounterBuffer(mongo)
+    for _ in range(5):
+        buffer.incr("jobs", "j1", "views")
+    buffer.incr_many("jobs", ["j1", "j2"], "impressions")
+    assert len(buffer) == 3
+
+    assert await buffer.flush() == 2
+    assert await views(mongo, "j1") == (5, 1)
+    assert await views(mongo, "j2") == (0, 1)
+    assert len(buffer) == 0 and await buffer.flush() == 0
+
+async def test_full_buffer_drops_new_keys_and_wakes_the_flusher(mongo):
+    dropped = []
+    buffer = counters.CounterBuffer(mongo, flush_interval=60, max_keys=2,
+                                    on_drop=lambda collection, amount: dropped.append((collection, amount)))
+    buffer.incr("jobs", "j1", "views")
+    buffer.incr("jobs", "j2", "views")
+    buffer.incr("jobs", "j1", "views")  # existing keys still count
+    buffer.incr("jobs", "j3", "views", 4)
+    assert len(buffer) == 2 and dropped == [("jobs", 4)]
+
+    await mongo.jobs.insert_many([{"job_id": "j1"}, {"job_id": "j2"}])
+    task = asyncio.create_task(buffer.run())
+    for _ in range(50):
+        if not len(buffer):
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    assert await views(mongo, "j1") == (2, 0)
+
+class BrokenCollection:
+    async def bulk_write(self, operations, ordered=True):
+        raise RuntimeError("down")
+
+class PartlyDownDatabase:
+    def __init__(self, db, down):
+        self.db = db
+        self.down = down
+
+    def __getitem__(self, name):
+        return BrokenCollection() if name == self.down else self.db[name]
+
+async def test_failed_collection_is_rebuffered(mongo):
+    await mongo.jobs.insert_one({"job_id": "j1"})
+    buffer = counters.CounterBuffer(PartlyDownDatabase(mongo, "products"))
+    buffer.incr("jobs", "j1", "views")
+    buffer.incr("products", "p1", "views", 2)
+
+    assert await buffer.flush() == 1
+    assert await views(mongo, "j1") == (1, 0)
+    assert buffer._pending == {("products", "p1", "views"): 2}
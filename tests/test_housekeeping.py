@@ -0,0 +1,49 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import housekeeping
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+def days_ago(days: float) -> str:
+    return (NOW - timedelta(days=days)).isoformat()
+
+@pytest.mark.parametrize("duration, days", [
+    ("2 weeks", 14), ("3 months", 90), ("1-2 months", 60), ("a year", 365), ("Ongoing", None), (None, None),
+])
+def test_duration_days(duration, days):
+    assert housekeeping.duration_days(duration) == days
+
+def test_job_expires_at_is_clamped():
+    created = NOW.isoformat()
+    assert housekeeping.job_expires_at(created, "1 week", 14, 60) == (NOW + timedelta(days=14)).isoformat()
+    assert housekeeping.job_expires_at(created, "6 months", 14, 60) == (NOW + timedelta(days=60)).isoformat()
+    assert housekeeping.job_expires_at(created, "Ongoing", 14, 60) == (NOW + timedelta(days=60)).isoformat()
+
+@pytest.mark.anyio
+async def test_expire_jobs(mongo):
+    await mongo.jobs.insert_many([
+        {"job_id": "past_expiry", "status": "active", "created_at": days_ago(20), "expires_at": days_ago(1)},
+        {"job_id": "not_yet", "status": "active", "created_at": days_ago(20), "expires_at": days_ago(-1)},
+        {"job_id": "legacy_old", "status": "active", "created_at": days_ago(61)},
+        {"job_id": "legacy_recent", "status": "active", "created_at": days_ago(59)},
+        {"job_id": "already_filled", "status": "filled", "created_at": days_ago(90), "expires_at": days_ago(30)},
+    ])
+    notified = []
+
+    async def on_closed(job_ids):
+        notified.extend(job_ids)
+
+    closed = await housekeeping.expire_jobs(mongo, max_days=60, batch_size=1, now=NOW, on_closed=on_closed)
+
+    assert closed == 2
+    assert sorted(notified) == ["legacy_old", "past_expiry"]
+    jobs = {doc["job_id"]: doc async for doc in mongo.jobs.find({}, {"_id": 0})}
+    assert jobs["past_expiry"]["status"] == "closed"
+    assert jobs["past_expiry"]["closed_reason"] == "expired"
+    assert jobs["past_expiry"]["closed_at"] == NOW.isoformat()
+    assert jobs["legacy_old"]["status"] == "closed"
+    assert jobs["not_yet"]["status"] == "active"
+    assert jobs["legacy_recent"]["status"] == "active"
+    assert jobs["already_filled"]["status"] == "filled"
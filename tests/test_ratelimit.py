@@ -0,0 +1,86 @@
+import pytest
+
+import ratelimit
+
+pytestmark = pytest.mark.anyio
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+async def ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+
+def limiter(limits, **kwargs):
+    return ratelimit.RateLimitMiddleware(ok, ratelimit.MemoryBuckets(), limits, **kwargs)
+
+async def call(middleware, path="/api/jobs", method="GET", headers=(), client=("10.0.0.1", 1234)):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers), "client": client}
+    await middleware(scope, None, send)
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+def test_parse_limits_overrides_defaults():
+    limits = ratelimit.parse_limits("browse=300/30, auth=3")
+    assert (limits["browse"].capacity, limits["browse"].period) == (300, 30)
+    assert (limits["auth"].capacity, limits["auth"].period) == (3, 60)
+    assert limits["checkout"] is ratelimit.DEFAULT_LIMITS["checkout"]
+
+def test_route_classes():
+    assert ratelimit.route_class("POST", "/api/auth/login") == "auth"
+    assert ratelimit.route_class("GET", "/api/auth/login") is None
+    assert ratelimit.route_class("GET", "/api/export/jobs") == "bulk"
+    assert ratelimit.route_class("GET", "/api/jobs/job_1") == "browse"
+    assert ratelimit.route_class("GET", "/api/jobsearch") is None
+
+async def test_bucket_drains_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    buckets = ratelimit.MemoryBuckets()
+    limit = ratelimit.Limit(2, 10)
+
+    assert [(await buckets.take("k", limit))[0] for _ in range(3)] == [True, True, False]
+    clock.now += 5  # one token back at 0.2 tokens/s
+    assert (await buckets.take("k", limit))[0]
+    assert not (await buckets.take("k", limit))[0]
+
+async def test_buckets_evict_least_recently_used():
+    buckets = ratelimit.MemoryBuckets(max_keys=2)
+    limit = ratelimit.Limit(1, 60)
+    for key in ("a", "b", "a", "c"):
+        await buckets.take(key, limit)
+    # "a" was used more recently than "b", so "b" was evicted and starts full again
+    assert not (await buckets.take("a", limit))[0]
+    assert (await buckets.take("b", limit))[0]
+
+def test_client_ip_honours_only_trusted_hops():
+    scope = {"headers": [(b"x-forwarded-for", b"1.1.1.1, 2.2.2.2, 3.3.3.3")], "client": ("9.9.9.9", 1)}
+    assert ratelimit.client_ip(scope, 0) == "9.9.9.9"
+    assert ratelimit.client_ip(scope, 1) == "3.3.3.3"
+    assert ratelimit.client_ip(scope, 2) == "2.2.2.2"
+    assert ratelimit.client_ip(scope, 10) == "1.1.1.1"
+
+async def test_middleware_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, "monotonic", Clock())
+    middleware = limiter({"browse": ratelimit.Limit(1, 30)})
+    assert (await call(middleware))[0] == 200
+    status, headers = await call(middleware)
+    assert status == 429 and headers[b"retry-after"] == b"30"
+    # Another client has its own bucket, and unclassified routes are never limited
+    assert (await call(middleware, client=("10.0.0.2", 1)))[0] == 200
+    assert (await call(middleware, path="/api/products"))[0] == 200
+
+async def test_authenticated_clients_are_limited_per_user():
+    principal = lambda headers: headers.get("authorization")  # noqa: E731
+    middleware = limiter({"browse": ratelimit.Limit(1, 60)}, principal=principal)
+    assert (await call(middleware, headers=[(b"authorization", b"u1")]))[0] == 200
+    # Same IP, different user: a separate bucket
+    assert (await call(middleware, headers=[(b"authorization", b"u2")]))[0] == 200
+    assert (await call(middleware, headers=[(b"authorization", b"u1")], client=("10.9.9.9", 1)))[0] == 429
@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+import recommendations
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+def coo(baskets, weights=None):
+    rows, cols = [], []
+    for basket, products in enumerate(baskets):
+        for product in products:
+            rows.append(basket)
+            cols.append(product)
+    basket_weights = weights or [1.0] * len(baskets)
+    return (np.asarray(rows), np.asarray(cols), np.asarray([basket_weights[r] for r in rows], dtype=np.float64),
+            len(baskets), 1 + max(cols))
+
+def neighbours(result):
+    by_product = {}
+    for product, neighbour, score, together in zip(*result):
+        by_product.setdefault(int(product), []).append((int(neighbour), round(float(score), 4), float(together)))
+    return by_product
+
+BASKETS = [{0, 1}, {0, 1}, {0, 1}, {0, 2}, {0, 2}, {3}, {2, 3}]
+
+def test_cosine_scores_ranked_per_product():
+    result = neighbours(recommendations.top_neighbours(*coo(BASKETS), min_support=2))
+    assert result == {
+        0: [(1, round(3 / math.sqrt(5 * 3), 4), 3.0), (2, round(2 / math.sqrt(5 * 3), 4), 2.0)],
+        1: [(0, round(3 / math.sqrt(5 * 3), 4), 3.0)],
+        2: [(0, round(2 / math.sqrt(5 * 3), 4), 2.0)],
+    }
+
+def test_pairs_below_min_support_are_dropped():
+    result = neighbours(recommendations.top_neighbours(*coo(BASKETS), min_support=1))
+    assert [n for n, _, _ in result[3]] == [2]
+    assert 3 not in neighbours(recommendations.top_neighbours(*coo(BASKETS), min_support=2))
+
+def test_top_n_keeps_the_best_neighbours():
+    result = neighbours(recommendations.top_neighbours(*coo(BASKETS), top_n=1, min_support=2))
+    assert [n for n, _, _ in result[0]] == [1]
+
+def test_basket_weight_counts_per_pair():
+    # Eight carts at weight 0.25 are worth two orders
+    result = neighbours(recommendations.top_neighbours(*coo([{1, 2}] * 8, [0.25] * 8), min_support=2))
+    assert result[1] == [(2, 1.0, 2.0)]
@@ -0,0 +1,61 @@
+import pytest
+
+import resilience
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+def test_opens_after_threshold_failures(clock):
+    transitions = []
+    breaker = resilience.CircuitBreaker(failure_threshold=3, reset_timeout=30, on_state_change=transitions.append)
+    for _ in range(2):
+        assert breaker.try_acquire()
+        breaker.record_failure()
+    assert breaker.state == resilience.CLOSED
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    assert not breaker.try_acquire()
+    assert breaker.retry_after() == 30
+    assert transitions == [resilience.OPEN]
+
+def test_success_resets_the_failure_count(clock):
+    breaker = resilience.CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == resilience.CLOSED
+
+def test_half_open_admits_one_probe(clock):
+    breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 29
+    assert not breaker.try_acquire()
+    clock[0] += 1
+    assert breaker.try_acquire()
+    assert breaker.state == resilience.HALF_OPEN
+    assert not breaker.try_acquire()
+
+def test_probe_outcome_closes_or_reopens(clock):
+    breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.try_acquire()
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    assert breaker.retry_after() == 30
+
+    clock[0] += 30
+    assert breaker.try_acquire()
+    breaker.record_success()
+    assert breaker.state == resilience.CLOSED
+    assert breaker.try_acquire() and breaker.try_acquire()
+
+def test_released_probe_frees_the_slot(clock):
+    breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.try_acquire()
+    breaker.release()
+    assert breaker.try_acquire()
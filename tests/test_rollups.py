@@ -0,0 +1,101 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import rollups
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime.now(timezone.utc)
+
+def job(job_id, days_ago=1, **fields):
+    return {"job_id": job_id, "trade_codes": ["09"], "state": "tx", "pay_rate": "$30/hr", "pay_type": "hourly",
+            "status": "active", "created_at": (NOW - timedelta(days=days_ago)).isoformat(), **fields}
+
+async def rollup_state(db):
+    """Non-zero counters per key (decrements leave zeros behind, which readers ignore)"""
+    return {
+        doc["_id"]: {field: value for field, value in rollups._counters(doc).items() if value}
+        async for doc in db[rollups.ROLLUP_COLLECTION].find()
+    }
+
+async def test_incremental_writes_match_a_full_rebuild(mongo):
+    jobs = [job("a"), job("b", pay_rate="40"), job("c", trade_codes=["09", "26"], state="OK")]
+    await mongo.jobs.insert_many([dict(j) for j in jobs])
+    for j in jobs:
+        await rollups.record_job_change(mongo, None, j)
+    edited = {**jobs[0], "pay_rate": "35"}
+    await mongo.jobs.replace_one({"job_id": "a"}, edited)
+    await rollups.record_job_change(mongo, jobs[0], edited)
+    incremental = await rollup_state(mongo)
+
+    await mongo[rollups.ROLLUP_COLLECTION].delete_many({})
+    await rollups.rebuild_rollups(mongo)
+    assert await rollup_state(mongo) == incremental
+
+async def test_rebuild_repairs_drift(mongo):
+    await mongo.jobs.insert_one(job("a"))
+    await rollups.record_job_change(mongo, None, job("a"))
+    expected = await rollup_state(mongo)
+    key = f"09|TX|{rollups.week_key(job('a')['created_at'])}"
+    await mongo[rollups.ROLLUP_COLLECTION].update_one({"_id": key}, {"$inc": {"jobs_posted": 5, "pay.daily.count": 1}})
+
+    assert await rollups.rebuild_rollups(mongo) == 1
+    assert await rollup_state(mongo) == expected
+
+class RacingDatabase:
+    """Runs `during_scan` once the rebuild has started reading raw jobs"""
+
+    def __init__(self, db, during_scan):
+        self.db = db
+        self.during_scan = during_scan
+
+    def __getitem__(self, name):
+        collection = self.db[name]
+        if name != "jobs":
+            return collection
+        outer = self
+
+        class Collection:
+            def find(self, *args, **kwargs):
+                async def docs():
+                    async for doc in collection.find(*args, **kwargs):
+                        yield doc
+                        if outer.during_scan:
+                            hook, outer.during_scan = outer.during_scan, None
+                            await hook()
+                return docs()
+        return Collection()
+
+async def test_live_writes_during_a_rebuild_are_kept(mongo):
+    for job_id in ("a", "b"):
+        await mongo.jobs.insert_one(job(job_id))
+        await rollups.record_job_change(mongo, None, job(job_id))
+
+    async def post_job():
+        # A job created while the rebuild scans: written, then counted by its own $inc
+        new = job("late", days_ago=0)
+        await mongo.jobs.insert_one(dict(new))
+        await rollups.record_job_change(mongo, None, new)
+
+    await rollups.rebuild_rollups(RacingDatabase(mongo, post_job))
+    after_race = await rollup_state(mongo)
+
+    await mongo[rollups.ROLLUP_COLLECTION].delete_many({})
+    await rollups.rebuild_rollups(mongo)
+    assert after_race == await rollup_state(mongo)
+    assert sum(counters.get("jobs_posted", 0) for key, counters in after_race.items() if key.startswith("*|*|")) == 3
+
+async def test_rebuild_with_weeks_leaves_older_weeks_alone(mongo):
+    old = job("old", days_ago=70)
+    await mongo.jobs.insert_one(dict(old))
+    await rollups.record_job_change(mongo, None, old)
+    old_key = f"*|*|{rollups.week_key(old['created_at'])}"
+    await mongo[rollups.ROLLUP_COLLECTION].update_one({"_id": old_key}, {"$inc": {"jobs_posted": 5}})
+
+    await rollups.rebuild_rollups(mongo, weeks=2)
+    assert (await rollup_state(mongo))[old_key]["jobs_posted"] == 6
+
+def test_percentiles_interpolate_within_buckets():
+    assert rollups.percentiles({"10": 1, "20": 1}, 1.0) == {"p25": 10.5, "p50": 11.0, "p75": 20.5, "p90": 20.8}
+    assert rollups.percentiles({}, 1.0) == {"p25": None, "p50": None, "p75": None, "p90": None}
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+import scheduler
+
+pytestmark = pytest.mark.anyio
+
+def make(mongo, owner, finished=None):
+    on_finish = None
+    if finished is not None:
+        on_finish = lambda task, status, seconds: finished.append((task, status))  # noqa: E731
+    return scheduler.Scheduler(mongo, owner=owner, on_finish=on_finish)
+
+async def test_only_one_instance_acquires_a_due_task(mongo):
+    first, second = make(mongo, "a"), make(mongo, "b")
+    for instance in (first, second):
+        instance.register("cleanup", interval=60, lease=30)(lambda: None)
+
+    assert await first.try_acquire(first.tasks["cleanup"])
+    assert not await second.try_acquire(second.tasks["cleanup"])
+
+    # Released, but not due again until the interval has passed
+    await first._release(first.tasks["cleanup"], {})
+    assert not await second.try_acquire(second.tasks["cleanup"])
+
+async def test_runs_and_records_the_result(mongo):
+    finished = []
+    instance = make(mongo, "a", finished)
+
+    @instance.register("count", interval=60)
+    async def count():
+        return {"n": 3}
+
+    assert await instance.try_acquire(instance.tasks["count"])
+    await instance._run(instance.tasks["count"])
+
+    lease = await mongo[scheduler.COLLECTION].find_one({"_id": "count"})
+    assert lease["last_status"] == "ok" and lease["last_result"] == {"n": 3}
+    assert finished == [("count", "ok")]
+
+async def test_losing_the_lease_cancels_the_running_task(mongo):
+    finished = []
+    cancelled = asyncio.Event()
+    instance = make(mongo, "a", finished)
+
+    @instance.register("slow", interval=60, lease=0.3)
+    async def slow():
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    assert await instance.try_acquire(instance.tasks["slow"])
+    runner = asyncio.create_task(instance._run(instance.tasks["slow"]))
+    await asyncio.sleep(0.05)
+    # Another instance took over (e.g. this one stalled past the lease)
+    await mongo[scheduler.COLLECTION].update_one({"_id": "slow"}, {"$set": {"owner": "b"}})
+
+    await asyncio.wait_for(runner, timeout=2)
+    assert cancelled.is_set()
+    assert finished == [("slow", "lease_lost")]
+    # The new owner's lease is left alone
+    assert (await mongo[scheduler.COLLECTION].find_one({"_id": "slow"}))["owner"] == "b"
+
+async def test_stop_cancels_and_hands_back_leases(mongo):
+    instance = make(mongo, "a")
+    started = asyncio.Event()
+
+    @instance.register("slow", interval=60)
+    async def slow():
+        started.set()
+        await asyncio.sleep(30)
+
+    assert await instance.try_acquire(instance.tasks["slow"])
+    instance._running["slow"] = asyncio.create_task(instance._run(instance.tasks["slow"]))
+    await started.wait()
+    await instance.stop()
+
+    assert instance.running() == []
+    lease = await mongo[scheduler.COLLECTION].find_one({"_id": "slow"})
+    assert lease["last_status"] == "cancelled"
+    other = make(mongo, "b")
+    other.register("slow", interval=60)(slow)
+    # The lease is free, but the task is not due before next_run_at
+    assert not await other.try_acquire(other.tasks["slow"])
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import singleflight
+
+pytestmark = pytest.mark.anyio
+
+class Loader:
+    def __init__(self, value="v", error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return f"{self.value}{call}"
+
+async def test_concurrent_callers_share_one_load():
+    flights = singleflight.SingleFlight()
+    load = Loader()
+    callers = [asyncio.create_task(flights.do("k", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    load.release.set()
+    assert await asyncio.gather(*callers) == ["v1"] * 5
+    assert load.calls == 1 and flights.loads == 1 and flights.shared == 4
+    assert len(flights) == 0
+
+async def test_errors_are_shared_and_not_remembered():
+    flights = singleflight.SingleFlight()
+    load = Loader(error=ValueError("boom"))
+    callers = [asyncio.create_task(flights.do("k", load)) for _ in range(3)]
+    await asyncio.sleep(0)
+    load.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results) and load.calls == 1
+
+    load.error = None
+    assert await flights.do("k", load) == "v2"
+
+async def test_cancelled_caller_does_not_cancel_the_load():
+    flights = singleflight.SingleFlight()
+    load = Loader()
+    first = asyncio.create_task(flights.do("k", load))
+    second = asyncio.create_task(flights.do("k", load))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    load.release.set()
+    assert await second == "v1"
+    assert first.cancelled()
+
+async def test_cache_serves_hits_until_invalidated():
+    cache = singleflight.CoalescingCache(ttl=60)
+    load = Loader()
+    load.release.set()
+    assert await cache.get("k", load) == "v1"
+    assert await cache.get("k", load) == "v1"
+    cache.invalidate("k")
+    assert await cache.get("k", load) == "v2"
+    assert cache.stats()["hits"] == 1 and cache.stats()["loads"] == 2
+
+async def test_load_racing_an_invalidation_is_not_cached():
+    cache = singleflight.CoalescingCache(ttl=60)
+    load = Loader()
+    stale = asyncio.create_task(cache.get("k", load))
+    await asyncio.sleep(0)
+    cache.invalidate("k")
+    # A caller after the invalidation starts its own load instead of joining the stale one
+    fresh = asyncio.create_task(cache.get("k", load))
+    await asyncio.sleep(0)
+    load.release.set()
+    assert (await stale, await fresh) == ("v1", "v2")
+    assert await cache.get("k", load) == "v2"
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+import cache_bus
+import token_epochs
+
+pytestmark = pytest.mark.anyio
+
+async def test_bump_revokes_earlier_tokens(mongo):
+    epochs = token_epochs.TokenEpochs(mongo)
+    issued = await epochs.load("u1")
+    assert issued == 0 and epochs.is_current("u1", issued)
+
+    assert await epochs.bump("u1") == 1
+    assert not epochs.is_current("u1", issued)
+    assert epochs.is_current("u1", await epochs.load("u1"))
+    assert epochs.is_current("u2", 0)
+
+async def test_other_instances_catch_up_on_refresh(mongo):
+    first, second = token_epochs.TokenEpochs(mongo), token_epochs.TokenEpochs(mongo)
+    await second.refresh()
+    await first.bump("u1")
+    assert second.is_current("u1", 0)
+
+    await second.refresh()
+    assert not second.is_current("u1", 0)
+    # Incremental refreshes only pull recent changes, and never move an epoch backwards
+    await second.refresh()
+    assert second.current("u1") == 1
+
+async def test_bus_delivers_bumps_and_flush_triggers_refresh(mongo):
+    bus = cache_bus.CacheBus(None, mode="local")
+    epochs = token_epochs.TokenEpochs(mongo, bus=bus)
+
+    bus._receive({"key": token_epochs.BUS_PREFIX + "u1", "data": {"epoch": 3}, "origin": "elsewhere"})
+    assert epochs.current("u1") == 3
+
+    await mongo.token_epochs.insert_one({"_id": "u2", "epoch": 2, "updated_at": "2026-01-01T00:00:00+00:00"})
+    bus._dispatch(None)
+    for _ in range(50):
+        if epochs.current("u2"):
+            break
+        await asyncio.sleep(0.01)
+    assert epochs.current("u2") == 2
@@ -0,0 +1,28 @@
+import trades
+
+def test_mask_has_one_bit_per_known_code():
+    assert trades.trade_mask(["03"]) == 1
+    assert trades.trade_mask(["04", "03", "04"]) == 0b11
+    assert trades.trade_mask(["99"]) == 0
+    assert trades.mask_codes(trades.trade_mask(["26", "09"])) == ["09", "26"]
+
+def test_mask_query_any_and_all():
+    mask = trades.trade_mask(["09", "26"])
+    assert trades.mask_query(["09", "26"]) == {"trade_mask": {"$bitsAnySet": mask}}
+    assert trades.mask_query(["09", "26"], trades.MATCH_ALL) == {"trade_mask": {"$bitsAllSet": mask}}
+
+def test_mask_matches_any_and_all():
+    wanted = trades.trade_mask(["09", "26"])
+    drywall = trades.trade_mask(["09"])
+    both = trades.trade_mask(["09", "26", "22"])
+    assert trades.mask_matches(drywall, wanted)
+    assert not trades.mask_matches(drywall, wanted, trades.MATCH_ALL)
+    assert trades.mask_matches(both, wanted, trades.MATCH_ALL)
+    assert not trades.mask_matches(trades.trade_mask(["22"]), wanted)
+
+def test_doc_mask_falls_back_to_trade_codes():
+    assert trades.doc_mask({"trade_codes": ["09"]}) == trades.trade_mask(["09"])
+    assert trades.doc_mask({"trade_codes": ["09"], "trade_mask": 0}) == 0
+
+def test_unknown_codes():
+    assert trades.unknown_codes(["09", "99", "XX"]) == ["99", "XX"]